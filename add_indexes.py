@@ -0,0 +1,86 @@
+import os
+import shutil
+import sqlite3
+
+# Flask-SQLAlchemy keeps relative SQLite databases in the instance folder
+DB_PATH = 'instance/app.db' if os.path.exists('instance/app.db') else 'app.db'
+
+# Must match the __table_args__ indexes declared on the models in app.py
+INDEXES = [
+    ('ix_document_status_date_received', 'document', '(status, date_received)'),
+    ('ix_document_status_date_of_letter', 'document', '(status, date_of_letter)'),
+    ('ix_document_priority_created_at', 'document', '(priority, created_at)'),
+    ('ix_document_created_at', 'document', '(created_at)'),
+    ('ix_system_log_timestamp', 'system_log', '(timestamp)'),
+    ('ix_system_log_action_timestamp', 'system_log', '(action, timestamp)'),
+    ('ix_system_log_log_type_timestamp', 'system_log', '(log_type, timestamp)'),
+    ('ix_system_log_user_timestamp', 'system_log', '(user, timestamp)'),
+    ('ix_login_activity_user_id_login_date', 'login_activity', '(user_id, login_date)'),
+    ('ix_user_last_login', 'user', '(last_login)'),
+]
+
+# Older indexes made redundant by one of the above, or by the daily rollup
+SUPERSEDED_INDEXES = [
+    'ix_document_created_at_status_priority',  # the windowed counts it covered now read document_daily_stats
+]
+
+def create_backup():
+    """Create a backup of the database before making changes"""
+    backup_path = 'instance/kemri_backup.db'
+
+    if not os.path.exists(DB_PATH):
+        print(f"Database file {DB_PATH} not found.")
+        return False
+
+    try:
+        # Create backup
+        os.makedirs('instance', exist_ok=True)
+        shutil.copy2(DB_PATH, backup_path)
+        print(f"Database backup created at {backup_path}")
+        return True
+    except Exception as e:
+        print(f"Error creating backup: {str(e)}")
+        return False
+
+def add_indexes():
+    """Create the query indexes if they don't exist and refresh planner statistics"""
+    try:
+        # Connect to database
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        for name, table, columns in INDEXES:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+            if cursor.fetchone():
+                print(f"Index {name} already exists.")
+                continue
+
+            print(f"Creating index {name} on {table} {columns}...")
+            cursor.execute(f"CREATE INDEX {name} ON {table} {columns}")
+
+        for name in SUPERSEDED_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+            print(f"Dropped superseded index {name} (if present).")
+
+        # Give the query planner up-to-date statistics for the new indexes
+        cursor.execute("ANALYZE")
+
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"Error creating indexes: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    print("Starting database migration to add query indexes...")
+
+    # Create backup first
+    if create_backup():
+        # Add indexes
+        if add_indexes():
+            print("Migration completed successfully.")
+        else:
+            print("Migration failed.")
+    else:
+        print("Backup failed, aborting migration.")
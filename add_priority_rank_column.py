@@ -0,0 +1,85 @@
+import os
+import shutil
+import sqlite3
+
+# Flask-SQLAlchemy keeps relative SQLite databases in the instance folder
+DB_PATH = 'instance/app.db' if os.path.exists('instance/app.db') else 'app.db'
+
+# Must match PRIORITY_RANKS in app.py
+PRIORITY_RANKS = {'Urgent': 1, 'Priority': 2, 'Normal': 3}
+UNKNOWN_PRIORITY_RANK = 4
+
+INDEXES = {
+    'ix_document_status_priority_rank_date_received': '(status, priority_rank, date_received)',
+    'ix_document_status_priority_rank_date_of_letter': '(status, priority_rank, date_of_letter)',
+}
+
+def create_backup():
+    """Create a backup of the database before making changes"""
+    backup_path = 'instance/kemri_backup.db'
+
+    if not os.path.exists(DB_PATH):
+        print(f"Database file {DB_PATH} not found.")
+        return False
+
+    try:
+        # Create backup
+        os.makedirs('instance', exist_ok=True)
+        shutil.copy2(DB_PATH, backup_path)
+        print(f"Database backup created at {backup_path}")
+        return True
+    except Exception as e:
+        print(f"Error creating backup: {str(e)}")
+        return False
+
+def add_priority_rank_column():
+    """Add and backfill the priority_rank column on the document table, plus its indexes"""
+    try:
+        # Connect to database
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        # Check if column exists
+        cursor.execute("PRAGMA table_info(document)")
+        columns = cursor.fetchall()
+        column_names = [column[1] for column in columns]
+
+        if 'priority_rank' not in column_names:
+            print("Adding priority_rank column to Document table...")
+            cursor.execute(
+                f"ALTER TABLE document ADD COLUMN priority_rank INTEGER NOT NULL "
+                f"DEFAULT {PRIORITY_RANKS['Normal']}"
+            )
+        else:
+            print("priority_rank column already exists in Document table.")
+
+        # Backfill (or repair) ranks from the priority labels
+        whens = ' '.join(f"WHEN '{priority}' THEN {rank}" for priority, rank in PRIORITY_RANKS.items())
+        cursor.execute(
+            f"UPDATE document SET priority_rank = CASE priority {whens} ELSE {UNKNOWN_PRIORITY_RANK} END"
+        )
+        print(f"Backfilled priority_rank for {cursor.rowcount} documents.")
+
+        for name, columns in INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON document {columns}")
+            print(f"Index {name} is in place.")
+
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"Error adding priority_rank column: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    print("Starting database migration to add priority_rank column...")
+
+    # Create backup first
+    if create_backup():
+        # Add column
+        if add_priority_rank_column():
+            print("Migration completed successfully.")
+        else:
+            print("Migration failed.")
+    else:
+        print("Backup failed, aborting migration.")
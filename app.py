@@ -1,16 +1,44 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_from_directory, send_file, g, make_response
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
 from datetime import datetime, timedelta
+import atexit
 import json
 import random
-from sqlalchemy import case
+from itertools import islice
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import expression
 import os
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 from werkzeug.routing.exceptions import BuildError
+from pagination import KeysetPagination
+from document_counts import (
+    STATUSES, INCOMING_STATUSES, OUTGOING_STATUSES,
+    setup_document_counters, rebuild_document_counters, read_document_counters,
+    setup_document_version, read_document_version
+)
+from report_cache import ReportCache, report_etag
+from report_jobs import REPORTS, ReportJobQueue
+from report_snapshot import ReportSnapshot, DIMENSIONS
+from live_events import EventBroker, format_cursor, format_event
+from log_writer import SystemLogWriter
+from unit_of_work import RequestUnitOfWork
+from log_partitions import (
+    ALL_LOGS_VIEW, add_months, month_start, parse_month, setup_log_partitions, rotate_system_log,
+    compact_log_partitions, list_log_partitions, list_log_archives, read_log_archive, restore_log_archive
+)
+from log_query import LOG_FILTERS, LogQuery, parse_log_time
+from attachment_store import AttachmentStore, setup_attachment_blobs
+from index_advisor import analyze_queries
+from document_codes import DocumentCodeAllocator
+from daily_stats import (
+    setup_daily_stats, daily_counts_statement, document_day_counts_statement, load_daily_counts,
+    load_daily_activity
+)
+from search_index import FTS_TABLE, setup_document_fts, rebuild_document_fts, build_match_query, get_snippets
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -19,6 +47,25 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'  # Direct path to the
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50 MB max upload
+app.config['ATTACHMENT_STORE_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
+app.config['ATTACHMENT_GC_GRACE'] = 3600  # Seconds an unreferenced attachment blob is kept before deletion
+app.config['DOCUMENT_CODE_BLOCK_SIZE'] = 1  # Document codes each worker reserves at a time
+app.config['REPORT_CACHE_TTL'] = 60  # Seconds a computed report stays cached
+app.config['DASHBOARD_CACHE_TTL'] = 30  # Seconds the dashboard summary stays cached
+app.config['REPORT_SNAPSHOT_REFRESH'] = 15  # Seconds between report snapshot refreshes
+app.config['REPORT_RESULTS_FOLDER'] = os.path.join(os.getcwd(), 'report_results')
+app.config['REPORT_RESULT_TTL'] = timedelta(hours=24)  # How long finished report files are kept
+app.config['REPORT_JOB_WORKERS'] = 2  # Background report threads per process
+app.config['EVENTS_MAX_CONCURRENT'] = 1  # Live counter polls answered at once per worker (keep below gunicorn threads)
+app.config['EVENTS_POLL_INTERVAL'] = 1.0  # Seconds a worker reuses its reading of the counter version
+app.config['EVENTS_RETRY'] = 5  # Seconds between a browser's live counter polls
+app.config['SYSTEM_LOG_FLUSH_INTERVAL'] = 1.0  # Seconds between batched system log inserts
+app.config['SYSTEM_LOG_MAX_PENDING'] = 10000  # Queued log entries before writes fall back to inline inserts
+app.config['LOG_ARCHIVE_FOLDER'] = os.path.join(os.getcwd(), 'log_archives')
+app.config['LOG_RETENTION_MONTHS'] = 6  # Monthly log partitions kept in the database before archiving
+app.config['LOG_ARCHIVE_BROWSE_LIMIT'] = 500  # Archived entries shown per browse
+app.config['LOG_QUERY_PAGE_SIZE'] = 100  # Default entries per page of /api/logs
+app.config['LOG_QUERY_MAX_PAGE_SIZE'] = 1000  # Largest page a client may ask /api/logs for
 app.permanent_session_lifetime = timedelta(days=5)
 
 # Ensure upload directory exists
@@ -26,6 +73,58 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 db = SQLAlchemy(app)
 
+# Set once the FTS5 search index has been created (False if SQLite lacks FTS5)
+FTS_ENABLED = False
+
+# Report data per (filters, document data version), see report_cache.py
+report_cache = ReportCache(ttl=app.config['REPORT_CACHE_TTL'])
+
+# Dashboard summary per document data version; cleared when users change
+dashboard_cache = ReportCache(ttl=app.config['DASHBOARD_CACHE_TTL'], max_entries=4)
+
+# In-memory copy of the daily rollup for slicing, see report_snapshot.py
+report_snapshot = ReportSnapshot(refresh_interval=app.config['REPORT_SNAPSHOT_REFRESH'])
+
+def unsaved_changes_response(error):
+    """Response for a request whose changes could not be committed"""
+    print(f"Error saving changes for {request.path}: {str(error)}")
+    if request.path.startswith('/api/') or request.is_json:
+        return jsonify({'error': 'Your changes could not be saved, please try again'}), 500
+    flash('Your changes could not be saved, please try again.', 'danger')
+    return redirect(request.referrer or url_for('dashboard'))
+
+# Commits each request's writes once when the view returns, see unit_of_work.py
+unit_of_work = RequestUnitOfWork(app, db.session, unsaved_changes_response)
+
+def rotate_log_partitions():
+    """Move last month's log entries into partitions and archive expired partitions"""
+    moved = rotate_system_log(db.engine)
+    archived = compact_log_partitions(
+        db.engine, app.config['LOG_ARCHIVE_FOLDER'], app.config['LOG_RETENTION_MONTHS']
+    )
+    return moved, archived
+
+def following_month(now):
+    """Start of the month after the one now falls in"""
+    return datetime.combine(add_months(month_start(now), 1), datetime.min.time())
+
+# Start of the month when this process next checks for log rotation; the
+# current month is rotated once at startup
+next_log_rotation = following_month(datetime.utcnow())
+
+@app.before_request
+def rotate_logs_if_due():
+    """Rotate the system log on the first request of each new month"""
+    global next_log_rotation
+    now = datetime.utcnow()
+    if now < next_log_rotation:
+        return
+    next_log_rotation = following_month(now)
+    try:
+        rotate_log_partitions()
+    except Exception as e:
+        print(f"Error rotating system log: {str(e)}")
+
 # Add an error handler for URL build errors
 @app.errorhandler(BuildError)
 def handle_build_error(error):
@@ -36,21 +135,14 @@ def handle_build_error(error):
         return redirect(url_for('home'))
     return redirect(url_for('home'))
 
+def write_system_log(log_type, user, action, details):
+    """Queue a system log entry once the request's writes commit; the background writer inserts it"""
+    unit_of_work.after_commit(lambda: system_log_writer.write(log_type, user, action, details))
+
 def log_activity(details, username="System"):
     """Log system activity"""
-    try:
-        log = SystemLog(
-            log_type='Info',
-            user=username,
-            action='User Management',
-            details=details
-        )
-        db.session.add(log)
-        db.session.commit()
-        print(f"Activity logged: {details}")
-    except Exception as e:
-        print(f"Error logging activity: {str(e)}")
-        db.session.rollback()
+    write_system_log('Info', username, 'User Management', details)
+    print(f"Activity logged: {details}")
 
 # Log user login activity
 def log_login_activity(user_id, email, ip_address):
@@ -65,23 +157,14 @@ def log_login_activity(user_id, email, ip_address):
             location="Unknown"  # In a real app, use geolocation service
         )
         
-        db.session.add(activity)
-        db.session.commit()
+        unit_of_work.register(activity)
         
         # Log to system log too
-        log = SystemLog(
-            log_type='Info',
-            user=email,
-            action='User Login',
-            details=f'User logged in from {ip_address}'
-        )
-        db.session.add(log)
-        db.session.commit()
+        write_system_log('Info', email, 'User Login', f'User logged in from {ip_address}')
         
         print(f"Login activity logged for user ID {user_id} ({email})")
     except Exception as e:
         print(f"Error logging login activity: {str(e)}")
-        db.session.rollback()
 
 # Login required decorator
 def login_required(f):
@@ -156,6 +239,10 @@ def utility_processor():
 
 # Example model
 class User(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_last_login', 'last_login'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -170,8 +257,19 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_dashboard_users(mapper, connection, target):
+    # User counts and the recently active list are part of the dashboard summary
+    dashboard_cache.clear()
+
 # Login Activity Model
 class LoginActivity(db.Model):
+    __table_args__ = (
+        db.Index('ix_login_activity_user_id_login_date', 'user_id', 'login_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     login_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -181,8 +279,22 @@ class LoginActivity(db.Model):
     
     user = db.relationship('User', backref=db.backref('login_activities', lazy=True))
 
+# Sort rank for each priority (lower sorts first); unknown priorities rank last
+PRIORITY_RANKS = {'Urgent': 1, 'Priority': 2, 'Normal': 3}
+UNKNOWN_PRIORITY_RANK = 4
+
 # Document Model
 class Document(db.Model):
+    __table_args__ = (
+        db.Index('ix_document_status_priority_rank_date_received', 'status', 'priority_rank', 'date_received'),
+        db.Index('ix_document_status_priority_rank_date_of_letter', 'status', 'priority_rank', 'date_of_letter'),
+        db.Index('ix_document_status_date_received', 'status', 'date_received'),
+        db.Index('ix_document_status_date_of_letter', 'status', 'date_of_letter'),
+        db.Index('ix_document_priority_created_at', 'priority', 'created_at'),
+        # Range scans for the nightly rollup close-out and the register export
+        db.Index('ix_document_created_at', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), unique=True, nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -193,6 +305,7 @@ class Document(db.Model):
     date_of_letter = db.Column(db.DateTime, default=datetime.utcnow)
     date_received = db.Column(db.DateTime, default=datetime.utcnow)
     priority = db.Column(db.String(20), default='Normal')  # Normal, Priority, Urgent
+    priority_rank = db.Column(db.Integer, nullable=False, default=PRIORITY_RANKS['Normal'], server_default=str(PRIORITY_RANKS['Normal']))
     status = db.Column(db.String(20), default='Incoming')  # Incoming, Pending, Received, Outgoing, Ended
     current_holder = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -201,11 +314,24 @@ class Document(db.Model):
     
     processor = db.relationship('User', backref=db.backref('processed_documents', lazy=True))
     
+    @validates('priority')
+    def validate_priority(self, key, priority):
+        # Keep the indexed sort rank in step with the priority label
+        self.priority_rank = PRIORITY_RANKS.get(priority, UNKNOWN_PRIORITY_RANK)
+        return priority
+    
     def __repr__(self):
         return f'<Document {self.code}>'
 
 # System Log Model
 class SystemLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_system_log_timestamp', 'timestamp'),
+        db.Index('ix_system_log_action_timestamp', 'action', 'timestamp'),
+        db.Index('ix_system_log_log_type_timestamp', 'log_type', 'timestamp'),
+        db.Index('ix_system_log_user_timestamp', 'user', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     log_type = db.Column(db.String(20))  # Info, Success, Warning, Error
@@ -216,6 +342,79 @@ class SystemLog(db.Model):
     def __repr__(self):
         return f'<SystemLog {self.action}>'
 
+# Document Sequence Model (last DOC-YYYY-NNN number issued per year, see document_codes.py)
+class DocumentSequence(db.Model):
+    __tablename__ = 'document_sequence'
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DocumentSequence {self.year}: {self.last_value}>'
+
+# Document Counter Model (maintained by triggers, see document_counts.py)
+class DocumentCounter(db.Model):
+    __tablename__ = 'document_counters'
+    status = db.Column(db.String(20), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    direction = db.Column(db.String(20), primary_key=True)  # Incoming, Outgoing
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DocumentCounter {self.status}/{self.priority}/{self.direction}: {self.count}>'
+
+# Document Version Model (single row bumped by triggers on document writes, see document_counts.py)
+class DocumentVersion(db.Model):
+    __tablename__ = 'document_version'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DocumentVersion {self.version}>'
+
+# Daily Document Stats Model (rollup maintained by triggers, see daily_stats.py)
+class DocumentDailyStat(db.Model):
+    __tablename__ = 'document_daily_stats'
+    __table_args__ = (
+        db.Index('ix_document_daily_stats_updated_at', 'updated_at'),
+        {'sqlite_with_rowid': False},
+    )
+    day = db.Column(db.String(10), primary_key=True)  # YYYY-MM-DD of created_at
+    status = db.Column(db.String(20), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    sender_department = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.String(23))  # Set by the rollup triggers, see report_snapshot.py
+    
+    def __repr__(self):
+        return f'<DocumentDailyStat {self.day} {self.status}/{self.priority}/{self.sender_department}: {self.count}>'
+
+# Report Job Model (background report exports, see report_jobs.py)
+class ReportJob(db.Model):
+    __tablename__ = 'report_job'
+    __table_args__ = (
+        db.Index('ix_report_job_expires_at', 'expires_at'),
+        db.Index('ix_report_job_status_created_at', 'status', 'created_at'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)
+    report_type = db.Column(db.String(50), nullable=False)
+    format = db.Column(db.String(10), nullable=False)  # csv, pdf
+    params = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Rows written so far
+    total = db.Column(db.Integer)  # Rows the report will contain
+    result_file = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    created_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Stamped while a worker holds the job queued or running
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)  # Result file is deleted after this
+    
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.report_type} {self.status}>'
+
 # Document Attachment Model
 class DocumentAttachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -224,6 +423,7 @@ class DocumentAttachment(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # pdf, doc, jpg, etc.
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
+    sha256 = db.Column(db.String(64), index=True)  # Blob in the attachment store; None for older named files
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     document = db.relationship('Document', backref=db.backref('attachments', lazy=True, cascade='all, delete-orphan'))
@@ -231,6 +431,17 @@ class DocumentAttachment(db.Model):
     def __repr__(self):
         return f'<DocumentAttachment {self.original_filename}>'
 
+# Attachment Blob Model (reference counts maintained by triggers, see attachment_store.py)
+class AttachmentBlob(db.Model):
+    __tablename__ = 'attachment_blob'
+    digest = db.Column(db.String(64), primary_key=True)  # SHA-256 of the content
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    released_at = db.Column(db.String(23))  # When ref_count dropped to zero
+    
+    def __repr__(self):
+        return f'<AttachmentBlob {self.digest[:12]}: {self.ref_count}>'
+
 # Document Comment Model
 class DocumentComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -245,11 +456,218 @@ class DocumentComment(db.Model):
     def __repr__(self):
         return f'<DocumentComment {self.id}>'
 
+# Document History Model (append-only event log for each document)
+class DocumentHistory(db.Model):
+    __tablename__ = 'document_history'
+    __table_args__ = (
+        db.Index('ix_document_history_document_id_timestamp', 'document_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    action = db.Column(db.String(100), nullable=False)  # Document Created, Status Changed to ..., Comment Added, ...
+    user = db.Column(db.String(100))
+    details = db.Column(db.Text)
+    
+    document = db.relationship('Document', backref=db.backref('history', lazy=True, cascade='all, delete-orphan'))
+    
+    def __repr__(self):
+        return f'<DocumentHistory {self.document_id}: {self.action}>'
+
+# Lightweight handle on the FTS5 index table for joins
+document_fts = db.table(FTS_TABLE, db.column('rowid'))
+
+def apply_document_search(query, search_query):
+    """Filter a Document query by keyword search.
+
+    Uses the FTS5 index (ranked by relevance) when available and falls back
+    to LIKE matching otherwise. Returns the filtered query and the FTS match
+    expression, which is None when the LIKE fallback was used.
+    """
+    match_query = build_match_query(search_query) if FTS_ENABLED else None
+    
+    if match_query:
+        query = query.join(document_fts, document_fts.c.rowid == Document.id).filter(
+            db.literal_column(FTS_TABLE).op('MATCH')(match_query)
+        )
+        return query, match_query
+    
+    search_terms = f"%{search_query}%"
+    query = query.filter(
+        db.or_(
+            Document.code.like(search_terms),
+            Document.title.like(search_terms),
+            Document.sender.like(search_terms),
+            Document.recipient.like(search_terms),
+            Document.details.like(search_terms),
+            Document.required_action.like(search_terms)
+        )
+    )
+    return query, None
+
+def document_sort_keys(sort_by, sort_order, match_query, date_column):
+    """Return (sort keys, sort order) for keyset pagination of a listing.
+
+    Every key list ends in a unique column so that cursors are unambiguous.
+    """
+    if sort_by == 'relevance' and match_query:
+        # bm25() is what FTS5's rank column uses (lower is a better match)
+        return [db.func.bm25(db.literal_column(FTS_TABLE)), Document.id], 'asc'
+    if sort_by == 'code':
+        return [Document.code], sort_order
+    if sort_by == 'priority':
+        # Served by the (status, priority_rank, date) indexes
+        return [Document.priority_rank, date_column, Document.id], sort_order
+    return [date_column, Document.id], sort_order
+
+def get_document_counts():
+    """Return the (status, priority) document counts for this request.
+
+    Read from the trigger-maintained document_counters table the first
+    time a request asks for them and reused for the rest of the request.
+    """
+    if 'document_counts' not in g:
+        g.document_counts = read_document_counters(db.session)
+    return g.document_counts
+
+def current_username():
+    """Name recorded against document events for the logged-in user"""
+    return session.get('username', 'Admin')
+
+def record_document_event(document, action, details=None, user=None):
+    """Append an event to a document's history.
+
+    The event is added to the session, so it is committed (or rolled back)
+    together with the change it describes.
+    """
+    db.session.add(DocumentHistory(
+        document_id=document.id,
+        action=action,
+        details=details,
+        user=user or current_username()
+    ))
+
+def record_document_events(events, user=None):
+    """Append many (document, action, details) events with one bulk insert"""
+    if not events:
+        return
+    user = user or current_username()
+    timestamp = datetime.utcnow()
+    db.session.execute(
+        db.insert(DocumentHistory),
+        [
+            {'document_id': document.id, 'timestamp': timestamp, 'action': action, 'details': details, 'user': user}
+            for document, action, details in events
+        ]
+    )
+
+def add_uploaded_attachment(document, upload):
+    """Store an uploaded file in the attachment store and add its attachment record to the session"""
+    digest, size, _ = attachment_store.put(upload.stream)
+    filename = secure_filename(upload.filename)
+    attachment = DocumentAttachment(
+        document_id=document.id,
+        filename=filename,
+        original_filename=upload.filename,
+        file_type=os.path.splitext(filename)[1][1:].lower(),  # Remove the dot from extension
+        file_size=size,
+        sha256=digest
+    )
+    db.session.add(attachment)
+    return attachment
+
+def set_documents_status(doc_codes, new_status):
+    """Move documents to a new status, recording the change with one bulk history insert"""
+    documents = Document.query.filter(Document.code.in_(doc_codes)).all()
+    events = []
+    for document in documents:
+        if document.status != new_status:
+            events.append((document, f'Status Changed to {new_status}', f'Status changed from {document.status} to {new_status}'))
+            document.status = new_status
+    record_document_events(events)
+    return len(documents)
+
+def load_document_history(document_id):
+    """Return a document's history, newest first, with one indexed query"""
+    return (
+        DocumentHistory.query
+        .filter_by(document_id=document_id)
+        .order_by(DocumentHistory.timestamp.desc(), DocumentHistory.id.desc())
+        .all()
+    )
+
+def backfill_document_history():
+    """Give documents without any history their 'Document Created' event"""
+    db.session.execute(db.text(
+        "INSERT INTO document_history (document_id, timestamp, action, user, details) "
+        "SELECT d.id, COALESCE(d.created_at, CURRENT_TIMESTAMP), 'Document Created', 'System', "
+        "'Document ' || d.code || ' was created' "
+        "FROM document d WHERE NOT EXISTS (SELECT 1 FROM document_history h WHERE h.document_id = d.id)"
+    ))
+    db.session.commit()
+
 # Initialize the database
 with app.app_context():
     # Create tables if they don't exist (don't drop existing tables)
     db.create_all()
     
+    # Create the full-text search index and its sync triggers
+    FTS_ENABLED = setup_document_fts(db.engine)
+    
+    # Keep the status/priority counters in sync with the document table
+    setup_document_counters(db.engine)
+    
+    # Keep the per-day report rollup in sync with the document table
+    setup_daily_stats(db.engine)
+    
+    # Bump the data version that keys report caches and ETags on every document write
+    setup_document_version(db.engine)
+    
+    # Union view over system_log and its monthly partitions, see log_partitions.py
+    setup_log_partitions(db.engine)
+    
+    # Catch up on log rotation missed while the app was down; concurrent
+    # workers take turns and only the first finds anything to move
+    try:
+        rotate_log_partitions()
+    except Exception as e:
+        print(f"Error rotating system log: {str(e)}")
+    
+    # Reference-count attachment blobs from document_attachment
+    setup_attachment_blobs(db.engine)
+    
+    # Stores each distinct attachment once, under its SHA-256 digest
+    attachment_store = AttachmentStore(app.config['ATTACHMENT_STORE_FOLDER'])
+    
+    # Builds large reports in background threads, outside the request
+    report_jobs = ReportJobQueue(
+        db.engine,
+        app.config['REPORT_RESULTS_FOLDER'],
+        max_workers=app.config['REPORT_JOB_WORKERS'],
+        result_ttl=app.config['REPORT_RESULT_TTL']
+    )
+    
+    # Answers the live counter polls of open dashboards, see live_events.py
+    event_broker = EventBroker(
+        db.engine,
+        poll_interval=app.config['EVENTS_POLL_INTERVAL'],
+        max_concurrent=app.config['EVENTS_MAX_CONCURRENT']
+    )
+    
+    # Writes system log entries in batches off the request path, see log_writer.py
+    system_log_writer = SystemLogWriter(
+        db.engine,
+        SystemLog.__table__,
+        flush_interval=app.config['SYSTEM_LOG_FLUSH_INTERVAL'],
+        max_pending=app.config['SYSTEM_LOG_MAX_PENDING']
+    )
+    # Commit entries still queued when this process exits, e.g. a gunicorn worker stopping
+    atexit.register(system_log_writer.close)
+    
+    # Allocates DOC-YYYY-NNN codes from the document_sequence table
+    document_code_allocator = DocumentCodeAllocator(db.engine, app.config['DOCUMENT_CODE_BLOCK_SIZE'])
+    
     # Check if any users exist
     try:
         user_exists = db.session.query(User.id).first() is not None
@@ -365,6 +783,9 @@ with app.app_context():
             ]
             db.session.bulk_save_objects(logs)
             db.session.commit()
+    
+    # Documents created before the history table existed start with their creation event
+    backfill_document_history()
 
 @app.route('/')
 def home():
@@ -379,36 +800,84 @@ def index():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    users = User.query.all()
-    
-    # Count documents by status for stats
-    status_counts = {
-        'Incoming': Document.query.filter_by(status='Incoming').count(),
-        'Pending': Document.query.filter_by(status='Pending').count(),
-        'Received': Document.query.filter_by(status='Received').count(),
-        'Outgoing': Document.query.filter_by(status='Outgoing').count(),
-        'Ended': Document.query.filter_by(status='Ended').count()
-    }
+    # Assembled once per document data version and shared across requests
+    version = read_document_version(db.session)
+    summary = dashboard_cache.get_or_compute(('dashboard', version), load_dashboard_summary)
+    return render_template('dashboard_new.html', **summary)
+
+# Users shown in the dashboard's recently active list
+DASHBOARD_RECENT_USERS = 5
+
+def load_dashboard_summary():
+    """Everything the dashboard shows, as plain values that can be cached.
+
+    Each part is a bounded query: counts come from the counters table and
+    the lists are LIMITed on an index, so the cost does not grow with the
+    number of users or documents.
+    """
+    counts = get_document_counts()
+    status_counts = counts.by_status()
     
     # Get recent activity
-    recent_logs = SystemLog.query.order_by(SystemLog.timestamp.desc()).limit(10).all()
+    recent_logs = [
+        {'timestamp': log.timestamp, 'log_type': log.log_type, 'user': log.user,
+         'action': log.action, 'details': log.details}
+        for log in SystemLog.query.order_by(SystemLog.timestamp.desc()).limit(10)
+    ]
     
     # Get urgent documents
-    urgent_docs = Document.query.filter_by(priority='Urgent').order_by(Document.created_at.desc()).limit(5).all()
+    urgent_docs = [
+        {'code': doc.code, 'title': doc.title, 'sender': doc.sender, 'status': doc.status,
+         'created_at': doc.created_at}
+        for doc in Document.query.filter_by(priority='Urgent').order_by(Document.created_at.desc()).limit(5)
+    ]
     
-    # Get total counts
-    total_documents = Document.query.count()
-    total_users = User.query.count()
+    # Recently active users instead of the whole user table
+    recent_users = [
+        {'username': username, 'department': department, 'last_login': last_login}
+        for username, department, last_login in db.session.query(User.username, User.department, User.last_login)
+            .filter(User.last_login.isnot(None))
+            .order_by(User.last_login.desc())
+            .limit(DASHBOARD_RECENT_USERS)
+    ]
     
-    return render_template(
-        'dashboard_new.html', 
-        users=users,
-        status_counts=status_counts,
-        recent_logs=recent_logs,
-        urgent_docs=urgent_docs,
-        total_documents=total_documents,
-        total_users=total_users
-    )
+    return {
+        'status_counts': status_counts,
+        'incoming_count': status_counts['Incoming'],
+        'pending_count': status_counts['Pending'],
+        'received_count': status_counts['Received'],
+        'ended_count': status_counts['Ended'],
+        'recent_logs': recent_logs,
+        'urgent_docs': urgent_docs,
+        'recent_users': recent_users,
+        'total_documents': counts.total,
+        'total_docs': counts.total,
+        'total_users': User.query.count(),
+        'active_users': User.query.filter_by(is_active=True).count()
+    }
+
+@app.route('/events/counters')
+@login_required
+def counter_events():
+    """Counter changes, urgent arrivals and new log entries since the last poll, as Server-Sent Events.
+    
+    The response is complete as soon as it is written. The browser polls
+    again after EVENTS_RETRY seconds, sending the cursor back as
+    Last-Event-ID, so open tabs never hold a request thread.
+    """
+    if not event_broker.acquire():
+        response = jsonify({'error': 'Too many live connections, please refresh the page later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    try:
+        events, cursor = event_broker.events(request.headers.get('Last-Event-ID'))
+    finally:
+        event_broker.release()
+    
+    body = f"retry: {app.config['EVENTS_RETRY'] * 1000}\n"
+    body += ''.join(format_event(event, data) for event, data in events) + format_cursor(cursor)
+    return app.response_class(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 @app.route('/compose', methods=['GET', 'POST'])
 def compose():
@@ -428,22 +897,8 @@ def compose():
             flash('Please fill in all required fields', 'danger')
             return render_template('compose.html', form_data=request.form)
         
-        # Generate document code
-        current_year = datetime.utcnow().year
-        last_doc = Document.query.filter(Document.code.like(f'DOC-{current_year}-%')).order_by(Document.code.desc()).first()
-        
-        if last_doc:
-            # Extract the sequence number from the last document code
-            try:
-                last_seq = int(last_doc.code.split('-')[-1])
-                new_seq = last_seq + 1
-            except ValueError:
-                new_seq = 1
-        else:
-            new_seq = 1
-            
-        # Create document code with format DOC-YYYY-NNN
-        doc_code = f'DOC-{current_year}-{new_seq:03d}'
+        # Allocate the next document code (format DOC-YYYY-NNN)
+        doc_code = document_code_allocator.next_code(datetime.utcnow().year)
         
         # Create new document
         new_document = Document(
@@ -461,47 +916,26 @@ def compose():
         )
         
         db.session.add(new_document)
-        db.session.commit()  # Commit to generate the document ID
+        db.session.flush()  # Assign the document ID; the request commits once at the end
+        
+        record_document_event(new_document, 'Document Created', f'Document {doc_code} was created')
         
         # Handle file upload if provided
         if 'document_file' in request.files:
             document_file = request.files['document_file']
             
             if document_file and document_file.filename:
-                original_filename = document_file.filename
-                # Secure filename to prevent security issues
-                filename = secure_filename(original_filename)
-                # Add document code to filename to ensure uniqueness
-                file_parts = os.path.splitext(filename)
-                unique_filename = f"{file_parts[0]}_{doc_code}{file_parts[1]}"
-                
-                # Save the file to the upload folder
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                document_file.save(file_path)
-                
-                # Get file size and type
-                file_size = os.path.getsize(file_path)
-                file_type = os.path.splitext(filename)[1][1:].lower()  # Remove the dot from extension
-                
-                # Create document attachment record
-                attachment = DocumentAttachment(
-                    document_id=new_document.id,
-                    filename=unique_filename,
-                    original_filename=original_filename,
-                    file_type=file_type,
-                    file_size=file_size
-                )
-                db.session.add(attachment)
+                # Stored once per distinct content, see attachment_store.py
+                add_uploaded_attachment(new_document, document_file)
+                record_document_event(new_document, 'Attachment Added', f'File "{document_file.filename}" attached')
+        
+        unit_of_work.register()
         
         # Log the document creation
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',  # In a real app, this would be the current user
-            action='Document Created',
-            details=f'New {doc_type} document created with code {doc_code}'
+        write_system_log(
+            'Success', 'Admin', 'Document Created',
+            f'New {doc_type} document created with code {doc_code}'
         )
-        db.session.add(new_log)
-        db.session.commit()
         
         flash(f'Document {doc_code} has been created successfully', 'success')
         
@@ -521,26 +955,18 @@ def incoming():
     search_query = request.args.get('search', '')
     status_filter = request.args.get('status', 'All')
     priority_filter = request.args.get('priority', 'All')
-    sort_by = request.args.get('sort_by', 'date')
+    sort_by = request.args.get('sort_by', 'relevance' if search_query else 'date')
     sort_order = request.args.get('sort_order', 'desc')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 10  # Number of documents per page
     
     # Start with all documents that are incoming
-    query = Document.query.filter(Document.status.in_(['Incoming', 'Pending', 'Received']))
+    query = Document.query.filter(Document.status.in_(INCOMING_STATUSES))
     
     # Apply search filter if provided
+    match_query = None
     if search_query:
-        search_terms = f"%{search_query}%"
-        query = query.filter(
-            db.or_(
-                Document.code.like(search_terms),
-                Document.sender.like(search_terms),
-                Document.recipient.like(search_terms),
-                Document.details.like(search_terms),
-                Document.required_action.like(search_terms)
-            )
-        )
+        query, match_query = apply_document_search(query, search_query)
     
     # Apply status filter if not 'All'
     if status_filter != 'All':
@@ -550,66 +976,23 @@ def incoming():
     if priority_filter != 'All':
         query = query.filter(Document.priority == priority_filter)
     
-    # Apply sorting
-    if sort_by == 'code':
-        if sort_order == 'asc':
-            query = query.order_by(Document.code.asc())
-        else:
-            query = query.order_by(Document.code.desc())
-    elif sort_by == 'date':
-        if sort_order == 'asc':
-            query = query.order_by(Document.date_received.asc())
-        else:
-            query = query.order_by(Document.date_received.desc())
-    elif sort_by == 'priority':
-        # Custom ordering for priority (Urgent > Priority > Normal)
-        if sort_order == 'asc':
-            # Normal (3) -> Priority (2) -> Urgent (1)
-            priority_case = case([
-                (Document.priority == 'Urgent', 1),
-                (Document.priority == 'Priority', 2),
-                (Document.priority == 'Normal', 3)
-            ], else_=4)
-            query = query.order_by(priority_case.asc())
-        else:
-            # Urgent (1) -> Priority (2) -> Normal (3)
-            priority_case = case([
-                (Document.priority == 'Urgent', 1),
-                (Document.priority == 'Priority', 2),
-                (Document.priority == 'Normal', 3)
-            ], else_=4)
-            query = query.order_by(priority_case.desc())
-    
-    # Pagination
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Keyset pagination on the active sort column (plus id as a tie-breaker)
+    sort_keys, order = document_sort_keys(sort_by, sort_order, match_query, Document.date_received)
+    pagination = KeysetPagination(query, sort_keys, per_page=per_page, cursor=cursor, order=order)
     documents = pagination.items
     
-    # Count documents by status for stats
-    status_counts = {
-        'Incoming': Document.query.filter_by(status='Incoming').count(),
-        'Pending': Document.query.filter_by(status='Pending').count(),
-        'Received': Document.query.filter_by(status='Received').count()
-    }
+    # Highlighted search snippets for the documents on this page
+    snippets = get_snippets(db.session, match_query, [doc.id for doc in documents])
     
-    # Count documents by priority for stats
-    priority_counts = {
-        'Urgent': Document.query.filter(
-            Document.status.in_(['Incoming', 'Pending', 'Received']), 
-            Document.priority == 'Urgent'
-        ).count(),
-        'Priority': Document.query.filter(
-            Document.status.in_(['Incoming', 'Pending', 'Received']), 
-            Document.priority == 'Priority'
-        ).count(),
-        'Normal': Document.query.filter(
-            Document.status.in_(['Incoming', 'Pending', 'Received']), 
-            Document.priority == 'Normal'
-        ).count()
-    }
+    # Count documents by status and priority for stats
+    counts = get_document_counts()
+    status_counts = counts.by_status(INCOMING_STATUSES)
+    priority_counts = counts.by_priority(['Urgent', 'Priority', 'Normal'], statuses=INCOMING_STATUSES)
     
     return render_template(
         'incoming.html', 
         documents=documents,
+        snippets=snippets,
         pagination=pagination,
         search_query=search_query,
         status_filter=status_filter,
@@ -632,37 +1015,15 @@ def track_document():
         document = Document.query.filter_by(code=doc_code).first()
         
         if document:
-            # Simulate document history
-            # In a real app, this would come from a document_history table
-            current_time = datetime.utcnow()
             history = [
                 {
-                    'timestamp': document.created_at,
-                    'action': 'Document Created',
-                    'user': 'Admin',
-                    'details': f'Document {doc_code} was created'
+                    'timestamp': event.timestamp,
+                    'action': event.action,
+                    'user': event.user,
+                    'details': event.details
                 }
+                for event in load_document_history(document.id)
             ]
-            
-            # Add history entries based on document status
-            if document.status != 'Incoming':
-                history.append({
-                    'timestamp': document.updated_at,
-                    'action': f'Status Changed to {document.status}',
-                    'user': 'Admin',
-                    'details': f'Document status updated to {document.status}'
-                })
-            
-            if document.status == 'Received':
-                history.append({
-                    'timestamp': document.updated_at - timedelta(hours=1),
-                    'action': 'Document Received',
-                    'user': document.current_holder or 'System',
-                    'details': f'Document was received by {document.current_holder}'
-                })
-                
-            # Sort history by timestamp (newest first)
-            history.sort(key=lambda x: x['timestamp'], reverse=True)
     
     return render_template(
         'track_document.html',
@@ -683,85 +1044,38 @@ def outgoing():
     # Get query parameters
     search_query = request.args.get('search', '')
     priority_filter = request.args.get('priority', 'All')
-    sort_by = request.args.get('sort_by', 'date')
+    sort_by = request.args.get('sort_by', 'relevance' if search_query else 'date')
     sort_order = request.args.get('sort_order', 'desc')
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 10  # Number of documents per page
     
     # Start with all documents that are outgoing
-    query = Document.query.filter(Document.status.in_(['Outgoing', 'Sent']))
+    query = Document.query.filter(Document.status.in_(OUTGOING_STATUSES))
     
     # Apply search filter if provided
+    match_query = None
     if search_query:
-        search_terms = f"%{search_query}%"
-        query = query.filter(
-            db.or_(
-                Document.code.like(search_terms),
-                Document.sender.like(search_terms),
-                Document.recipient.like(search_terms),
-                Document.details.like(search_terms),
-                Document.required_action.like(search_terms)
-            )
-        )
+        query, match_query = apply_document_search(query, search_query)
     
     # Apply priority filter if not 'All'
     if priority_filter != 'All':
         query = query.filter(Document.priority == priority_filter)
     
-    # Apply sorting
-    if sort_by == 'code':
-        if sort_order == 'asc':
-            query = query.order_by(Document.code.asc())
-        else:
-            query = query.order_by(Document.code.desc())
-    elif sort_by == 'date':
-        if sort_order == 'asc':
-            query = query.order_by(Document.date_of_letter.asc())
-        else:
-            query = query.order_by(Document.date_of_letter.desc())
-    elif sort_by == 'priority':
-        # Custom ordering for priority (Urgent > Priority > Normal)
-        # Convert the priority to a numeric value for sorting
-        if sort_order == 'asc':
-            # Normal (3) -> Priority (2) -> Urgent (1)
-            priority_case = case([
-                (Document.priority == 'Urgent', 1),
-                (Document.priority == 'Priority', 2),
-                (Document.priority == 'Normal', 3)
-            ], else_=4)
-            query = query.order_by(priority_case.asc())
-        else:
-            # Urgent (1) -> Priority (2) -> Normal (3)
-            priority_case = case([
-                (Document.priority == 'Urgent', 1),
-                (Document.priority == 'Priority', 2),
-                (Document.priority == 'Normal', 3)
-            ], else_=4)
-            query = query.order_by(priority_case.desc())
-    
-    # Pagination
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Keyset pagination on the active sort column (plus id as a tie-breaker)
+    sort_keys, order = document_sort_keys(sort_by, sort_order, match_query, Document.date_of_letter)
+    pagination = KeysetPagination(query, sort_keys, per_page=per_page, cursor=cursor, order=order)
     documents = pagination.items
     
+    # Highlighted search snippets for the documents on this page
+    snippets = get_snippets(db.session, match_query, [doc.id for doc in documents])
+    
     # Count documents by priority for stats
-    priority_counts = {
-        'Urgent': Document.query.filter(
-            Document.status.in_(['Outgoing', 'Sent']), 
-            Document.priority == 'Urgent'
-        ).count(),
-        'Priority': Document.query.filter(
-            Document.status.in_(['Outgoing', 'Sent']), 
-            Document.priority == 'Priority'
-        ).count(),
-        'Normal': Document.query.filter(
-            Document.status.in_(['Outgoing', 'Sent']), 
-            Document.priority == 'Normal'
-        ).count()
-    }
+    priority_counts = get_document_counts().by_priority(['Urgent', 'Priority', 'Normal'], statuses=OUTGOING_STATUSES)
     
     return render_template(
         'outgoing.html', 
         documents=documents,
+        snippets=snippets,
         pagination=pagination,
         search_query=search_query,
         priority_filter=priority_filter,
@@ -777,17 +1091,17 @@ def update_outgoing_status(doc_code):
     
     new_status = request.form.get('status')
     if new_status in ['Outgoing', 'Sent', 'Received', 'Ended']:
+        old_status = document.status
         document.status = new_status
+        record_document_event(document, f'Status Changed to {new_status}', f'Status changed from {old_status} to {new_status}')
+        
+        unit_of_work.register()
         
         # Log the status change
-        new_log = SystemLog(
-            log_type='Info',
-            user='Admin',
-            action='Document Status Update',
-            details=f'Document {doc_code} status changed to {new_status}'
+        write_system_log(
+            'Info', 'Admin', 'Document Status Update',
+            f'Document {doc_code} status changed to {new_status}'
         )
-        db.session.add(new_log)
-        db.session.commit()
         
         flash(f'Document {doc_code} has been updated to {new_status}', 'success')
     else:
@@ -806,21 +1120,13 @@ def outgoing_bulk_action():
         return redirect(url_for('outgoing'))
     
     if action == 'mark_sent':
-        for doc_code in selected_docs:
-            document = Document.query.filter_by(code=doc_code).first()
-            if document:
-                document.status = 'Sent'
-        
-        db.session.commit()
+        set_documents_status(selected_docs, 'Sent')
+        unit_of_work.register()
         flash(f'{len(selected_docs)} documents marked as sent', 'success')
     
     elif action == 'mark_received':
-        for doc_code in selected_docs:
-            document = Document.query.filter_by(code=doc_code).first()
-            if document:
-                document.status = 'Received'
-        
-        db.session.commit()
+        set_documents_status(selected_docs, 'Received')
+        unit_of_work.register()
         flash(f'{len(selected_docs)} documents marked as received', 'success')
     
     elif action == 'print':
@@ -841,21 +1147,13 @@ def incoming_bulk_action():
         return redirect(url_for('incoming'))
     
     if action == 'mark_pending':
-        for doc_code in selected_docs:
-            document = Document.query.filter_by(code=doc_code).first()
-            if document:
-                document.status = 'Pending'
-        
-        db.session.commit()
+        set_documents_status(selected_docs, 'Pending')
+        unit_of_work.register()
         flash(f'{len(selected_docs)} documents marked as pending', 'success')
     
     elif action == 'mark_received':
-        for doc_code in selected_docs:
-            document = Document.query.filter_by(code=doc_code).first()
-            if document:
-                document.status = 'Received'
-        
-        db.session.commit()
+        set_documents_status(selected_docs, 'Received')
+        unit_of_work.register()
         flash(f'{len(selected_docs)} documents marked as received', 'success')
     
     elif action == 'print':
@@ -885,22 +1183,14 @@ def document_details(doc_code):
     """View a single document's details"""
     document = Document.query.filter_by(code=doc_code).first_or_404()
     
-    # Get document history (in a real app, this would be from a history table)
-    # Here we'll simulate some history entries
-    current_time = datetime.utcnow()
     history = [
         {
-            'timestamp': (current_time - timedelta(days=random.randint(0, 5), hours=random.randint(0, 12))).strftime('%d %b %Y, %H:%M'),
-            'action': 'Document Created',
-            'user': 'Admin',
-            'details': f'Document {doc_code} was created'
-        },
-        {
-            'timestamp': (current_time - timedelta(days=random.randint(0, 3), hours=random.randint(0, 8))).strftime('%d %b %Y, %H:%M'),
-            'action': 'Status Changed',
-            'user': 'Admin',
-            'details': f'Document status changed to {document.status}'
+            'timestamp': event.timestamp.strftime('%d %b %Y, %H:%M'),
+            'action': event.action,
+            'user': event.user,
+            'details': event.details
         }
+        for event in load_document_history(document.id)
     ]
     
     # Format dates as strings for the template
@@ -922,7 +1212,8 @@ def document_details(doc_code):
         'processor': document.processor.username if document.processor else 'N/A',
         'attachments': document.attachments,
         'id': document.id,
-        'comments': document.comments
+        'comments': document.comments,
+        'history': history
     }
     
     return render_template(
@@ -948,14 +1239,18 @@ def maintenance():
     storage_used = sum(attachment.file_size for attachment in document_attachments) / (1024 * 1024)  # Convert to MB
     storage_used = f"{storage_used:.2f} MB"
     
-    # Get last backup time
+    # Get last backup time, looking past this month's log only if it has none
     last_backup = "Never"
-    system_logs = db.session.query(SystemLog).filter(
+    last_backup_at = db.session.query(SystemLog.timestamp).filter(
         SystemLog.action == 'Backup Completed'
-    ).first()
+    ).order_by(SystemLog.timestamp.desc()).limit(1).scalar()
+    if last_backup_at is None:
+        last_backup_at = db.session.execute(db.text(
+            f"SELECT MAX(timestamp) FROM {ALL_LOGS_VIEW} WHERE action = 'Backup Completed'"
+        )).scalar()
     
-    if system_logs:
-        last_backup = system_logs.timestamp.strftime('%Y-%m-%d %H:%M')
+    if last_backup_at:
+        last_backup = str(last_backup_at)[:16]
     
     # Get system logs
     logs = db.session.query(SystemLog).order_by(SystemLog.timestamp.desc()).limit(10).all()
@@ -1001,46 +1296,113 @@ def maintenance():
                           performance_data=performance_data,
                           now=now)
 
+# Report windows offered by the date_range filter, in days before today
+REPORT_DATE_RANGES = {'last-7-days': 7, 'last-30-days': 30, 'last-90-days': 90}
+
+def report_window(args, default_range='last-7-days'):
+    """Return the (start, end) dates, both inclusive, selected by report filters.
+
+    Explicit start/end dates (YYYY-MM-DD) take precedence over date_range.
+    Raises ValueError for malformed dates.
+    """
+    today = datetime.utcnow().date()
+    days = REPORT_DATE_RANGES.get(args.get('date_range', default_range), REPORT_DATE_RANGES[default_range])
+    start = datetime.strptime(args['start'], '%Y-%m-%d').date() if args.get('start') else today - timedelta(days=days)
+    end = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else today
+    if end < start:
+        raise ValueError('end must not be before start')
+    return start, end
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds this ETag, else None"""
+    # Pending flash messages must still be rendered
+    if request.if_none_match.contains(etag) and not session.get('_flashes'):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def with_etag(response, etag):
+    """Tag a report response so polling clients can revalidate it cheaply"""
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/reports')
 def reports():
     # Get filter parameters from query string
     date_range = request.args.get('date_range', 'last-7-days')
-    doc_type = request.args.get('type', 'all')
+    doc_type = request.args.get('type', 'all')  # Documents have no type column yet, so not applied
     status_filter = request.args.get('status', 'all')
     priority_filter = request.args.get('priority', 'all')
     
-    # Base query
-    query = Document.query
-    
-    # Apply filters
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
-    
-    if priority_filter != 'all':
-        query = query.filter_by(priority=priority_filter)
-    
-    # Get document counts by status
-    incoming_count = Document.query.filter_by(status='Incoming').count()
-    pending_count = Document.query.filter_by(status='Pending').count()
-    received_count = Document.query.filter_by(status='Received').count()
-    outgoing_count = Document.query.filter_by(status='Outgoing').count()
-    ended_count = Document.query.filter_by(status='Ended').count()
-    total_documents = Document.query.count()
-    
-    # Get document counts by priority and status
-    status_data = {}
-    for status in ['Incoming', 'Pending', 'Received', 'Outgoing', 'Ended']:
-        normal_count = Document.query.filter_by(status=status, priority='Normal').count()
-        priority_count = Document.query.filter_by(status=status, priority='Priority').count()
-        urgent_count = Document.query.filter_by(status=status, priority='Urgent').count()
-        
-        status_data[status] = {
-            'normal': normal_count,
-            'priority': priority_count,
-            'urgent': urgent_count,
-            'total': normal_count + priority_count + urgent_count,
+    try:
+        start, end = report_window(request.args)
+    except ValueError:
+        flash('Invalid date range, showing the last 7 days', 'warning')
+        date_range = 'last-7-days'
+        start, end = report_window({})
+    
+    # The page only changes when the documents (or the filters) do
+    version = read_document_version(db.session)
+    etag = report_etag('reports', version, session.get('user_id'), start, end, doc_type, status_filter, priority_filter)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    def build_report():
+        # Documents created in the window, from the daily rollup
+        counts = load_daily_counts(db.session, start, end).restricted(
+            statuses=None if status_filter == 'all' else [status_filter],
+            priorities=None if priority_filter == 'all' else [priority_filter]
+        )
+        status_counts = counts.by_status()
+        
+        # Get document counts by priority and status
+        status_data = {}
+        for status in STATUSES:
+            by_priority = counts.by_priority(statuses=[status])
+            status_data[status] = {
+                'normal': by_priority['Normal'],
+                'priority': by_priority['Priority'],
+                'urgent': by_priority['Urgent'],
+                'total': sum(by_priority.values()),
+            }
+        
+        # Prepare chart data
+        status_chart_data = [
+            {'name': 'Incoming', 'value': status_counts['Incoming'], 'color': '#2196F3'},
+            {'name': 'Pending', 'value': status_counts['Pending'], 'color': '#FFC107'},
+            {'name': 'Received', 'value': status_counts['Received'], 'color': '#4CAF50'},
+            {'name': 'Outgoing', 'value': status_counts['Outgoing'], 'color': '#9C27B0'},
+            {'name': 'Ended', 'value': status_counts['Ended'], 'color': '#F44336'}
+        ]
+        
+        priority_counts = counts.by_priority()
+        priority_chart_data = [
+            {'name': 'Normal', 'value': priority_counts['Normal'], 'color': '#4CAF50'},
+            {'name': 'Priority', 'value': priority_counts['Priority'], 'color': '#FFC107'},
+            {'name': 'Urgent', 'value': priority_counts['Urgent'], 'color': '#F44336'}
+        ]
+        
+        return {
+            'incoming_count': status_counts['Incoming'],
+            'pending_count': status_counts['Pending'],
+            'received_count': status_counts['Received'],
+            'outgoing_count': status_counts['Outgoing'],
+            'ended_count': status_counts['Ended'],
+            'total_documents': counts.total,
+            'status_data': status_data,
+            'status_chart_data': json.dumps(status_chart_data),
+            'priority_chart_data': json.dumps(priority_chart_data),
         }
     
+    report = report_cache.get_or_compute(
+        ('reports', version, start, end, status_filter, priority_filter), build_report
+    )
+    
     # Calculate average processing times (simplified)
     # In a real app, you'd calculate this from actual document histories
     avg_times = {
@@ -1051,97 +1413,169 @@ def reports():
         'Ended': 'N/A'
     }
     
-    # Prepare chart data
-    status_chart_data = [
-        {'name': 'Incoming', 'value': incoming_count, 'color': '#2196F3'},
-        {'name': 'Pending', 'value': pending_count, 'color': '#FFC107'},
-        {'name': 'Received', 'value': received_count, 'color': '#4CAF50'},
-        {'name': 'Outgoing', 'value': outgoing_count, 'color': '#9C27B0'},
-        {'name': 'Ended', 'value': ended_count, 'color': '#F44336'}
-    ]
-    
-    priority_chart_data = [
-        {'name': 'Normal', 'value': Document.query.filter_by(priority='Normal').count(), 'color': '#4CAF50'},
-        {'name': 'Priority', 'value': Document.query.filter_by(priority='Priority').count(), 'color': '#FFC107'},
-        {'name': 'Urgent', 'value': Document.query.filter_by(priority='Urgent').count(), 'color': '#F44336'}
-    ]
-    
-    return render_template('reports.html', 
-                          incoming_count=incoming_count,
-                          pending_count=pending_count,
-                          received_count=received_count,
-                          outgoing_count=outgoing_count,
-                          ended_count=ended_count,
-                          total_documents=total_documents,
-                          status_data=status_data,
+    return with_etag(render_template('reports.html', 
                           avg_times=avg_times,
-                          status_chart_data=json.dumps(status_chart_data),
-                          priority_chart_data=json.dumps(priority_chart_data),
                           filters={
                               'date_range': date_range,
                               'type': doc_type,
                               'status': status_filter,
-                              'priority': priority_filter
-                          })
+                              'priority': priority_filter,
+                              'start': start.isoformat(),
+                              'end': end.isoformat()
+                          },
+                          **report), etag)
 
 @app.route('/api/report-data')
 def report_data():
     report_type = request.args.get('type', 'document-summary')
-    date_range = request.args.get('date_range', 'last-7-days')
+    granularity = request.args.get('granularity', 'day')
     
-    if date_range == 'last-7-days':
-        start_date = datetime.utcnow() - timedelta(days=7)
-    elif date_range == 'last-30-days':
-        start_date = datetime.utcnow() - timedelta(days=30)
-    elif date_range == 'last-90-days':
-        start_date = datetime.utcnow() - timedelta(days=90)
-    else:
-        start_date = datetime.utcnow() - timedelta(days=30)  # Default
-    
-    if report_type == 'document-summary':
-        # Get documents created after start_date
-        documents = Document.query.filter(Document.created_at >= start_date).all()
-        data = {
-            'total': len(documents),
-            'by_status': {
-                'Incoming': len([d for d in documents if d.status == 'Incoming']),
-                'Pending': len([d for d in documents if d.status == 'Pending']),
-                'Received': len([d for d in documents if d.status == 'Received']),
-                'Outgoing': len([d for d in documents if d.status == 'Outgoing']),
-                'Ended': len([d for d in documents if d.status == 'Ended'])
-            },
-            'by_priority': {
-                'Normal': len([d for d in documents if d.priority == 'Normal']),
-                'Priority': len([d for d in documents if d.priority == 'Priority']),
-                'Urgent': len([d for d in documents if d.priority == 'Urgent'])
+    # Reports read the per-day rollup; explicit start/end dates
+    # (YYYY-MM-DD, inclusive) override date_range
+    try:
+        start, end = report_window(request.args, default_range='last-7-days')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if report_type not in ('document-summary', 'activity-analysis'):
+        return jsonify({'error': 'Invalid report type'})
+    
+    # Charts poll this endpoint; answer 304 until the documents change
+    version = read_document_version(db.session)
+    etag = report_etag('report-data', version, report_type, start, end, granularity)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    def build_report():
+        if report_type == 'document-summary':
+            # Count documents created in the window from the daily rollup
+            counts = load_daily_counts(db.session, start, end)
+            return {
+                'total': counts.total,
+                'by_status': counts.by_status(),
+                'by_priority': counts.by_priority()
             }
+        
+        # Count documents per day, week or month from the daily rollup
+        activity = load_daily_activity(db.session, start, end, granularity)
+        label_format = '%b %Y' if granularity == 'month' else '%b %d'
+        return {
+            'granularity': granularity,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'buckets': [day.isoformat() for day, count in activity],
+            'labels': [day.strftime(label_format) for day, count in activity],
+            'data': [count for day, count in activity]
         }
-        return jsonify(data)
     
-    elif report_type == 'activity-analysis':
-        # Group documents by day
-        documents = Document.query.filter(Document.created_at >= start_date).all()
-        
-        # Prepare date labels (last n days)
-        date_labels = []
-        date_data = []
-        
-        days = (datetime.utcnow() - start_date).days
-        for i in range(days, 0, -1):
-            day = datetime.utcnow() - timedelta(days=i)
-            date_str = day.strftime('%Y-%m-%d')
-            date_labels.append(day.strftime('%b %d'))
-            
-            # Count documents for this day
-            count = len([d for d in documents if d.created_at.strftime('%Y-%m-%d') == date_str])
-            date_data.append(count)
-        
-        return jsonify({
-            'labels': date_labels,
-            'data': date_data
-        })
+    try:
+        data = report_cache.get_or_compute(
+            ('report-data', version, report_type, start, end, granularity), build_report
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return with_etag(jsonify(data), etag)
+
+@app.route('/api/report-slice')
+def report_slice():
+    """Document counts sliced by status, priority, department and time, from the report snapshot"""
+    group_by = [dimension for dimension in request.args.get('group_by', 'week').split(',') if dimension]
+    try:
+        start, end = report_window(request.args)
+        counts = report_snapshot.current(db.engine).count(
+            start, end,
+            statuses=request.args.getlist('status') or None,
+            priorities=request.args.getlist('priority') or None,
+            departments=request.args.getlist('department') or None,
+            group_by=group_by
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rows = []
+    for group, count in sorted(counts.items()):
+        row = {dimension: value.isoformat() if hasattr(value, 'isoformat') else value
+               for dimension, value in zip(group_by, group)}
+        row['count'] = count
+        rows.append(row)
+    
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+        'dimensions': list(DIMENSIONS),
+        'total': sum(counts.values()),
+        'rows': rows
+    })
+
+def report_job_json(job):
+    """Public view of a report job for polling clients"""
+    data = {
+        'id': job['id'],
+        'report_type': job['report_type'],
+        'format': job['format'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'total': job['total'],
+        'percent': round(100 * job['progress'] / job['total']) if job['total'] else (100 if job['status'] == 'done' else 0),
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'expires_at': job['expires_at'],
+        'poll_url': url_for('report_job_status', job_id=job['id'])
+    }
+    if job['status'] == 'done':
+        data['download_url'] = url_for('download_report_job', job_id=job['id'])
+    return data
+
+@app.route('/api/report-jobs', methods=['POST'])
+def create_report_job():
+    """Queue a large report (CSV or PDF) to be built in the background"""
+    form = request.get_json(silent=True) or request.form
+    try:
+        start, end = report_window(form, default_range='last-30-days')
+        job_id = report_jobs.enqueue(
+            form.get('report_type', ''),
+            {'start': start.isoformat(), 'end': end.isoformat()},
+            fmt=form.get('format', 'csv'),
+            user=session.get('username', 'Admin')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({'error': 'Invalid report type'})
+    write_system_log(
+        'Info', session.get('username', 'Admin'), 'Report Queued',
+        f'{REPORTS[form.get("report_type")][0]} report queued for {start} to {end}'
+    )
+    
+    response = jsonify(report_job_json(report_jobs.get(job_id)))
+    response.status_code = 202
+    response.headers['Location'] = url_for('report_job_status', job_id=job_id)
+    return response
+
+@app.route('/api/report-jobs/<string:job_id>')
+def report_job_status(job_id):
+    """Poll a report job's progress"""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Report job not found or expired'}), 404
+    return jsonify(report_job_json(job))
+
+@app.route('/api/report-jobs/<string:job_id>/download')
+def download_report_job(job_id):
+    """Download a finished report"""
+    job = report_jobs.get(job_id)
+    if job is None or job['status'] != 'done':
+        return jsonify({'error': 'Report is not ready or has expired'}), 404
+    
+    download_name = f"{job['report_type']}-{datetime.utcnow().strftime('%Y%m%d')}.{job['format']}"
+    return send_from_directory(
+        app.config['REPORT_RESULTS_FOLDER'],
+        job['result_file'],
+        as_attachment=True,
+        download_name=download_name
+    )
 
 @app.route('/user-management', methods=['GET', 'POST'])
 @admin_required  
@@ -1182,8 +1616,7 @@ def user_management():
             role=role
         )
         
-        db.session.add(new_user)
-        db.session.commit()
+        unit_of_work.register(new_user)
         
         flash('User added successfully!', 'success')
         return redirect(url_for('user_management'))
@@ -1284,6 +1717,167 @@ def database_management():
                           tables=tables,
                           performance=performance)
 
+def canonical_queries():
+    """The hot-path queries checked by the index advisor, as (name, statement) pairs"""
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    return [
+        ('Dashboard: recent activity',
+         SystemLog.query.order_by(SystemLog.timestamp.desc()).limit(10).statement),
+        ('Dashboard: urgent documents',
+         Document.query.filter_by(priority='Urgent').order_by(Document.created_at.desc()).limit(5).statement),
+        ('Incoming: latest received',
+         Document.query.filter(Document.status.in_(INCOMING_STATUSES))
+         .order_by(Document.date_received.desc(), Document.id.desc()).limit(11).statement),
+        ('Incoming: filtered by status',
+         Document.query.filter(Document.status == 'Pending')
+         .order_by(Document.date_received.desc(), Document.id.desc()).limit(11).statement),
+        ('Incoming: sorted by priority',
+         Document.query.filter(Document.status == 'Incoming')
+         .order_by(Document.priority_rank, Document.date_received, Document.id).limit(11).statement),
+        ('Outgoing: latest letters',
+         Document.query.filter(Document.status.in_(OUTGOING_STATUSES))
+         .order_by(Document.date_of_letter.desc(), Document.id.desc()).limit(11).statement),
+        ('Track: document by code',
+         Document.query.filter_by(code='DOC-2025-001').statement),
+        ('Track: document history',
+         DocumentHistory.query.filter_by(document_id=1)
+         .order_by(DocumentHistory.timestamp.desc(), DocumentHistory.id.desc()).statement),
+        ('Reports: nightly rollup close-out',
+         document_day_counts_statement(week_ago.date(), week_ago.date())),
+        ('Reports: daily rollup for a year',
+         daily_counts_statement(week_ago.date() - timedelta(days=358), week_ago.date() + timedelta(days=7))),
+        ('Database: maintenance history',
+         SystemLog.query.filter(SystemLog.action.in_(['Database Optimized', 'Backup Completed']))
+         .order_by(SystemLog.timestamp.desc()).limit(8).statement),
+        ('Account: recent logins',
+         LoginActivity.query.filter_by(user_id=1).order_by(LoginActivity.login_date.desc()).limit(3).statement),
+    ]
+
+@app.route('/database-management/index-advisor')
+@admin_required
+def index_advisor():
+    """Explain the app's canonical queries and flag full table scans"""
+    results = analyze_queries(db.session, canonical_queries())
+    
+    # Show the worst plans first
+    severity = {'Error': 0, 'Full scan': 1, 'Temp sort': 2, 'OK': 3}
+    results.sort(key=lambda r: severity[r['status']])
+    
+    summary = {
+        'total': len(results),
+        'full_scans': len([r for r in results if r['status'] == 'Full scan']),
+        'temp_sorts': len([r for r in results if r['status'] == 'Temp sort']),
+        'errors': len([r for r in results if r['status'] == 'Error'])
+    }
+    
+    return render_template('index_advisor.html', results=results, summary=summary)
+
+def parse_archive_range(values):
+    """(month, first day, last day) from 'month', 'start' and 'end' request values"""
+    month = parse_month(values.get('month', ''))
+    start = datetime.strptime(values['start'], '%Y-%m-%d').date() if values.get('start') else None
+    end = datetime.strptime(values['end'], '%Y-%m-%d').date() if values.get('end') else None
+    return month, start, end
+
+@app.route('/database-management/log-archives')
+@admin_required
+def log_archives():
+    """List log partitions and archives, and browse an archived month"""
+    partitions = list_log_partitions(db.engine)
+    archives = list_log_archives(app.config['LOG_ARCHIVE_FOLDER'])
+    
+    browse = None
+    if request.args.get('month'):
+        try:
+            month, start, end = parse_archive_range(request.args)
+        except ValueError:
+            flash('Invalid month or date range', 'danger')
+            return redirect(url_for('log_archives'))
+        limit = app.config['LOG_ARCHIVE_BROWSE_LIMIT']
+        entries = list(islice(read_log_archive(app.config['LOG_ARCHIVE_FOLDER'], month, start, end), limit + 1))
+        browse = {
+            'month': month,
+            'start': start,
+            'end': end,
+            'entries': entries[:limit],
+            'truncated': len(entries) > limit
+        }
+    
+    return render_template(
+        'log_archives.html',
+        partitions=partitions,
+        archives=archives,
+        current_entries=SystemLog.query.count(),
+        retention_months=app.config['LOG_RETENTION_MONTHS'],
+        browse=browse
+    )
+
+@app.route('/database-management/log-archives/restore', methods=['POST'])
+@admin_required
+def restore_log_archives():
+    """Restore an archived month, or a day range of it, into its log partition"""
+    try:
+        month, start, end = parse_archive_range(request.form)
+    except ValueError:
+        flash('Invalid month or date range', 'danger')
+        return redirect(url_for('log_archives'))
+    
+    restored = restore_log_archive(db.engine, app.config['LOG_ARCHIVE_FOLDER'], month, start, end)
+    span = f'{start or month} to {end or add_months(month, 1) - timedelta(days=1)}'
+    write_system_log(
+        'Info', session.get('username', 'Admin'), 'Logs Restored',
+        f'{restored} archived log entries restored for {span}'
+    )
+    flash(f'{restored} archived log entries restored for {span}.', 'success')
+    return redirect(url_for('log_archives'))
+
+def log_query_from_args(args):
+    """LogQuery for the type, user, action, start and end query string filters"""
+    filters = {column: args.get(name) for name, column in LOG_FILTERS.items()}
+    start = parse_log_time(args['start']) if args.get('start') else None
+    end = parse_log_time(args['end'], end=True) if args.get('end') else None
+    return LogQuery(db.engine, filters, start, end)
+
+@app.route('/api/logs')
+@admin_required
+def api_logs():
+    """A page of system log entries, newest first, with the cursor for the next page"""
+    try:
+        query = log_query_from_args(request.args)
+        limit = min(
+            max(int(request.args.get('limit', app.config['LOG_QUERY_PAGE_SIZE'])), 1),
+            app.config['LOG_QUERY_MAX_PAGE_SIZE']
+        )
+        entries, next_cursor = query.page(request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    return jsonify({
+        'entries': entries,
+        'next_cursor': next_cursor,
+        'next_url': url_for('api_logs', cursor=next_cursor, **args) if next_cursor else None
+    })
+
+@app.route('/api/logs/export')
+@admin_required
+def export_logs():
+    """Stream every matching system log entry as newline-delimited JSON"""
+    try:
+        query = log_query_from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def stream():
+        for entry in query.iter_entries():
+            yield json.dumps(entry) + '\n'
+    
+    filename = f"system-log-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.ndjson"
+    return app.response_class(stream(), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
 @app.route('/add-user', methods=['POST'])
 @admin_required
 def add_user():
@@ -1316,8 +1910,7 @@ def add_user():
         role=role
     )
     
-    db.session.add(new_user)
-    db.session.commit()
+    unit_of_work.register(new_user)
     
     flash('User added successfully!', 'success')
     return redirect(url_for('user_management'))
@@ -1338,7 +1931,7 @@ def edit_user(user_id):
     if new_password:
         user.password = generate_password_hash(new_password)
     
-    db.session.commit()
+    unit_of_work.register()
     
     flash('User updated successfully!', 'success')
     return redirect(url_for('user_management'))
@@ -1354,7 +1947,7 @@ def delete_user(user_id):
         return redirect(url_for('user_management'))
     
     db.session.delete(user)
-    db.session.commit()
+    unit_of_work.register()
     
     flash('User deleted successfully!', 'success')
     return redirect(url_for('user_management'))
@@ -1385,7 +1978,7 @@ def update_profile():
         user.phone = request.form.get('phone')
         user.department = request.form.get('department')
         
-        db.session.commit()
+        unit_of_work.register()
         flash('Profile updated successfully!', 'success')
         
     return redirect(url_for('my_account'))
@@ -1408,7 +2001,7 @@ def change_password():
         else:
             # In a real app, you would hash the new password
             user.password = new_password
-            db.session.commit()
+            unit_of_work.register()
             flash('Password changed successfully!', 'success')
         
     return redirect(url_for('my_account'))
@@ -1425,104 +2018,63 @@ def maintenance_action():
     
     if action == 'backup':
         # Simulate backup
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Backup Completed',
-            details='System backup completed successfully'
-        )
-        db.session.add(new_log)
-        db.session.commit()
+        write_system_log('Success', 'Admin', 'Backup Completed', 'System backup completed successfully')
         flash('Database backup completed successfully!', 'success')
     
     elif action == 'clean':
         # Simulate cleaning temp files
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Cleanup Completed',
-            details='Temporary files cleaned successfully'
-        )
-        db.session.add(new_log)
-        db.session.commit()
+        write_system_log('Success', 'Admin', 'Cleanup Completed', 'Temporary files cleaned successfully')
         flash('Temporary files cleaned successfully!', 'success')
     
     elif action == 'optimize':
         # Simulate database optimization
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Database Optimized',
-            details='Database optimization completed'
-        )
-        db.session.add(new_log)
-        db.session.commit()
+        write_system_log('Success', 'Admin', 'Database Optimized', 'Database optimization completed')
         flash('Database optimization completed!', 'success')
     
     elif action == 'integrity_check':
         # Simulate database integrity check
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Database Integrity Check',
-            details='Database integrity check completed successfully. All tables are intact.'
+        write_system_log(
+            'Success', 'Admin', 'Database Integrity Check',
+            'Database integrity check completed successfully. All tables are intact.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash('Database integrity check completed. No issues found!', 'success')
     
     elif action == 'vacuum':
         # Simulate database vacuum
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Database Vacuum',
-            details='Database vacuum operation completed successfully. Database size reduced.'
+        write_system_log(
+            'Success', 'Admin', 'Database Vacuum',
+            'Database vacuum operation completed successfully. Database size reduced.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash('Database vacuum completed successfully!', 'success')
     
     elif action == 'optimize_table':
         # Get table name from form
         table_name = request.form.get('table_name')
         # Simulate table optimization
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Table Optimized',
-            details=f'Table "{table_name}" optimized successfully.'
+        write_system_log(
+            'Success', 'Admin', 'Table Optimized',
+            f'Table "{table_name}" optimized successfully.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash(f'Table "{table_name}" optimized successfully!', 'success')
     
     elif action == 'truncate_table':
         # Get table name from form
         table_name = request.form.get('table_name')
         # Simulate table truncation
-        new_log = SystemLog(
-            log_type='Warning',
-            user='Admin',
-            action='Table Truncated',
-            details=f'Table "{table_name}" truncated, all records removed.'
+        write_system_log(
+            'Warning', 'Admin', 'Table Truncated',
+            f'Table "{table_name}" truncated, all records removed.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash(f'Table "{table_name}" truncated successfully. All records removed.', 'warning')
     
     elif action == 'restore_backup':
         # Get backup name from form
         backup_name = request.form.get('backup_name')
         # Simulate backup restoration
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Backup Restored',
-            details=f'Database restored from backup "{backup_name}" successfully.'
+        write_system_log(
+            'Success', 'Admin', 'Backup Restored',
+            f'Database restored from backup "{backup_name}" successfully.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash(f'Database restored from backup "{backup_name}" successfully!', 'success')
     
     elif action == 'download_backup':
@@ -1538,50 +2090,69 @@ def maintenance_action():
         # Get backup name from form
         backup_name = request.form.get('backup_name')
         # Simulate backup deletion
-        new_log = SystemLog(
-            log_type='Warning',
-            user='Admin',
-            action='Backup Deleted',
-            details=f'Backup "{backup_name}" deleted from the system.'
+        write_system_log(
+            'Warning', 'Admin', 'Backup Deleted',
+            f'Backup "{backup_name}" deleted from the system.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash(f'Backup "{backup_name}" deleted successfully.', 'warning')
     
     elif action == 'update':
         # Simulate checking for updates
-        new_log = SystemLog(
-            log_type='Info',
-            user='System',
-            action='Update Check',
-            details='No updates available at this time'
-        )
-        db.session.add(new_log)
-        db.session.commit()
+        write_system_log('Info', 'System', 'Update Check', 'No updates available at this time')
         flash('System is up to date!', 'info')
     
     elif action == 'disk_cleanup':
         # Simulate disk cleanup
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Disk Cleanup',
-            details='Disk cleanup operation completed successfully. 1.2 GB space freed.'
+        write_system_log(
+            'Success', 'Admin', 'Disk Cleanup',
+            'Disk cleanup operation completed successfully. 1.2 GB space freed.'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash('Disk cleanup completed successfully! 1.2 GB of space has been freed.', 'success')
     
+    elif action == 'rebuild_counters':
+        # Recompute the dashboard counters and report any drift
+        drift = rebuild_document_counters(db.engine)
+        if drift:
+            details = '; '.join(
+                f'{status or "(none)"}/{priority or "(none)"}/{direction}: {stored} -> {actual}'
+                for status, priority, direction, stored, actual in drift
+            )
+            write_system_log(
+                'Warning', 'Admin', 'Counters Rebuilt',
+                f'Document counters rebuilt, {len(drift)} drifted: {details}'
+            )
+            flash(f'Document counters rebuilt. Corrected {len(drift)} drifted counter(s): {details}', 'warning')
+        else:
+            write_system_log('Success', 'Admin', 'Counters Rebuilt', 'Document counters rebuilt, no drift found')
+            flash('Document counters rebuilt. No drift found.', 'success')
+    
+    elif action == 'collect_attachments':
+        # Delete attachment blobs that no attachment has referenced for the grace period
+        removed, freed = attachment_store.collect_garbage(
+            db.engine, timedelta(seconds=app.config['ATTACHMENT_GC_GRACE'])
+        )
+        summary = f'{removed} unreferenced attachment file(s) removed, {freed / (1024 * 1024):.1f} MB freed'
+        write_system_log('Success', 'Admin', 'Attachments Cleaned', summary)
+        flash(f'{summary}.', 'success')
+    
+    elif action == 'rotate_logs':
+        # Partition older log entries by month and archive expired partitions
+        moved, archived = rotate_log_partitions()
+        summary = (
+            f'{sum(moved.values())} entries moved into {len(moved)} monthly partition(s), '
+            f'{len(archived)} partition(s) archived'
+        )
+        write_system_log('Success', 'Admin', 'Logs Archived', f'System log rotated: {summary}')
+        flash(f'System log rotated: {summary}.', 'success')
+    
     elif action == 'reindex':
-        # Simulate document reindexing
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='Document Reindex',
-            details=f'Successfully reindexed {Document.query.count()} documents'
+        # Rebuild the full-text search index from the document table
+        if FTS_ENABLED:
+            rebuild_document_fts(db.engine)
+        write_system_log(
+            'Success', 'Admin', 'Document Reindex',
+            f'Successfully reindexed {Document.query.count()} documents'
         )
-        db.session.add(new_log)
-        db.session.commit()
         flash(f'Successfully reindexed {Document.query.count()} documents!', 'success')
     
     return redirect(url_for('database_management'))
@@ -1621,14 +2192,10 @@ def toggle_scheduled_task():
     # In a real app, this would update task configuration
     
     # Log the action
-    new_log = SystemLog(
-        log_type='Info',
-        user='Admin',
-        action='Task Configuration',
-        details=f'Task {task_id} {"enabled" if enabled else "disabled"}'
+    write_system_log(
+        'Info', 'Admin', 'Task Configuration',
+        f'Task {task_id} {"enabled" if enabled else "disabled"}'
     )
-    db.session.add(new_log)
-    db.session.commit()
     
     return jsonify({'success': True, 'taskId': task_id, 'enabled': enabled})
 
@@ -1640,14 +2207,7 @@ def update_indexing_settings():
     # In a real app, this would update indexing configuration
     
     # Log the action
-    new_log = SystemLog(
-        log_type='Info',
-        user='Admin',
-        action='Indexing Configuration',
-        details=f'Indexing configuration updated: {settings}'
-    )
-    db.session.add(new_log)
-    db.session.commit()
+    write_system_log('Info', 'Admin', 'Indexing Configuration', f'Indexing configuration updated: {settings}')
     
     return jsonify({'success': True})
 
@@ -1658,17 +2218,17 @@ def update_incoming_status(doc_code):
     
     new_status = request.form.get('status')
     if new_status in ['Incoming', 'Pending', 'Received', 'Outgoing', 'Ended']:
+        old_status = document.status
         document.status = new_status
+        record_document_event(document, f'Status Changed to {new_status}', f'Status changed from {old_status} to {new_status}')
+        
+        unit_of_work.register()
         
         # Log the status change
-        new_log = SystemLog(
-            log_type='Info',
-            user='Admin',
-            action='Document Status Update',
-            details=f'Document {doc_code} status changed to {new_status}'
+        write_system_log(
+            'Info', 'Admin', 'Document Status Update',
+            f'Document {doc_code} status changed to {new_status}'
         )
-        db.session.add(new_log)
-        db.session.commit()
         
         flash(f'Document {doc_code} has been updated to {new_status}', 'success')
     else:
@@ -1696,17 +2256,12 @@ def add_comment(doc_code):
         comment=comment_text
     )
     
-    # Log the activity
-    new_log = SystemLog(
-        log_type='Info',
-        user=user.username,
-        action='Comment Added',
-        details=f'Comment added to document {doc_code}'
-    )
-    
     db.session.add(new_comment)
-    db.session.add(new_log)
-    db.session.commit()
+    record_document_event(document, 'Comment Added', comment_text, user=user.username)
+    unit_of_work.register()
+    
+    # Log the activity
+    write_system_log('Info', user.username, 'Comment Added', f'Comment added to document {doc_code}')
     
     flash('Comment added successfully', 'success')
     return redirect(url_for('document_details', doc_code=doc_code))
@@ -1727,43 +2282,19 @@ def add_attachment(doc_code):
         return redirect(url_for('document_details', doc_code=doc_code))
     
     if attachment_file:
-        # Process the file similar to the compose endpoint
+        # Stored once per distinct content, like the compose endpoint
         original_filename = attachment_file.filename
-        # Secure filename to prevent security issues
-        filename = secure_filename(original_filename)
-        # Add document code to filename to ensure uniqueness
-        file_parts = os.path.splitext(filename)
-        unique_filename = f"{file_parts[0]}_{doc_code}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{file_parts[1]}"
-        
-        # Save the file to the upload folder
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        attachment_file.save(file_path)
-        
-        # Get file size and type
-        file_size = os.path.getsize(file_path)
-        file_type = os.path.splitext(filename)[1][1:].lower()  # Remove the dot from extension
-        
-        # Create document attachment record
-        attachment = DocumentAttachment(
-            document_id=document.id,
-            filename=unique_filename,
-            original_filename=original_filename,
-            file_type=file_type,
-            file_size=file_size
-        )
+        add_uploaded_attachment(document, attachment_file)
         
-        # Log the activity
         user = User.query.first()  # Just get the first user for now
-        new_log = SystemLog(
-            log_type='Info',
-            user=user.username,
-            action='Attachment Added',
-            details=f'File "{original_filename}" added to document {doc_code}'
-        )
+        record_document_event(document, 'Attachment Added', f'File "{original_filename}" attached', user=user.username)
+        unit_of_work.register()
         
-        db.session.add(attachment)
-        db.session.add(new_log)
-        db.session.commit()
+        # Log the activity
+        write_system_log(
+            'Info', user.username, 'Attachment Added',
+            f'File "{original_filename}" added to document {doc_code}'
+        )
         
         flash('Attachment added successfully', 'success')
     
@@ -1774,9 +2305,22 @@ def download_attachment(attachment_id):
     """Download a document attachment"""
     attachment = DocumentAttachment.query.get_or_404(attachment_id)
     
-    # The file is already in the static/uploads folder
-    # Redirect to the static URL for the file
-    return redirect(url_for('static', filename=f'uploads/{attachment.filename}'))
+    if attachment.sha256:
+        # Blobs never change, so the digest is a strong ETag
+        return send_file(
+            attachment_store.path(attachment.sha256),
+            as_attachment=True,
+            download_name=attachment.original_filename,
+            etag=attachment.sha256
+        )
+    
+    # Attachments uploaded before the store are named files in the upload folder
+    return send_from_directory(
+        app.config['UPLOAD_FOLDER'],
+        attachment.filename,
+        as_attachment=True,
+        download_name=attachment.original_filename
+    )
 
 @app.route('/api/table-structure/<table_name>')
 def get_table_structure(table_name):
@@ -1915,7 +2459,7 @@ def login():
                 
                 # Update last login time
                 user.last_login = datetime.now()
-                db.session.commit()
+                unit_of_work.register()
                 
                 # Log login activity
                 log_login_activity(user.id, user.email, request.remote_addr)
@@ -1993,20 +2537,15 @@ def quick_add_user():
             role=role  # Use the role from the form instead of hardcoding to 'User'
         )
         
-        db.session.add(new_user)
-        db.session.commit()
+        unit_of_work.register(new_user)
         
         print(f"Successfully added new user: {new_user}")
         
         # Log to the system log too
-        new_log = SystemLog(
-            log_type='Success',
-            user='Admin',
-            action='User Added',
-            details=f'New user {username} with email {email} and role {role} added successfully'
+        write_system_log(
+            'Success', 'Admin', 'User Added',
+            f'New user {username} with email {email} and role {role} added successfully'
         )
-        db.session.add(new_log)
-        db.session.commit()
         
         flash('User added successfully!', 'success')
         return redirect(url_for('user_management'))
@@ -2090,7 +2629,7 @@ def batch_user_action():
                 # This is just a placeholder since our model doesn't have status
                 pass
             
-            db.session.commit()
+            unit_of_work.register()
             flash(f'{len(users)} users have been activated successfully', 'success')
             
         elif action == 'deactivate':
@@ -2101,7 +2640,7 @@ def batch_user_action():
                 # This is just a placeholder since our model doesn't have status
                 pass
             
-            db.session.commit()
+            unit_of_work.register()
             flash(f'{len(users)} users have been deactivated successfully', 'success')
             
         elif action == 'delete':
@@ -2114,7 +2653,7 @@ def batch_user_action():
             
             # Delete users
             deleted_count = User.query.filter(User.id.in_(user_ids)).delete(synchronize_session='fetch')
-            db.session.commit()
+            unit_of_work.register()
             flash(f'{deleted_count} users have been deleted successfully', 'success')
             
         elif action == 'assign-role':
@@ -2128,7 +2667,7 @@ def batch_user_action():
             for user in users:
                 user.role = role
             
-            db.session.commit()
+            unit_of_work.register()
             flash(f'Role has been updated for {len(users)} users', 'success')
             
         elif action == 'assign-department':
@@ -2142,7 +2681,7 @@ def batch_user_action():
             for user in users:
                 user.department = department
             
-            db.session.commit()
+            unit_of_work.register()
             flash(f'Department has been updated for {len(users)} users', 'success')
             
         elif action == 'reset-password':
@@ -2161,18 +2700,14 @@ def batch_user_action():
                 # For this demo, we'll just log it
                 print(f"Reset password for {user.username}: {random_password}")
             
-            db.session.commit()
+            unit_of_work.register()
             flash(f'Passwords have been reset for {len(users)} users', 'success')
             
         # Log the action
-        new_log = SystemLog(
-            log_type='Info',
-            user='Admin',  # In a real app, use the current user
-            action=f'Batch User Action: {action}',
-            details=f'Performed {action} on {len(user_ids)} users'
+        write_system_log(
+            'Info', 'Admin', f'Batch User Action: {action}',
+            f'Performed {action} on {len(user_ids)} users'
         )
-        db.session.add(new_log)
-        db.session.commit()
         
         return redirect(url_for('user_management'))
         
@@ -2273,7 +2808,7 @@ def bulk_user_action():
         for user in users:
             user.is_active = True
             log_activity(f"Activated user: {user.username}", current_user.username)
-        db.session.commit()
+        unit_of_work.register()
         flash(f'{len(users)} users have been activated', 'success')
     
     elif action == 'deactivate':
@@ -2283,7 +2818,7 @@ def bulk_user_action():
                 continue
             user.is_active = False
             log_activity(f"Deactivated user: {user.username}", current_user.username)
-        db.session.commit()
+        unit_of_work.register()
         flash(f'{len(users)} users have been deactivated', 'success')
     
     elif action == 'delete':
@@ -2296,7 +2831,7 @@ def bulk_user_action():
             db.session.delete(user)
             deleted_count += 1
         
-        db.session.commit()
+        unit_of_work.register()
         flash(f'{deleted_count} users have been deleted', 'success')
     
     elif action == 'assign_role':
@@ -2309,7 +2844,7 @@ def bulk_user_action():
             user.role = role
             log_activity(f"Changed role for user {user.username} to {role}", current_user.username)
         
-        db.session.commit()
+        unit_of_work.register()
         flash(f'Role updated for {len(users)} users', 'success')
     
     elif action == 'assign_department':
@@ -2322,7 +2857,7 @@ def bulk_user_action():
             user.department = department
             log_activity(f"Changed department for user {user.username} to {department}", current_user.username)
         
-        db.session.commit()
+        unit_of_work.register()
         flash(f'Department updated for {len(users)} users', 'success')
     
     elif action == 'reset-password':
@@ -2342,7 +2877,7 @@ def bulk_user_action():
             flash(f'New password for {user.username}: {new_password}', 'info')
             reset_count += 1
         
-        db.session.commit()
+        unit_of_work.register()
         flash(f'Passwords reset for {reset_count} users', 'success')
     
     else:
@@ -2386,7 +2921,7 @@ def reset_single_password(user_id):
     log_activity(f"Reset password for user: {user.username}", current_user.username)
     
     # Save changes
-    db.session.commit()
+    unit_of_work.register()
     
     # Check if we should email the password
     if request.form.get('email_password') == 'on':
@@ -2437,7 +2972,7 @@ def toggle_user_status(user_id):
     else:
         flash('Invalid action', 'danger')
     
-    db.session.commit()
+    unit_of_work.register()
     return redirect(url_for('user_management'))
 
 @app.route('/export-users', methods=['POST'])
@@ -2730,8 +3265,8 @@ def file_upload():
         else:
             unique_filename = original_filename
             
-        # Save the file
-        file.save(file_path)
+        # Save the file; it only appears in the file manager once complete
+        attachment_store.save_as(file.stream, file_path)
         print(f"File saved successfully to: {file_path}")
         
         flash(f'File {original_filename} uploaded successfully', 'success')
@@ -2816,27 +3351,23 @@ def delete_file():
         attachment = DocumentAttachment.query.filter_by(original_filename=filename).first()
         
         if attachment:
-            # Get the actual filename on disk
-            file_to_delete = attachment.filename
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], file_to_delete)
-            
-            # Delete the file from disk if it exists
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # Stored blobs are shared and go once unreferenced (see attachment_store.py);
+            # older attachments are named files of their own
+            if not attachment.sha256:
+                file_path = os.path.join(app.config['UPLOAD_FOLDER'], attachment.filename)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
             
             # Delete the database record
             db.session.delete(attachment)
+            unit_of_work.register()
             
             # Log the activity
             current_user = User.query.get(session['user_id'])
-            log = SystemLog(
-                log_type='Warning',
-                user=current_user.username if current_user else 'Unknown',
-                action='File Deleted',
-                details=f'File "{filename}" was deleted'
+            write_system_log(
+                'Warning', current_user.username if current_user else 'Unknown', 'File Deleted',
+                f'File "{filename}" was deleted'
             )
-            db.session.add(log)
-            db.session.commit()
             
             return jsonify({'success': True, 'message': f'File {filename} deleted successfully'})
         else:
@@ -2851,14 +3382,10 @@ def delete_file():
                         
                         # Log the activity
                         current_user = User.query.get(session['user_id'])
-                        log = SystemLog(
-                            log_type='Warning',
-                            user=current_user.username if current_user else 'Unknown',
-                            action='File Deleted',
-                            details=f'File "{filename}" was deleted (no database record found)'
+                        write_system_log(
+                            'Warning', current_user.username if current_user else 'Unknown', 'File Deleted',
+                            f'File "{filename}" was deleted (no database record found)'
                         )
-                        db.session.add(log)
-                        db.session.commit()
                         
                         return jsonify({'success': True, 'message': f'File {filename} deleted successfully'})
             
@@ -2887,17 +3414,12 @@ def add_document_comment(document_code):
         comment=comment_text
     )
     
-    # Log the activity
-    new_log = SystemLog(
-        log_type='Info',
-        user=user.username,
-        action='Comment Added',
-        details=f'Comment added to document {document_code}'
-    )
-    
     db.session.add(new_comment)
-    db.session.add(new_log)
-    db.session.commit()
+    record_document_event(document, 'Comment Added', comment_text, user=user.username)
+    unit_of_work.register()
+    
+    # Log the activity
+    write_system_log('Info', user.username, 'Comment Added', f'Comment added to document {document_code}')
     
     flash('Comment added successfully', 'success')
     return redirect(url_for('document_details', doc_code=document_code))
@@ -2922,8 +3444,10 @@ def reassign_document(document_code):
         return redirect(url_for('document_details', doc_code=document_code))
     
     # Update document holder
+    old_holder = document.current_holder
     document.current_holder = new_holder
-    db.session.commit()
+    record_document_event(document, 'Document Reassigned', f'Transferred from {old_holder or "nobody"} to {new_holder}')
+    unit_of_work.register()
     
     flash(f'Document {document_code} has been transferred to {new_holder}', 'success')
     return redirect(url_for('document_details', doc_code=document_code))
@@ -2950,6 +3474,8 @@ def registry_decision(tracking_code):
         flash('Invalid decision', 'danger')
         return redirect(url_for('registry_workflow'))
     
+    record_document_event(document, document.status, comments or f'Registry {decision} for document {tracking_code}')
+    
     # Add the comment if provided
     if comments:
         user = User.query.first()  # Just get the first user for now
@@ -2960,15 +3486,13 @@ def registry_decision(tracking_code):
         )
         db.session.add(new_comment)
     
+    unit_of_work.register()
+    
     # Log the activity
-    new_log = SystemLog(
-        log_type='Info',
-        user='Admin',
-        action='Registry Decision',
-        details=f"Registry {decision} for document {tracking_code}"
+    write_system_log(
+        'Info', 'Admin', 'Registry Decision',
+        f"Registry {decision} for document {tracking_code}"
     )
-    db.session.add(new_log)
-    db.session.commit()
     
     return redirect(url_for('registry_workflow'))
 
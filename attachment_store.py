@@ -0,0 +1,252 @@
+"""
+Content-addressable attachment storage for the KEMRI Document Management System.
+
+Uploads used to be saved under names built from the file name and the
+document code, so a memo circulated to ten departments was stored ten
+times. AttachmentStore hashes an upload with SHA-256 while copying it to a
+temporary file, then keeps one blob per digest (blobs/3f/3fa4...). A
+duplicate upload only costs the copy: its temporary file is discarded.
+
+DocumentAttachment rows record the digest of their content in sha256.
+The attachment_blob table counts the attachments that reference each blob,
+and triggers on document_attachment keep the counts in step, including
+attachments removed along with their document. collect_garbage() deletes
+blobs that nothing has referenced for a grace period, which leaves time
+for an upload that is reusing a blob to commit its attachment.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+BLOBS_TABLE = 'attachment_blob'
+CHUNK_SIZE = 1024 * 1024
+
+# When a blob's last reference went, as UTC text with milliseconds (2025-03-01 08:00:00.123)
+_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _reference(row):
+    return (
+        f"INSERT INTO {BLOBS_TABLE} (digest, size, ref_count, released_at) "
+        f"VALUES ({row}.sha256, {row}.file_size, 1, NULL) "
+        f"ON CONFLICT (digest) DO UPDATE SET ref_count = ref_count + 1, released_at = NULL;"
+    )
+
+
+def _release(row):
+    return (
+        f"UPDATE {BLOBS_TABLE} SET ref_count = ref_count - 1, "
+        f"released_at = CASE WHEN ref_count <= 1 THEN {_NOW_SQL} ELSE released_at END "
+        f"WHERE digest = {row}.sha256;"
+    )
+
+
+_BLOB_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS attachment_blob_ai AFTER INSERT ON document_attachment
+    WHEN new.sha256 IS NOT NULL BEGIN
+        {_reference('new')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS attachment_blob_ad AFTER DELETE ON document_attachment
+    WHEN old.sha256 IS NOT NULL BEGIN
+        {_release('old')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS attachment_blob_au_old AFTER UPDATE OF sha256 ON document_attachment
+    WHEN old.sha256 IS NOT new.sha256 AND old.sha256 IS NOT NULL BEGIN
+        {_release('old')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS attachment_blob_au_new AFTER UPDATE OF sha256 ON document_attachment
+    WHEN old.sha256 IS NOT new.sha256 AND new.sha256 IS NOT NULL BEGIN
+        {_reference('new')}
+    END
+    """,
+]
+
+
+def _add_sha256(engine):
+    try:
+        with engine.begin() as conn:
+            if 'sha256' not in _attachment_columns(conn):
+                conn.execute(text('ALTER TABLE document_attachment ADD COLUMN sha256 VARCHAR(64)'))
+    except OperationalError:
+        # Another process starting at the same time may have added it first
+        with engine.connect() as conn:
+            if 'sha256' not in _attachment_columns(conn):
+                raise
+
+
+def _attachment_columns(conn):
+    return [row[1] for row in conn.execute(text('PRAGMA table_info(document_attachment)'))]
+
+
+def setup_attachment_blobs(engine):
+    """Create the triggers that keep attachment_blob reference counts in sync.
+
+    Attachment tables created before the store gain the sha256 column
+    here; their existing attachments keep their named files and are not
+    counted. The counts are filled from scratch the first time they are
+    set up.
+    """
+    _add_sha256(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_document_attachment_sha256 ON document_attachment (sha256)'
+        ))
+        for trigger in _BLOB_TRIGGERS:
+            conn.execute(text(trigger))
+        empty = conn.execute(text(f'SELECT 1 FROM {BLOBS_TABLE} LIMIT 1')).first() is None
+    if empty:
+        rebuild_attachment_blobs(engine)
+
+
+def rebuild_attachment_blobs(engine):
+    """Recompute the reference counts from document_attachment.
+
+    Returns a list of (digest, stored, actual) tuples for every blob whose
+    count had drifted. Blobs left without references are marked released.
+    """
+    with engine.begin() as conn:
+        # Take the write lock first so no attachment changes in between
+        conn.execute(text(f'UPDATE {BLOBS_TABLE} SET ref_count = ref_count'))
+
+        stored = dict(conn.execute(text(f'SELECT digest, ref_count FROM {BLOBS_TABLE}')).all())
+        actual = {
+            digest: (count, size)
+            for digest, count, size in conn.execute(text(
+                'SELECT sha256, COUNT(*), MAX(file_size) FROM document_attachment '
+                'WHERE sha256 IS NOT NULL GROUP BY sha256'
+            ))
+        }
+
+        for digest, (count, size) in actual.items():
+            conn.execute(
+                text(
+                    f'INSERT INTO {BLOBS_TABLE} (digest, size, ref_count, released_at) '
+                    f'VALUES (:digest, :size, :count, NULL) '
+                    f'ON CONFLICT (digest) DO UPDATE SET ref_count = excluded.ref_count, released_at = NULL'
+                ),
+                {'digest': digest, 'size': size, 'count': count}
+            )
+        conn.execute(
+            text(
+                f'UPDATE {BLOBS_TABLE} SET released_at = COALESCE(released_at, {_NOW_SQL}), ref_count = 0 '
+                f'WHERE digest NOT IN (SELECT sha256 FROM document_attachment WHERE sha256 IS NOT NULL)'
+            )
+        )
+
+    return [
+        (digest, stored.get(digest, 0), actual.get(digest, (0, 0))[0])
+        for digest in sorted(set(stored) | set(actual))
+        if stored.get(digest, 0) != actual.get(digest, (0, 0))[0]
+    ]
+
+
+class AttachmentStore:
+    """Keeps one file per distinct attachment content, named by its SHA-256 digest"""
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.temp_folder = os.path.join(root, 'tmp')
+        os.makedirs(self.temp_folder, exist_ok=True)
+
+    def path(self, digest):
+        """Where the blob with this digest is stored"""
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _spool(self, stream):
+        """Copy a binary stream to a temporary file, hashing it on the way.
+
+        Returns (temporary path, digest, size).
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=self.temp_folder)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+                temp.flush()
+                os.fsync(temp.fileno())
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return temp_path, sha256.hexdigest(), size
+
+    def put(self, stream):
+        """Store the content of a binary stream.
+
+        Returns (digest, size, stored), where stored is False when a blob
+        with the same content already existed and nothing new was written.
+        """
+        temp_path, digest, size = self._spool(stream)
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+            # A blob being reused is recent again, out of collect_garbage's reach
+            os.utime(path)
+            return digest, size, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return digest, size, True
+
+    def save_as(self, stream, path):
+        """Write a stream to a named file outside the store, hashing it on the way.
+
+        The file only appears once it is complete. Returns (digest, size).
+        """
+        temp_path, digest, size = self._spool(stream)
+        os.replace(temp_path, path)
+        return digest, size
+
+    def collect_garbage(self, engine, grace=timedelta(hours=1)):
+        """Delete blobs that no attachment has referenced for longer than grace.
+
+        That includes blobs whose upload was rolled back before any
+        attachment referenced them, and temporary files left behind by
+        uploads that failed part way. Returns (blobs removed, bytes freed).
+        """
+        cutoff = datetime.utcnow() - grace
+        cutoff_time = time.time() - grace.total_seconds()
+        with engine.begin() as conn:
+            conn.execute(
+                text(f'DELETE FROM {BLOBS_TABLE} WHERE ref_count <= 0 AND released_at < :cutoff'),
+                {'cutoff': cutoff.strftime('%Y-%m-%d %H:%M:%S.%f')[:23]}
+            )
+            known = set(conn.execute(text(f'SELECT digest FROM {BLOBS_TABLE}')).scalars())
+
+        removed = freed = 0
+        for folder in os.listdir(self.root):
+            if folder == 'tmp' or not os.path.isdir(os.path.join(self.root, folder)):
+                continue
+            for digest in os.listdir(os.path.join(self.root, folder)):
+                path = self.path(digest)
+                # A blob reused by an upload that has not committed yet is recent
+                if digest in known or os.path.getmtime(path) > cutoff_time:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+
+        for filename in os.listdir(self.temp_folder):
+            path = os.path.join(self.temp_folder, filename)
+            if os.path.getmtime(path) < cutoff_time:
+                os.remove(path)
+        return removed, freed
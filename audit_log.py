@@ -0,0 +1,160 @@
+"""
+Buffered access-audit writer for the KEMRI Document Management System.
+
+permissions.requires_permission and requires_role record every protected
+page view in activity_log, on top of the denials and user actions that
+actually matter. Opening a connection and committing per row made that
+audit trail the main write on otherwise read-only pages.
+
+AuditLogWriter keeps one connection open and buffers rows in memory. A
+background thread writes them in a single transaction once flush_size rows
+are waiting or every flush_interval seconds, whichever comes first.
+Routine successful accesses (sampled_actions) are kept at sample_rate,
+and every kept row records that rate in its details so counts can be
+scaled back up. Denials, and anything logged with a status other than
+'success', are never sampled out.
+"""
+
+import atexit
+import json
+import random
+import sqlite3
+import threading
+from datetime import datetime
+
+INSERT_ACTIVITY = (
+    'INSERT INTO activity_log (user_id, action, details, status, timestamp) VALUES (?, ?, ?, ?, ?)'
+)
+
+
+class AuditLogWriter:
+    """Buffers activity_log rows and writes them in batches from a background thread"""
+
+    def __init__(self, database='app.db', flush_size=50, flush_interval=2.0, sample_rate=1.0,
+                 sampled_actions=('access_route',), max_buffer=5000):
+        self.database = database
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.sampled_actions = frozenset(sampled_actions)
+        self.max_buffer = max_buffer
+        self.sampled_out = 0  # Routine accesses skipped by sampling
+        self._buffer = []
+        self._conn = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def log(self, user_id, action, details, status='success'):
+        """Buffer one activity_log row, unless it is a routine access that is sampled out"""
+        routine = status == 'success' and action in self.sampled_actions
+        if routine and self.sample_rate < 1:
+            if random.random() >= self.sample_rate:
+                with self._lock:
+                    self.sampled_out += 1
+                return
+            details = dict(details, sample_rate=self.sample_rate)
+
+        row = (user_id, action, json.dumps(details), status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with self._lock:
+            if routine and len(self._buffer) >= self.max_buffer:
+                # The database is not keeping up; shed routine rows, never denials
+                self.sampled_out += 1
+                return
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.flush_size
+
+        if self._closed:
+            self.flush()
+            return
+        self._start()
+        if full:
+            self._wake.set()
+
+    @property
+    def pending(self):
+        """Rows buffered but not written yet"""
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Write every buffered row now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                conn = self._connection()
+                try:
+                    conn.executemany(INSERT_ACTIVITY, rows)
+                    conn.commit()
+                    return len(rows)
+                except sqlite3.IntegrityError:
+                    # One bad row (such as a denial with no user) must not lose the batch
+                    conn.rollback()
+                    written = 0
+                    for row in rows:
+                        try:
+                            conn.execute(INSERT_ACTIVITY, row)
+                            written += 1
+                        except sqlite3.IntegrityError as e:
+                            print(f"Error logging activity {row[1]}: {e}")
+                    conn.commit()
+                    return written
+            except Exception as e:
+                print(f"Error writing activity log: {e}")
+                self._disconnect()
+                with self._lock:
+                    # Put the rows back for the next flush, oldest first
+                    self._buffer[:0] = rows
+                    overflow = len(self._buffer) - self.max_buffer
+                    if overflow > 0:
+                        del self._buffer[:overflow]
+                        print(f"Dropped {overflow} activity log rows the database could not take")
+                return 0
+
+    def close(self):
+        """Stop the background thread and write everything still buffered"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._flush_lock:
+            self._disconnect()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _connection(self):
+        # One connection for every flush, used under _flush_lock only
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.database, timeout=10, check_same_thread=False)
+        return self._conn
+
+    def _disconnect(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+            self._conn = None
@@ -0,0 +1,139 @@
+"""
+Benchmark report slicing with the in-memory report snapshot against SQLite.
+
+    python benchmark_report_snapshot.py [--documents 1000000] [--days 1095]
+                                        [--departments 20] [--repeat 5]
+
+Builds a throwaway database of random documents, then times the same slices
+(status x priority x department x week) three ways: a GROUP BY over the
+document table, a GROUP BY over the document_daily_stats rollup, and the
+ReportSnapshot arrays.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from daily_stats import setup_daily_stats
+from document_counts import STATUSES, PRIORITIES
+from report_snapshot import ReportSnapshot
+
+SCHEMA = [
+    'CREATE TABLE document (id INTEGER PRIMARY KEY, status TEXT, priority TEXT, sender TEXT, created_at DATETIME)',
+    'CREATE INDEX ix_document_created_at_status_priority ON document (created_at, status, priority)',
+    'CREATE TABLE document_daily_stats (day TEXT, status TEXT, priority TEXT, sender_department TEXT, '
+    'count INTEGER NOT NULL, updated_at TEXT, PRIMARY KEY (day, status, priority, sender_department)) WITHOUT ROWID',
+]
+
+WEEK_SQL = {
+    'document': "date(created_at, 'weekday 0', '-6 days')",
+    'document_daily_stats': "date(day, 'weekday 0', '-6 days')",
+}
+
+
+def build_database(path, documents, days, departments):
+    first_day = datetime.combine(date.today() - timedelta(days=days), datetime.min.time())
+    names = [f'Department {n}' for n in range(departments)]
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    rows = (
+        (
+            random.choice(STATUSES), random.choice(PRIORITIES), random.choice(names),
+            (first_day + timedelta(seconds=random.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        )
+        for _ in range(documents)
+    )
+    conn.executemany('INSERT INTO document (status, priority, sender, created_at) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    return names
+
+
+def slices(days, names):
+    """(description, window start, filters, group_by) for each timed slice"""
+    today = date.today()
+    return [
+        ('week x status, last 90 days', today - timedelta(days=90), {}, ('week', 'status')),
+        ('department x priority, last year', today - timedelta(days=365), {}, ('department', 'priority')),
+        ('week, Pending + Urgent', today - timedelta(days=days), {'statuses': ['Pending'], 'priorities': ['Urgent']}, ('week',)),
+        ('status x priority, one department', today - timedelta(days=days), {'departments': names[:1]}, ('status', 'priority')),
+    ]
+
+
+def sql_slice(conn, table, start, filters, group_by):
+    day_column = 'created_at' if table == 'document' else 'day'
+    columns = {
+        'status': 'status', 'priority': 'priority', 'week': WEEK_SQL[table],
+        'department': 'sender' if table == 'document' else 'sender_department',
+    }
+    where, params = [f'{day_column} >= ?'], [start.isoformat()]
+    for name, column in (('statuses', 'status'), ('priorities', 'priority'), ('departments', 'department')):
+        if name in filters:
+            where.append(f"{columns[column]} IN ({', '.join('?' for _ in filters[name])})")
+            params.extend(filters[name])
+    count = 'COUNT(*)' if table == 'document' else 'SUM(count)'
+    keys = ', '.join(columns[dimension] for dimension in group_by)
+    return conn.execute(
+        f"SELECT {keys}, {count} FROM {table} WHERE {' AND '.join(where)} GROUP BY {keys}", params
+    ).fetchall()
+
+
+def best_of(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the in-memory report snapshot')
+    parser.add_argument('--documents', type=int, default=1000000, help='documents to generate')
+    parser.add_argument('--days', type=int, default=1095, help='days of history to spread them over')
+    parser.add_argument('--departments', type=int, default=20, help='distinct sender departments')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per query (best is reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'benchmark.db')
+        print(f"Generating {args.documents:,} documents over {args.days} days...")
+        names = build_database(path, args.documents, args.days, args.departments)
+
+        engine = create_engine(f'sqlite:///{path}')
+        setup_daily_stats(engine)
+        with engine.begin() as conn:
+            # Age the backfilled rollup so incremental refreshes only see later changes
+            conn.execute(text("UPDATE document_daily_stats SET updated_at = '2000-01-01 00:00:00.000'"))
+        snapshot = ReportSnapshot()
+        started = time.perf_counter()
+        rows = snapshot.refresh(engine, full=True)
+        print(f"Snapshot loaded {rows:,} rollup rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE document SET status = 'Ended' WHERE id % 1000 = 0"))
+        started = time.perf_counter()
+        rows = snapshot.refresh(engine)
+        print(f"Incremental refresh after {args.documents // 1000:,} status changes read {rows:,} rows "
+              f"in {(time.perf_counter() - started) * 1000:.1f} ms\n")
+
+        conn = sqlite3.connect(path)
+        print(f"{'slice':<38} {'document GROUP BY':>18} {'rollup GROUP BY':>16} {'snapshot':>10}")
+        for description, start, filters, group_by in slices(args.days, names):
+            document_ms = best_of(args.repeat, lambda: sql_slice(conn, 'document', start, filters, group_by))
+            rollup_ms = best_of(args.repeat, lambda: sql_slice(conn, 'document_daily_stats', start, filters, group_by))
+            snapshot_ms = best_of(args.repeat, lambda: snapshot.count(start=start, group_by=group_by, **filters))
+            print(f"{description:<38} {document_ms:>15.1f} ms {rollup_ms:>13.1f} ms {snapshot_ms:>7.1f} ms")
+        conn.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
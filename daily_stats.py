@@ -0,0 +1,214 @@
+"""
+Daily document statistics rollup for the KEMRI Document Management System.
+
+The document_daily_stats table holds the number of documents created on
+each day for every (status, priority, sender department), so reports over
+long periods read a few rows per day instead of every document. Triggers
+keep the rollup in step with the document table as documents are created,
+moved between statuses or deleted; rebuild_daily_stats() recomputes a range
+of days from scratch, both to fill in history and to close out a day by
+checking it against the documents it summarises.
+
+Every rollup row carries the time it last changed in updated_at, so
+in-memory copies of the rollup (see report_snapshot.py) can pick up just the
+rows that changed since they last looked. Rows that drop to zero are kept
+at zero rather than deleted, so those copies see them change too.
+"""
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import text, bindparam, DateTime
+from sqlalchemy.exc import OperationalError
+
+from document_counts import ACTIVITY_BUCKETS, DocumentCounts, activity_buckets
+
+DAILY_STATS_TABLE = 'document_daily_stats'
+
+# Documents without a creation date are kept under an empty day
+_KEY_COLUMNS = (
+    "COALESCE(date({row}.created_at), ''), COALESCE({row}.status, ''), "
+    "COALESCE({row}.priority, ''), COALESCE({row}.sender, '')"
+)
+
+
+# When a rollup row last changed, as UTC text with milliseconds (2025-03-01 08:00:00.123)
+_UPDATED_AT_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _bump(row, delta):
+    return (
+        f"INSERT INTO {DAILY_STATS_TABLE} (day, status, priority, sender_department, count, updated_at) "
+        f"VALUES ({_KEY_COLUMNS.format(row=row)}, {delta}, {_UPDATED_AT_SQL}) "
+        f"ON CONFLICT (day, status, priority, sender_department) "
+        f"DO UPDATE SET count = count + ({delta}), updated_at = excluded.updated_at;"
+    )
+
+
+_DAILY_STATS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_daily_stats_ai AFTER INSERT ON document BEGIN
+        {_bump('new', 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_daily_stats_ad AFTER DELETE ON document BEGIN
+        {_bump('old', -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_daily_stats_au
+    AFTER UPDATE OF status, priority, sender, created_at ON document
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority
+      OR old.sender IS NOT new.sender OR date(old.created_at) IS NOT date(new.created_at) BEGIN
+        {_bump('old', -1)}
+        {_bump('new', 1)}
+    END
+    """,
+]
+
+
+def _add_updated_at(engine):
+    try:
+        with engine.begin() as conn:
+            if 'updated_at' in _rollup_columns(conn):
+                return
+            conn.execute(text(f'ALTER TABLE {DAILY_STATS_TABLE} ADD COLUMN updated_at TEXT'))
+            conn.execute(text(f'UPDATE {DAILY_STATS_TABLE} SET updated_at = {_UPDATED_AT_SQL}'))
+    except OperationalError:
+        # Another process starting at the same time may have added it first
+        with engine.connect() as conn:
+            if 'updated_at' not in _rollup_columns(conn):
+                raise
+
+
+def _rollup_columns(conn):
+    return [row[1] for row in conn.execute(text(f'PRAGMA table_info({DAILY_STATS_TABLE})'))]
+
+
+def setup_daily_stats(engine):
+    """Create the triggers that keep document_daily_stats up to date.
+
+    The rollup is filled from the whole document table the first time it is
+    set up; later changes reach it through the triggers. Rollups created
+    before rows were timestamped gain the updated_at column here.
+    """
+    _add_updated_at(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_{DAILY_STATS_TABLE}_updated_at ON {DAILY_STATS_TABLE} (updated_at)'
+        ))
+        for trigger in _DAILY_STATS_TRIGGERS:
+            conn.execute(text(trigger))
+        empty = conn.execute(text(f'SELECT 1 FROM {DAILY_STATS_TABLE} LIMIT 1')).first() is None
+    if empty:
+        rebuild_daily_stats(engine)
+
+
+def document_day_counts_statement(start=None, end=None):
+    """The per-day document count query behind rebuild_daily_stats.
+
+    Groups the documents created from start to end (inclusive, either may
+    be None) by day, status, priority and sender department. A bounded
+    rebuild range-scans the created_at index.
+    """
+    document_filter, document_params = [], []
+    if start is not None:
+        document_filter.append('created_at >= :start')
+        document_params.append(bindparam('start', value=datetime.combine(start, time.min), type_=DateTime))
+    if end is not None:
+        document_filter.append('created_at < :end')
+        document_params.append(
+            bindparam('end', value=datetime.combine(end + timedelta(days=1), time.min), type_=DateTime)
+        )
+    return text(
+        f"SELECT {_KEY_COLUMNS.format(row='document')}, COUNT(*) FROM document "
+        f"{'WHERE ' + ' AND '.join(document_filter) if document_filter else ''} "
+        f"GROUP BY 1, 2, 3, 4"
+    ).bindparams(*document_params)
+
+
+def rebuild_daily_stats(engine, start=None, end=None):
+    """Recompute the rollup for the days from start to end (inclusive).
+
+    Without bounds every day is rebuilt. Returns a list of (day, status,
+    priority, sender_department, stored, actual) tuples for every rollup
+    row that disagreed with the document table. Rows with no documents left
+    are rewritten with a zero count.
+    """
+    day_filter, day_params = [], {}
+    if start is not None:
+        day_filter.append('day >= :start_day')
+        day_params['start_day'] = start.isoformat()
+    if end is not None:
+        day_filter.append('day <= :end_day')
+        day_params['end_day'] = end.isoformat()
+    if day_filter:
+        # Undated documents only belong to a full rebuild
+        day_filter.append("day != ''")
+
+    delete_rows = text(
+        f'DELETE FROM {DAILY_STATS_TABLE} '
+        f"{'WHERE ' + ' AND '.join(day_filter) if day_filter else ''} "
+        f'RETURNING day, status, priority, sender_department, count'
+    )
+    count_documents = document_day_counts_statement(start, end)
+
+    with engine.begin() as conn:
+        # Deleting first takes the write lock, so no document changes
+        # between reading the stored rows and replacing them
+        stored = {tuple(row[:4]): row[4] for row in conn.execute(delete_rows, day_params)}
+        actual = {tuple(row[:4]): row[4] for row in conn.execute(count_documents)}
+
+        keys = set(stored) | set(actual)
+        if keys:
+            conn.execute(
+                text(
+                    f'INSERT INTO {DAILY_STATS_TABLE} (day, status, priority, sender_department, count, updated_at) '
+                    f'VALUES (:day, :status, :priority, :sender_department, :count, {_UPDATED_AT_SQL})'
+                ),
+                [
+                    {'day': d, 'status': s, 'priority': p, 'sender_department': sd, 'count': actual.get((d, s, p, sd), 0)}
+                    for d, s, p, sd in keys
+                ]
+            )
+
+    return [
+        key + (stored.get(key, 0), actual.get(key, 0))
+        for key in sorted(keys)
+        if stored.get(key, 0) != actual.get(key, 0)
+    ]
+
+
+def close_out_day(engine, day):
+    """Reconcile one finished day against the documents (run nightly)"""
+    return rebuild_daily_stats(engine, day, day)
+
+
+def daily_counts_statement(start, end):
+    """The grouped (status, priority, count) rollup query behind load_daily_counts"""
+    return text(
+        f'SELECT status, priority, SUM(count) FROM {DAILY_STATS_TABLE} '
+        f'WHERE day >= :start AND day <= :end GROUP BY status, priority'
+    ).bindparams(start=start.isoformat(), end=end.isoformat())
+
+
+def load_daily_counts(session, start, end):
+    """Load the (status, priority) matrix for documents created from start to end"""
+    return DocumentCounts.from_rows(session.execute(daily_counts_statement(start, end)).fetchall())
+
+
+def load_daily_activity(session, start, end, granularity='day'):
+    """Documents created per day, week or month from the rollup, zero-filled.
+
+    Returns (bucket_start, count) pairs for every bucket in the range.
+    """
+    buckets = activity_buckets(start, end, granularity)
+    bucket = ACTIVITY_BUCKETS[granularity].format(column='day')
+    rows = session.execute(
+        text(
+            f'SELECT {bucket} AS bucket, SUM(count) FROM {DAILY_STATS_TABLE} '
+            f'WHERE day >= :start AND day <= :end GROUP BY bucket'
+        ),
+        {'start': start.isoformat(), 'end': end.isoformat()}
+    )
+    counts = {key: count for key, count in rows}
+    return [(day, counts.get(day.isoformat(), 0)) for day in buckets]
@@ -0,0 +1,362 @@
+"""
+Dashboard statistics for the KEMRI Document Management System.
+
+The dashboards show a few numbers per role: system-wide counts for
+administrators, the approval queue for registry staff and their own
+documents for everyone else, plus the registry dashboard's workflow
+metrics. StatsCache computes each of these once and shares the result
+across requests. A background thread recomputes every entry that has been
+asked for recently, so a dashboard request only reads from memory.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from user_names import user_names, SYSTEM_USER_NAME
+
+PENDING_STATUS = 'Pending Registry Approval'
+CHANGES_STATUS = 'Changes Requested'
+COMPLETED_STATUSES = ('Completed', 'Ended')
+
+# Registry decisions are recorded in document_history as 'Registry Approve' etc.
+REGISTRY_DECISION = "h.action LIKE 'Registry %'"
+
+# Days registry staff have to decide on a document
+SLA_DAYS = 3
+
+DATE_RANGES = ('today', 'yesterday', 'last-7-days', 'last-30-days', 'this-month', 'last-month')
+
+STATUS_COLORS = [
+    ('Pending', "status = 'Pending Registry Approval'", '#ffc107'),
+    ('In Review', "status = 'Changes Requested'", '#17a2b8'),
+    ('Approved', "status LIKE 'Approved%'", '#28a745'),
+    ('Rejected', "status LIKE 'Rejected%'", '#dc3545'),
+]
+
+
+def _timestamp(value):
+    # Keeps the fraction so a window ending now includes this second's rows
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _utc(placeholder='?'):
+    # History timestamps are written by SQLite in UTC, documents in local time
+    return f"strftime('%Y-%m-%d %H:%M:%f', {placeholder}, 'utc')"
+
+
+def _parse(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _change(current, previous):
+    """Percentage change from the previous period, 0 when there is nothing to compare"""
+    return round((current - previous) * 100 / previous) if previous else 0
+
+
+def date_window(date_range, now=None):
+    """Return the (start, end) datetimes covered by a registry dashboard date range"""
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if date_range == 'today':
+        return today, now
+    if date_range == 'yesterday':
+        return today - timedelta(days=1), today
+    if date_range == 'last-30-days':
+        return now - timedelta(days=30), now
+    if date_range == 'this-month':
+        return today.replace(day=1), now
+    if date_range == 'last-month':
+        end = today.replace(day=1)
+        return (end - timedelta(days=1)).replace(day=1), end
+    return now - timedelta(days=7), now
+
+
+# Role statistics -------------------------------------------------------------
+
+def system_stats(conn):
+    """Counts for administrators and registry staff, from one pass over the documents"""
+    now = datetime.now()
+    today = _timestamp(now.replace(hour=0, minute=0, second=0, microsecond=0))
+    row = conn.execute(
+        'SELECT COUNT(*), SUM(status = ?), SUM(status = ? AND created_at < ?), SUM(created_at >= ?) FROM document',
+        (PENDING_STATUS, PENDING_STATUS, today, today)
+    ).fetchone()
+    processed_today = conn.execute(
+        f"SELECT COUNT(*) FROM document_history h WHERE {REGISTRY_DECISION} AND h.timestamp >= {_utc()}",
+        (today,)
+    ).fetchone()[0]
+    active_users = conn.execute('SELECT COUNT(*) FROM user WHERE is_active = 1').fetchone()[0]
+    return {
+        'total_documents': row[0],
+        'pending_approval': row[1] or 0,
+        'carried_over': row[2] or 0,
+        'documents_today': row[3] or 0,
+        'processed_today': processed_today,
+        'active_users': active_users,
+    }
+
+
+def user_document_stats(conn):
+    """Per-user counts of the documents each user created, as {user_id: stats}"""
+    placeholders = ', '.join('?' for _ in COMPLETED_STATUSES)
+    rows = conn.execute(
+        f"SELECT created_by, COUNT(*), SUM(status = ?), "
+        f"SUM(status LIKE 'Approved%' OR status IN ({placeholders})), SUM(status = 'Draft') "
+        f"FROM document WHERE created_by IS NOT NULL GROUP BY created_by",
+        (PENDING_STATUS,) + COMPLETED_STATUSES
+    ).fetchall()
+    return {
+        row[0]: {'my_documents': row[1], 'pending_approval': row[2] or 0, 'completed': row[3] or 0, 'drafts': row[4] or 0}
+        for row in rows
+    }
+
+
+def recent_activity(conn, user_id=None, limit=5):
+    """Latest document events, only for the user's own documents when user_id is given"""
+    query = (
+        'SELECT h.action, h.timestamp, h.user_id, d.title FROM document_history h '
+        'JOIN document d ON d.id = h.document_id'
+    )
+    params = []
+    if user_id is not None:
+        query += ' WHERE d.created_by = ?'
+        params.append(user_id)
+    rows = conn.execute(query + ' ORDER BY h.timestamp DESC, h.id DESC LIMIT ?', params + [limit]).fetchall()
+    names = user_names.get_many(conn, [row[2] for row in rows])
+    return [
+        {'action': row[0], 'timestamp': row[1], 'title': row[3], 'user': names.get(row[2], SYSTEM_USER_NAME)}
+        for row in rows
+    ]
+
+
+# Registry dashboard ----------------------------------------------------------
+
+def _decisions(conn, start, end):
+    """(sender, days from submission to decision) for registry decisions made from start to end"""
+    return conn.execute(
+        f"SELECT d.sender, julianday(h.timestamp) - julianday(d.created_at, 'utc') FROM document_history h "
+        f"JOIN document d ON d.id = h.document_id "
+        f"WHERE {REGISTRY_DECISION} AND h.timestamp >= {_utc()} AND h.timestamp < {_utc()}",
+        (_timestamp(start), _timestamp(end))
+    ).fetchall()
+
+
+def _summarise(days):
+    """(count, average days, SLA compliance %) for a list of processing times"""
+    days = [max(value or 0, 0) for value in days]
+    if not days:
+        return 0, 0, 100
+    within_sla = sum(1 for value in days if value <= SLA_DAYS)
+    return len(days), round(sum(days) / len(days), 1), round(within_sla * 100 / len(days))
+
+
+def registry_metrics(conn, date_range='last-7-days'):
+    """Everything the registry dashboard shows for a date range"""
+    now = datetime.now()
+    start, end = date_window(date_range, now)
+    previous_start = start - (end - start)
+
+    def submitted(first, last):
+        return conn.execute(
+            'SELECT COUNT(*) FROM document WHERE created_at >= ? AND created_at < ?',
+            (_timestamp(first), _timestamp(last))
+        ).fetchone()[0]
+
+    decisions = _decisions(conn, start, end)
+    processed, avg_days, sla = _summarise([days for sender, days in decisions])
+    previous_processed, previous_avg_days, previous_sla = _summarise(
+        [days for sender, days in _decisions(conn, previous_start, start)]
+    )
+    pending = conn.execute('SELECT COUNT(*) FROM document WHERE status = ?', (PENDING_STATUS,)).fetchone()[0]
+
+    overall_metrics = {
+        'pending_documents': pending,
+        'pending_trend': _change(submitted(start, end), submitted(previous_start, start)),
+        'avg_processing_days': avg_days,
+        'processing_trend': _change(avg_days, previous_avg_days),
+        'processed_documents': processed,
+        'processed_trend': _change(processed, previous_processed),
+        'sla_compliance': sla,
+        'sla_trend': sla - previous_sla,
+    }
+
+    # Departments with documents waiting or decided in the window
+    by_department = {}
+    for sender, days in decisions:
+        by_department.setdefault(sender, []).append(days)
+    pending_by_department = dict(conn.execute(
+        'SELECT sender, COUNT(*) FROM document WHERE status = ? GROUP BY sender', (PENDING_STATUS,)
+    ).fetchall())
+    department_metrics = []
+    for name in set(by_department) | set(pending_by_department):
+        count, department_days, department_sla = _summarise(by_department.get(name, []))
+        department_metrics.append({
+            'name': name,
+            'pending': pending_by_department.get(name, 0),
+            'avg_time': department_days,
+            'performance': department_sla,
+        })
+    department_metrics.sort(key=lambda department: (-department['pending'], department['name'] or ''))
+
+    status_distribution = [
+        {'status': label, 'count': conn.execute(f'SELECT COUNT(*) FROM document WHERE {condition}').fetchone()[0], 'color': color}
+        for label, condition, color in STATUS_COLORS
+    ]
+
+    # Waiting documents that are urgent or past the SLA
+    overdue_before = now - timedelta(days=SLA_DAYS)
+    urgent_documents = []
+    for row in conn.execute(
+        "SELECT tracking_code, title, status, priority, created_at FROM document "
+        "WHERE status IN (?, ?) AND (priority = 'Urgent' OR created_at < ?) ORDER BY created_at LIMIT 10",
+        (PENDING_STATUS, CHANGES_STATUS, _timestamp(overdue_before))
+    ):
+        created = _parse(row['created_at']) or now
+        urgent_documents.append({
+            'tracking_code': row['tracking_code'],
+            'title': row['title'],
+            'status': 'Pending' if row['status'] == PENDING_STATUS else 'In Review',
+            'priority': row['priority'],
+            'days_in_stage': (now - created).days,
+            'due_date': (created + timedelta(days=SLA_DAYS)).strftime('%Y-%m-%d'),
+            'is_overdue': created < overdue_before,
+        })
+
+    # Latest registry decisions
+    rows = conn.execute(
+        f'SELECT h.action, h.details, h.timestamp, h.user_id FROM document_history h '
+        f'WHERE {REGISTRY_DECISION} ORDER BY h.timestamp DESC, h.id DESC LIMIT 5'
+    ).fetchall()
+    names = user_names.get_many(conn, [row['user_id'] for row in rows])
+    activity = [
+        {'action': row['action'], 'details': row['details'], 'timestamp': row['timestamp'],
+         'user': names.get(row['user_id'], SYSTEM_USER_NAME)}
+        for row in rows
+    ]
+
+    # Daily trends over the past week
+    trends = {'document_volume': [], 'processing_time': [], 'sla_compliance': []}
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(6, -1, -1):
+        day = today - timedelta(days=offset)
+        count, day_avg, day_sla = _summarise([days for sender, days in _decisions(conn, day, day + timedelta(days=1))])
+        trends['document_volume'].append(submitted(day, day + timedelta(days=1)))
+        trends['processing_time'].append(day_avg)
+        trends['sla_compliance'].append(day_sla)
+
+    return {
+        'overall_metrics': overall_metrics,
+        'department_metrics': department_metrics[:10],
+        'status_distribution': status_distribution,
+        'urgent_documents': urgent_documents,
+        'recent_activity': activity,
+        'trends': trends,
+    }
+
+
+# Cache -----------------------------------------------------------------------
+
+STATS = {
+    'system': system_stats,
+    'user-documents': user_document_stats,
+    'recent-activity': recent_activity,
+    'registry': registry_metrics,
+}
+
+
+class StatsCache:
+    """Shared dashboard statistics, kept fresh by a background thread.
+
+    Entries are keyed by (name, *args) from STATS. The first request for an
+    entry computes it; after that the refresher thread recomputes it every
+    refresh_interval seconds until nobody has asked for it in idle_after
+    seconds.
+    """
+
+    def __init__(self, connect, refresh_interval=30, idle_after=600):
+        self.connect = connect
+        self.refresh_interval = refresh_interval
+        self.idle_after = idle_after
+        self._entries = {}  # key -> [value, last requested]
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, name, *args):
+        """Return the cached statistics, computing them on first use"""
+        key = (name,) + args
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry[1] = now
+                return entry[0]
+
+        self._start()
+        with self._compute_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key][0]
+            value = self._compute(key)
+            with self._lock:
+                self._entries[key] = [value, now]
+        return value
+
+    def for_role(self, role, user_id=None):
+        """The dashboard statistics for a role"""
+        system = self.get('system')
+        if role == 'Administrator':
+            keys = ('total_documents', 'pending_approval', 'documents_today', 'active_users')
+            return {key: system[key] for key in keys}
+        if role == 'Registry':
+            return {
+                'total_documents': system['total_documents'],
+                'pending_approval': system['pending_approval'],
+                'to_be_processed': system['carried_over'],
+                'processed_today': system['processed_today'],
+            }
+        return self.get('user-documents').get(
+            user_id, {'my_documents': 0, 'pending_approval': 0, 'completed': 0, 'drafts': 0}
+        )
+
+    def refresh(self):
+        """Recompute every entry requested recently and drop the idle ones"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.idle_after)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] < cutoff]:
+                del self._entries[key]
+            keys = list(self._entries)
+        for key in keys:
+            try:
+                value = self._compute(key)
+            except Exception as e:
+                print(f"Error refreshing dashboard stats {key}: {str(e)}")
+                continue
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key][0] = value
+
+    def stop(self):
+        self._stop.set()
+
+    def _compute(self, key):
+        conn = self.connect()
+        try:
+            return STATS[key[0]](conn, *key[1:])
+        finally:
+            conn.close()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='dashboard-stats', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
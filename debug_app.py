@@ -7,6 +7,9 @@ import json
 import random
 from werkzeug.utils import secure_filename
 from permissions import requires_permission, requires_role, requires_login, has_permission, can_access_menu, log_activity, check_session_valid
+from tracking_codes import allocate_tracking_codes
+from user_names import user_names, SYSTEM_USER_NAME
+from dashboard_stats import StatsCache, DATE_RANGES
 import time
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -175,6 +178,18 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+# Dashboard numbers shared by every request, refreshed in the background
+dashboard_stats = StatsCache(get_db_connection)
+
+def parse_db_timestamp(value):
+    """Parse a SQLite timestamp such as '2025-04-30 14:05:00', defaulting to now"""
+    if not value:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
 @app.route('/')
 def home():
     """Home page route"""
@@ -261,67 +276,32 @@ def dashboard():
     # Log this access
     log_activity(session.get('user_id'), 'view_dashboard', {'request': 'view'})
     
-    # Sample dashboard data
-    # In a real app, this would be fetched from the database
     role = session.get('role', 'User')
     is_admin = role == 'Administrator'
     is_registry = role == 'Registry'
     
-    # Different stats based on role
-    if is_admin:
-        # Admin sees system-wide stats
-        stats = {
-            'total_documents': 127,
-            'pending_approval': 14,
-            'documents_today': 8,
-            'active_users': 18
-        }
-    elif is_registry:
-        # Registry staff see document processing stats
-        stats = {
-            'total_documents': 127,
-            'pending_approval': 14,
-            'to_be_processed': 6,
-            'processed_today': 12
-        }
-    else:
-        # Regular users see their own document stats
-        stats = {
-            'my_documents': 15,
-            'pending_approval': 3,
-            'completed': 8,
-            'drafts': 4
-        }
+    # System-wide stats for admins, the approval queue for registry staff,
+    # and their own documents for everyone else
+    stats = dashboard_stats.for_role(role, session.get('user_id'))
     
     # Recent activity for the dashboard
-    recent_activity = [
-        {'type': 'document', 'action': 'created', 'title': 'Research Proposal', 'time': '2 hours ago'},
-        {'type': 'document', 'action': 'approved', 'title': 'Budget Request', 'time': '4 hours ago'},
-        {'type': 'user', 'action': 'login', 'title': 'System Login', 'time': '5 hours ago'},
-        {'type': 'document', 'action': 'rejected', 'title': 'Equipment Request', 'time': '1 day ago'},
-        {'type': 'document', 'action': 'modified', 'title': 'Project Timeline', 'time': '2 days ago'}
-    ]
+    if is_admin or is_registry:
+        recent_activity = dashboard_stats.get('recent-activity')
+    else:
+        recent_activity = dashboard_stats.get('recent-activity', session.get('user_id'))
     
     # Only show notifications relevant to user role
     notifications = []
     
-    if is_admin:
-        notifications.extend([
-            {'type': 'system', 'message': 'Database backup completed successfully', 'time': '1 hour ago'},
-            {'type': 'user', 'message': '2 new user registrations pending approval', 'time': '3 hours ago'}
-        ])
-    
     if is_admin or is_registry:
-        notifications.extend([
-            {'type': 'document', 'message': '14 documents awaiting registry approval', 'time': '2 hours ago'},
-            {'type': 'workflow', 'message': '3 workflows completed today', 'time': '4 hours ago'}
-        ])
-    
-    # All users see these notifications
-    notifications.extend([
-        {'type': 'document', 'message': 'Your document "Budget Request" was approved', 'time': '5 hours ago'},
-        {'type': 'message', 'message': 'You have 3 unread messages', 'time': '1 day ago'}
-    ])
+        if stats['pending_approval']:
+            notifications.append({'type': 'document', 'message': f"{stats['pending_approval']} documents awaiting registry approval"})
+    
+    if is_registry and stats['to_be_processed']:
+        notifications.append({'type': 'workflow', 'message': f"{stats['to_be_processed']} documents carried over from previous days"})
+    
+    if not (is_admin or is_registry) and stats['pending_approval']:
+        notifications.append({'type': 'document', 'message': f"{stats['pending_approval']} of your documents are awaiting registry approval"})
     
     return render_template('dashboard.html', 
                            stats=stats,
@@ -378,12 +358,13 @@ def user_management():
             # Hash the password
             hashed_password = generate_password_hash(password)
             
-            conn.execute(
+            cursor = conn.execute(
                 'INSERT INTO user (username, email, phone, department, password, role, created_at, is_active) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
                 (username, email, phone, department, hashed_password, role, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 1)
             )
             conn.commit()
             conn.close()
+            user_names.invalidate(cursor.lastrowid)
             
             # Log this action
             log_activity(session.get('user_id'), 'add_user', {
@@ -1070,18 +1051,26 @@ def compose():
             column_check = conn.execute("PRAGMA table_info(document)").fetchall()
             columns = [col[1] for col in column_check]
             
+            values = {
+                'tracking_code': tracking_code,
+                'title': title,
+                'sender': sender,
+                'recipient': recipient,
+                'description': details,
+                'status': status,
+                'priority': priority,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
             if 'document_type' in columns:
                 # Use document_type column if it exists
-                conn.execute(
-                    'INSERT INTO document (tracking_code, title, sender, recipient, description, status, priority, created_at, document_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                    (tracking_code, title, sender, recipient, details, status, priority, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), doc_type)
-                )
-            else:
-                # Use the standard columns
-                conn.execute(
-                    'INSERT INTO document (tracking_code, title, sender, recipient, description, status, priority, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                    (tracking_code, title, sender, recipient, details, status, priority, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                )
+                values['document_type'] = doc_type
+            if 'created_by' in columns:
+                # The owner the User dashboard counts "my documents" by
+                values['created_by'] = session.get('user_id')
+            conn.execute(
+                f"INSERT INTO document ({', '.join(values)}) VALUES ({', '.join('?' for _ in values)})",
+                tuple(values.values())
+            )
             
             conn.commit()
             
@@ -2203,6 +2192,7 @@ def edit_user(user_id):
             )
         
         conn.commit()
+        user_names.invalidate(user_id)
         
         # Get updated user for flashing a message
         user = conn.execute('SELECT username FROM user WHERE id = ?', (user_id,)).fetchone()
@@ -2254,6 +2244,7 @@ def delete_user(user_id):
         conn.execute('DELETE FROM user WHERE id = ?', (user_id,))
         conn.commit()
         conn.close()
+        user_names.invalidate(user_id)
         
         # Log this action
         log_activity(session.get('user_id'), 'delete_user', {
@@ -2406,54 +2397,41 @@ def track_by_code(tracking_code):
     try:
         conn = get_db_connection()
         
-        # Fetch the document from the database
-        db_document = conn.execute('SELECT * FROM document WHERE tracking_code = ?', 
-                                 (tracking_code,)).fetchone()
+        # Fetch the document together with its history in one query
+        rows = conn.execute('''
+            SELECT d.*, h.action AS history_action, h.details AS history_details,
+                   h.timestamp AS history_timestamp, h.user_id AS history_user_id
+            FROM document d
+            LEFT JOIN document_history h ON h.document_id = d.id
+            WHERE d.tracking_code = ?
+            ORDER BY h.timestamp DESC''', (tracking_code,)).fetchall()
         
         # If found in database, format it for display
-        if db_document:
-            doc_dict = dict(db_document)
+        if rows:
+            doc_dict = dict(rows[0])
             
             # Format dates for display
-            created_date = datetime.strptime(doc_dict.get('created_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')), 
-                                          '%Y-%m-%d %H:%M:%S') if doc_dict.get('created_at') else datetime.now()
-            updated_date = datetime.strptime(doc_dict.get('updated_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')), 
-                                          '%Y-%m-%d %H:%M:%S') if doc_dict.get('updated_at') else datetime.now()
+            created_date = parse_db_timestamp(doc_dict.get('created_at'))
+            updated_date = parse_db_timestamp(doc_dict.get('updated_at'))
             
             # Calculate process time
             process_days = (datetime.now() - created_date).days
             process_time = f"{process_days} days"
             
-            # Get document history
-            history = conn.execute('''
-                SELECT * FROM document_history 
-                WHERE document_id = ? 
-                ORDER BY timestamp DESC''', (doc_dict['id'],)).fetchall()
+            # Look up the names behind every event at once (cached across requests)
+            history = [row for row in rows if row['history_action'] is not None]
+            names = user_names.get_many(conn, [event['history_user_id'] for event in history])
             
             # Format timeline from history
             timeline = []
             for event in history:
-                event_dict = dict(event)
-                
-                # Format the timestamp
-                event_time = datetime.strptime(event_dict.get('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S')), 
-                                             '%Y-%m-%d %H:%M:%S') if event_dict.get('timestamp') else datetime.now()
-                event_time_str = event_time.strftime('%B %d, %Y - %I:%M %p')
-                
-                # Get user name
-                user_id = event_dict.get('user_id')
-                user_name = "System"
-                if user_id:
-                    user = conn.execute('SELECT username FROM user WHERE id = ?', (user_id,)).fetchone()
-                    if user:
-                        user_name = user['username']
-                
+                event_time = parse_db_timestamp(event['history_timestamp'])
                 timeline_item = {
-                    'title': event_dict.get('action', 'Action'),
-                    'time': event_time_str,
-                    'user': user_name,
+                    'title': event['history_action'] or 'Action',
+                    'time': event_time.strftime('%B %d, %Y - %I:%M %p'),
+                    'user': names.get(event['history_user_id'], SYSTEM_USER_NAME),
                     'status': 'Completed',
-                    'description': event_dict.get('details', 'No details provided')
+                    'description': event['history_details'] or 'No details provided'
                 }
                 timeline.append(timeline_item)
             
@@ -3477,270 +3455,17 @@ def registry_dashboard():
     log_activity(session.get('user_id'), 'view_registry_dashboard', {'request': 'view'})
     
     # Get filter parameters
-    date_range = request.args.get('date_range', 'week')
-    
-    # In a real app, these metrics would be calculated from database queries
-    # For demo purposes, use sample data
+    date_range = request.args.get('date_range', 'last-7-days')
+    if date_range not in DATE_RANGES:
+        date_range = 'last-7-days'
     
-    # Sample overall metrics
-    overall_metrics = {
-        'total_documents': 127,
-        'documents_pending': 42,
-        'documents_in_review': 35,
-        'documents_approved': 38,
-        'documents_rejected': 12,
-        'avg_processing_time': '2.3 days',
-        'sla_compliance': '94%',
-        'documents_overdue': 3
-    }
-    
-    # Sample department metrics
-    department_metrics = [
-        {
-            'name': 'Research',
-            'total': 45,
-            'pending': 15,
-            'approved': 20,
-            'rejected': 5,
-            'in_review': 5,
-            'avg_time': '2.1 days'
-        },
-        {
-            'name': 'Finance',
-            'total': 30,
-            'pending': 10,
-            'approved': 12,
-            'rejected': 3,
-            'in_review': 5,
-            'avg_time': '1.8 days'
-        },
-        {
-            'name': 'HR',
-            'total': 20,
-            'pending': 5,
-            'approved': 10,
-            'rejected': 2,
-            'in_review': 3,
-            'avg_time': '1.5 days'
-        },
-        {
-            'name': 'Laboratory',
-            'total': 15,
-            'pending': 8,
-            'approved': 2,
-            'rejected': 1,
-            'in_review': 4,
-            'avg_time': '3.2 days'
-        },
-        {
-            'name': 'IT',
-            'total': 17,
-            'pending': 4,
-            'approved': 8,
-            'rejected': 1,
-            'in_review': 4,
-            'avg_time': '2.0 days'
-        }
-    ]
-    
-    # Sample document type metrics
-    document_type_metrics = [
-        {
-            'type': 'Research Proposal',
-            'total': 35,
-            'pending': 12,
-            'approved': 15,
-            'rejected': 3,
-            'in_review': 5,
-            'avg_time': '3.5 days'
-        },
-        {
-            'type': 'Budget Request',
-            'total': 28,
-            'pending': 8,
-            'approved': 12,
-            'rejected': 2,
-            'in_review': 6,
-            'avg_time': '2.2 days'
-        },
-        {
-            'type': 'Equipment Request',
-            'total': 22,
-            'pending': 10,
-            'approved': 5,
-            'rejected': 2,
-            'in_review': 5,
-            'avg_time': '2.8 days'
-        },
-        {
-            'type': 'Leave Application',
-            'total': 18,
-            'pending': 4,
-            'approved': 10,
-            'rejected': 1,
-            'in_review': 3,
-            'avg_time': '1.2 days'
-        },
-        {
-            'type': 'Ethics Application',
-            'total': 24,
-            'pending': 8,
-            'approved': 10,
-            'rejected': 4,
-            'in_review': 2,
-            'avg_time': '4.5 days'
-        }
-    ]
-    
-    # Sample workflow bottlenecks (stages with highest average processing time)
-    bottlenecks = [
-        {
-            'stage': 'Ethics Review',
-            'avg_time': '5.2 days',
-            'documents_in_stage': 8,
-            'trend': '+0.5 days',  # Increasing (getting worse)
-            'recommendation': 'Add additional reviewer to Ethics Committee'
-        },
-        {
-            'stage': 'Financial Approval',
-            'avg_time': '3.8 days',
-            'documents_in_stage': 12,
-            'trend': '-0.2 days',  # Decreasing (improving)
-            'recommendation': 'Continue monitoring'
-        },
-        {
-            'stage': 'Director Review',
-            'avg_time': '2.9 days',
-            'documents_in_stage': 5,
-            'trend': '+0.3 days',
-            'recommendation': 'Create pre-review checklist to streamline decisions'
-        }
-    ]
-    
-    # Sample recent activity
-    recent_activity = [
-        {
-            'timestamp': '2025-04-30 14:23:15',
-            'user': 'John Smith',
-            'action': 'Approved',
-            'document': 'Research Proposal',
-            'tracking_code': 'KEMRI-20250430-1001',
-            'notes': 'Approved and forwarded to Ethics Committee'
-        },
-        {
-            'timestamp': '2025-04-30 13:05:42',
-            'user': 'Jane Doe',
-            'action': 'Rejected',
-            'document': 'Budget Request',
-            'tracking_code': 'KEMRI-20250430-1002',
-            'notes': 'Missing supporting documentation'
-        },
-        {
-            'timestamp': '2025-04-30 11:30:18',
-            'user': 'Mark Johnson',
-            'action': 'Forwarded',
-            'document': 'Equipment Request',
-            'tracking_code': 'KEMRI-20250429-1008',
-            'notes': 'Forwarded to Finance for final approval'
-        },
-        {
-            'timestamp': '2025-04-30 10:15:33',
-            'user': 'Sarah Williams',
-            'action': 'Changes Requested',
-            'document': 'Research Ethics Application',
-            'tracking_code': 'KEMRI-20250429-1006',
-            'notes': 'Need additional details on participant consent'
-        },
-        {
-            'timestamp': '2025-04-30 09:45:20',
-            'user': 'Robert Brown',
-            'action': 'Received',
-            'document': 'Leave Application',
-            'tracking_code': 'KEMRI-20250430-1003',
-            'notes': 'Acknowledged receipt'
-        }
-    ]
-    
-    # Generate chart data (for visualization in JavaScript)
-    # Daily document volume for the past week
-    daily_volume = [
-        {'date': '2025-04-24', 'submitted': 18, 'approved': 15, 'rejected': 3},
-        {'date': '2025-04-25', 'submitted': 22, 'approved': 18, 'rejected': 4},
-        {'date': '2025-04-26', 'submitted': 15, 'approved': 12, 'rejected': 2},
-        {'date': '2025-04-27', 'submitted': 8, 'approved': 6, 'rejected': 1},  # Weekend
-        {'date': '2025-04-28', 'submitted': 25, 'approved': 20, 'rejected': 5},
-        {'date': '2025-04-29', 'submitted': 28, 'approved': 22, 'rejected': 6},
-        {'date': '2025-04-30', 'submitted': 20, 'approved': 15, 'rejected': 4}
-    ]
-    
-    # Processing time by document type
-    processing_times = [
-        {'type': 'Research Proposal', 'time': 3.5},
-        {'type': 'Budget Request', 'time': 2.2},
-        {'type': 'Equipment Request', 'time': 2.8},
-        {'type': 'Leave Application', 'time': 1.2},
-        {'type': 'Ethics Application', 'time': 4.5}
-    ]
-    
-    # Status distribution
-    status_distribution = [
-        {'status': 'Pending', 'count': 42, 'color': '#ffc107'},
-        {'status': 'In Review', 'count': 35, 'color': '#17a2b8'},
-        {'status': 'Approved', 'count': 38, 'color': '#28a745'},
-        {'status': 'Rejected', 'count': 12, 'color': '#dc3545'}
-    ]
-    
-    # Trend data for workflow metrics over time
-    trends = {
-        'processing_time': [2.8, 2.5, 2.4, 2.3, 2.3, 2.2, 2.3],  # Days (past 7 days)
-        'sla_compliance': [90, 92, 93, 91, 94, 95, 94],  # Percentage (past 7 days)
-        'document_volume': [18, 22, 15, 8, 25, 28, 20]  # Total documents (past 7 days)
-    }
-    
-    # Documents requiring immediate attention (overdue or high priority)
-    urgent_documents = [
-        {
-            'tracking_code': 'KEMRI-20250428-1005',
-            'title': 'COVID-19 Research Funding',
-            'status': 'Pending',
-            'days_in_stage': 3,
-            'due_date': '2025-04-30',
-            'priority': 'Urgent',
-            'is_overdue': True
-        },
-        {
-            'tracking_code': 'KEMRI-20250429-1003',
-            'title': 'Laboratory Safety Audit',
-            'status': 'In Review',
-            'days_in_stage': 2,
-            'due_date': '2025-05-01',
-            'priority': 'Urgent',
-            'is_overdue': False
-        },
-        {
-            'tracking_code': 'KEMRI-20250427-1008',
-            'title': 'Emergency Medical Supplies',
-            'status': 'Pending',
-            'days_in_stage': 4,
-            'due_date': '2025-04-29',
-            'priority': 'Urgent',
-            'is_overdue': True
-        }
-    ]
+    # Metrics, charts and lists for the range, from the shared stats cache
+    metrics = dashboard_stats.get('registry', date_range)
     
     return render_template('registry_dashboard.html',
-                           overall_metrics=overall_metrics,
-                           department_metrics=department_metrics,
-                           document_type_metrics=document_type_metrics,
-                           bottlenecks=bottlenecks,
-                           recent_activity=recent_activity,
-                           daily_volume=daily_volume,
-                           processing_times=processing_times,
-                           status_distribution=status_distribution,
-                           trends=trends,
-                           urgent_documents=urgent_documents,
                            date_range=date_range,
-                           active_page='registry_dashboard')
+                           active_page='registry_dashboard',
+                           **metrics)
 
 @app.route('/workflow_notification', methods=['POST'])
 @requires_permission('registry_approval')
@@ -3923,33 +3648,15 @@ def admin_logs():
 
 def generate_tracking_code():
     """Generate a unique tracking code in the format KEMRI-YYYYMMDD-XXXX"""
-    import random
-    # Format: KEMRI-YYYYMMDD-XXXX where XXXX is a random 4-digit number
-    today = datetime.now().strftime('%Y%m%d')
-    random_digits = random.randint(1000, 9999)
-    tracking_code = f"KEMRI-{today}-{random_digits}"
-    
-    # Check if code already exists in database
+    return generate_tracking_codes(1)[0]
+
+def generate_tracking_codes(count):
+    """Generate `count` unique tracking codes for today, e.g. for imports"""
     conn = get_db_connection()
     try:
-        # Use the correct column name 'tracking_code' instead of 'code'
-        exists = conn.execute('SELECT COUNT(*) FROM document WHERE tracking_code = ?', 
-                             (tracking_code,)).fetchone()[0] > 0
-    except sqlite3.OperationalError as e:
-        # If there's an error (like the table doesn't exist yet), assume the code doesn't exist
-        print(f"Database error checking tracking code: {e}")
-        exists = False
-    except Exception as e:
-        print(f"Error checking tracking code: {e}")
-        exists = False
+        return allocate_tracking_codes(conn, count)
     finally:
         conn.close()
-    
-    # If code exists, try again recursively
-    if exists:
-        return generate_tracking_code()
-    
-    return tracking_code
 
 @app.route('/add_attachment/<doc_code>', methods=['POST'])
 def add_attachment(doc_code):
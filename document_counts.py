@@ -0,0 +1,277 @@
+"""
+Document counts service for the KEMRI Document Management System.
+
+Provides document counts for every (status, priority) pair as a single
+matrix. Views slice the matrix instead of issuing one COUNT query per status
+or priority. The all-time matrix is read from the document_counters table,
+which triggers keep up to date. Date-windowed counts and activity over time
+are read from the daily rollup in daily_stats.py, using the bucket helpers
+defined here.
+"""
+
+from datetime import date, timedelta
+from sqlalchemy import text
+
+# Statuses and priorities shown on the dashboard and reports
+STATUSES = ['Incoming', 'Pending', 'Received', 'Outgoing', 'Ended']
+PRIORITIES = ['Normal', 'Priority', 'Urgent']
+
+# Statuses listed on the incoming and outgoing pages
+INCOMING_STATUSES = ['Incoming', 'Pending', 'Received']
+OUTGOING_STATUSES = ['Outgoing', 'Sent']
+
+
+class DocumentCounts:
+    """Matrix of document counts keyed by (status, priority)"""
+
+    def __init__(self, counts=None):
+        self._counts = dict(counts or {})
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build the matrix from (status, priority, count) rows"""
+        counts = {}
+        for status, priority, count in rows:
+            counts[(status, priority)] = counts.get((status, priority), 0) + int(count or 0)
+        return cls(counts)
+
+    def count(self, statuses=None, priorities=None):
+        """Number of documents in any of the given statuses and priorities.
+
+        None means "any", so count() with no arguments is the grand total.
+        """
+        return sum(
+            n for (status, priority), n in self._counts.items()
+            if (statuses is None or status in statuses)
+            and (priorities is None or priority in priorities)
+        )
+
+    @property
+    def total(self):
+        """Total number of documents"""
+        return self.count()
+
+    def by_status(self, statuses=STATUSES, priorities=None):
+        """Return {status: count} for the given statuses"""
+        return {status: self.count([status], priorities) for status in statuses}
+
+    def by_priority(self, priorities=PRIORITIES, statuses=None):
+        """Return {priority: count} for the given priorities"""
+        return {priority: self.count(statuses, [priority]) for priority in priorities}
+
+    def as_dict(self):
+        """Return {(status, priority): count} for every non-empty cell"""
+        return dict(self._counts)
+
+    def restricted(self, statuses=None, priorities=None):
+        """Return a matrix holding only the given statuses and priorities"""
+        return DocumentCounts({
+            (status, priority): n for (status, priority), n in self._counts.items()
+            if (statuses is None or status in statuses)
+            and (priorities is None or priority in priorities)
+        })
+
+
+# Activity over time ---------------------------------------------------------
+
+# SQL expression giving the first day of each bucket (weeks start on Monday)
+ACTIVITY_BUCKETS = {
+    'day': "date({column})",
+    'week': "date({column}, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', {column})",
+}
+
+# Longest series a single request may ask for
+MAX_ACTIVITY_BUCKETS = 1000
+
+
+def bucket_start(day, granularity):
+    """Return the first day of the bucket containing `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    """Return the first day of the bucket after the one starting on `day`"""
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def activity_buckets(start, end, granularity='day'):
+    """List the first day of every bucket overlapping start..end (inclusive)"""
+    if granularity not in ACTIVITY_BUCKETS:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    if end < start:
+        raise ValueError('end must not be before start')
+
+    buckets = []
+    day = bucket_start(start, granularity)
+    while day <= end:
+        buckets.append(day)
+        if len(buckets) > MAX_ACTIVITY_BUCKETS:
+            raise ValueError(f'Date range spans more than {MAX_ACTIVITY_BUCKETS} {granularity}s')
+        day = next_bucket(day, granularity)
+    return buckets
+
+
+# Incrementally maintained counters ------------------------------------------
+
+COUNTERS_TABLE = 'document_counters'
+
+# Documents in any other status count as outgoing (same rule as document_details)
+_DIRECTION = (
+    "CASE WHEN {row}.status IN ('Incoming', 'Pending', 'Received') "
+    "THEN 'Incoming' ELSE 'Outgoing' END"
+)
+
+
+def _bump(row, delta):
+    return (
+        f"INSERT INTO {COUNTERS_TABLE} (status, priority, direction, count) "
+        f"VALUES (COALESCE({row}.status, ''), COALESCE({row}.priority, ''), "
+        f"{_DIRECTION.format(row=row)}, {delta}) "
+        f"ON CONFLICT (status, priority, direction) DO UPDATE SET count = count + ({delta});"
+    )
+
+
+_COUNTER_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_counters_ai AFTER INSERT ON document BEGIN
+        {_bump('new', 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_counters_ad AFTER DELETE ON document BEGIN
+        {_bump('old', -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_counters_au AFTER UPDATE OF status, priority ON document
+    WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority BEGIN
+        {_bump('old', -1)}
+        {_bump('new', 1)}
+    END
+    """,
+]
+
+
+def setup_document_counters(engine):
+    """Create the triggers that keep document_counters in sync.
+
+    The triggers run inside whatever transaction changes the document
+    table, so the counters can never disagree with a committed write. The
+    counters are filled from scratch the first time they are set up.
+    """
+    with engine.begin() as conn:
+        for trigger in _COUNTER_TRIGGERS:
+            conn.execute(text(trigger))
+        empty = conn.execute(text(f'SELECT 1 FROM {COUNTERS_TABLE} LIMIT 1')).first() is None
+    if empty:
+        rebuild_document_counters(engine)
+
+
+def rebuild_document_counters(engine):
+    """Recompute document_counters from the document table.
+
+    Returns a list of (status, priority, direction, stored, actual) tuples
+    for every counter that had drifted from the real count.
+    """
+    with engine.begin() as conn:
+        # Take the write lock first so no document changes between reading
+        # the stored counters and replacing them
+        conn.execute(text(f'UPDATE {COUNTERS_TABLE} SET count = count'))
+
+        stored = {
+            (status, priority, direction): count
+            for status, priority, direction, count in conn.execute(
+                text(f'SELECT status, priority, direction, count FROM {COUNTERS_TABLE}')
+            )
+        }
+        actual = {
+            (status, priority, direction): count
+            for status, priority, direction, count in conn.execute(text(
+                f"SELECT COALESCE(status, ''), COALESCE(priority, ''), "
+                f"{_DIRECTION.format(row='document')}, COUNT(*) "
+                f"FROM document GROUP BY 1, 2, 3"
+            ))
+        }
+
+        conn.execute(text(f'DELETE FROM {COUNTERS_TABLE}'))
+        if actual:
+            conn.execute(
+                text(
+                    f'INSERT INTO {COUNTERS_TABLE} (status, priority, direction, count) '
+                    f'VALUES (:status, :priority, :direction, :count)'
+                ),
+                [
+                    {'status': s, 'priority': p, 'direction': d, 'count': c}
+                    for (s, p, d), c in actual.items()
+                ]
+            )
+
+    return [
+        key + (stored.get(key, 0), actual.get(key, 0))
+        for key in sorted(set(stored) | set(actual))
+        if stored.get(key, 0) != actual.get(key, 0)
+    ]
+
+
+def read_document_counters(session):
+    """Load the (status, priority) matrix from the maintained counters"""
+    rows = session.execute(text(
+        f'SELECT status, priority, count FROM {COUNTERS_TABLE} WHERE count != 0'
+    )).fetchall()
+    return DocumentCounts.from_rows(rows)
+
+
+# Data version ---------------------------------------------------------------
+
+VERSION_TABLE = 'document_version'
+
+_VERSION_BUMP = f'UPDATE {VERSION_TABLE} SET version = version + 1 WHERE id = 1;'
+
+_VERSION_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_version_ai AFTER INSERT ON document BEGIN
+        {_VERSION_BUMP}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_version_ad AFTER DELETE ON document BEGIN
+        {_VERSION_BUMP}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_version_au
+    AFTER UPDATE OF status, priority, sender, created_at ON document BEGIN
+        {_VERSION_BUMP}
+    END
+    """,
+]
+
+
+def setup_document_version(engine):
+    """Create the triggers that bump the document data version.
+
+    The version changes whenever a write could change any count or report,
+    so it can key caches and ETags. It starts from the current Unix time,
+    so a recreated database never reuses the versions of an old one.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"INSERT INTO {VERSION_TABLE} (id, version) "
+            f"VALUES (1, CAST(strftime('%s', 'now') AS INTEGER)) ON CONFLICT (id) DO NOTHING"
+        ))
+        for trigger in _VERSION_TRIGGERS:
+            conn.execute(text(trigger))
+
+
+def read_document_version(session):
+    """Return the current document data version"""
+    return session.execute(text(f'SELECT version FROM {VERSION_TABLE} WHERE id = 1')).scalar() or 0
@@ -0,0 +1,92 @@
+"""
+Index advisor for the KEMRI Document Management System.
+
+Runs EXPLAIN QUERY PLAN on the application's canonical queries and flags the
+ones SQLite can only answer with a full table scan or an extra sort pass.
+"""
+
+
+def compile_statement(session, statement):
+    """Render a SQLAlchemy statement as SQL for the session's database.
+
+    Parameters are rendered inline; the canonical queries only contain
+    constants, and inlining also expands IN lists.
+    """
+    return str(statement.compile(
+        dialect=session.get_bind().dialect,
+        compile_kwargs={'literal_binds': True}
+    ))
+
+
+def explain_query_plan(session, statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement"""
+    return explain_sql(session, compile_statement(session, statement))
+
+
+def explain_sql(session, sql):
+    """Return the EXPLAIN QUERY PLAN detail lines for compiled SQL"""
+    rows = session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+
+    # Rows are (id, parent, notused, detail)
+    return [row[3] for row in rows]
+
+
+def is_full_scan(detail):
+    """True if a plan step reads a whole table without using an index"""
+    return (
+        detail.startswith('SCAN ')
+        and 'USING' not in detail
+        and 'VIRTUAL TABLE' not in detail
+    )
+
+
+def is_temp_sort(detail):
+    """True if a plan step sorts rows in a temporary b-tree"""
+    return 'USE TEMP B-TREE' in detail
+
+
+def analyze_queries(session, queries):
+    """Explain each (name, statement) pair and flag inefficient plans.
+
+    Returns a list of dicts with the query name, SQL, plan lines, and the
+    plan steps flagged as full scans or temporary sorts. `status` is
+    'Error', 'Full scan', 'Temp sort' or 'OK', worst first; a statement
+    that cannot be compiled or explained is reported with its error.
+    """
+    results = []
+    for name, statement in queries:
+        sql = ''
+        try:
+            sql = compile_statement(session, statement)
+            plan = explain_sql(session, sql)
+        except Exception as e:
+            results.append({
+                'name': name,
+                'sql': sql,
+                'plan': [],
+                'full_scans': [],
+                'temp_sorts': [],
+                'status': 'Error',
+                'error': str(e)
+            })
+            continue
+
+        full_scans = [step for step in plan if is_full_scan(step)]
+        temp_sorts = [step for step in plan if is_temp_sort(step)]
+        if full_scans:
+            status = 'Full scan'
+        elif temp_sorts:
+            status = 'Temp sort'
+        else:
+            status = 'OK'
+
+        results.append({
+            'name': name,
+            'sql': sql,
+            'plan': plan,
+            'full_scans': full_scans,
+            'temp_sorts': temp_sorts,
+            'status': status,
+            'error': None
+        })
+    return results
@@ -70,6 +70,14 @@ CREATE TABLE IF NOT EXISTS system_log (
 )
 ''')
 
+# Create tracking_sequence table (per-day tracking code counters)
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS tracking_sequence (
+    day TEXT PRIMARY KEY,
+    last_value INTEGER NOT NULL
+)
+''')
+
 # Create admin user
 admin_password = generate_password_hash('admin123')
 cursor.execute('''
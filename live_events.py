@@ -0,0 +1,146 @@
+"""
+Live counter events for the KEMRI Document Management System.
+
+Pages that stay open all day (the dashboard and the incoming queue) follow
+document changes over Server-Sent Events instead of being refreshed. Each
+request to the event endpoint answers at once and closes: the browser
+reconnects after the retry interval and sends back the cursor it was given
+as Last-Event-ID, so an open tab never holds a worker thread between polls.
+
+A cursor records the document data version and the newest document and
+system log ids the client has seen. Each worker process runs one
+EventBroker, which reads those three values at most once per poll_interval
+however many tabs are polling, and only reads the counters again when the
+version has changed. A client that is up to date costs no query at all; one
+that is behind gets a fresh snapshot of the counts and the urgent documents
+and log entries created since its cursor.
+
+The broker answers at most max_concurrent polls at a time per worker, so a
+burst of reconnecting tabs can never take every request thread.
+"""
+
+import json
+import threading
+import time
+
+from sqlalchemy import text
+
+from document_counts import COUNTERS_TABLE, VERSION_TABLE, PRIORITIES, STATUSES
+
+# Most urgent documents and log entries sent in one event
+MAX_BATCH = 20
+
+
+def format_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+def format_cursor(cursor):
+    """Encode the cursor a client sends back as Last-Event-ID"""
+    return 'id: {}-{}-{}\n\n'.format(*cursor)
+
+
+def parse_cursor(value):
+    """(version, last document id, last log id) from Last-Event-ID, or None if it is missing or malformed"""
+    try:
+        version, document_id, log_id = (int(part) for part in (value or '').split('-'))
+    except ValueError:
+        return None
+    return version, document_id, log_id
+
+
+class EventBroker:
+    """Answers this worker's counter polls from one cached reading of the database"""
+
+    def __init__(self, engine, poll_interval=1.0, max_concurrent=1):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._state = None  # (version, {(status, priority): count}, last document id, last log id)
+        self._checked_at = None
+
+    def acquire(self):
+        """Take a slot for one poll, or return False if this worker is answering enough already"""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def current(self):
+        """The cached (version, counts, last document id, last log id), rechecked once per poll_interval"""
+        with self._lock:
+            if self._state is None or time.monotonic() - self._checked_at >= self.poll_interval:
+                with self.engine.connect() as conn:
+                    self._state = self._read(conn, self._state)
+                self._checked_at = time.monotonic()
+            return self._state
+
+    def events(self, cursor=None):
+        """(events, cursor) that bring a client at cursor up to date.
+
+        A client without a valid cursor, or whose counts are out of date, is
+        sent a snapshot. Urgent documents and log entries created after its
+        cursor follow, oldest first and at most MAX_BATCH of each.
+        """
+        version, cells, last_document_id, last_log_id = self.current()
+        seen = parse_cursor(cursor)
+        events = []
+        if seen is None or seen[0] != version:
+            events.append(('snapshot', snapshot(version, cells)))
+        if seen is not None and (seen[1] < last_document_id or seen[2] < last_log_id):
+            with self.engine.connect() as conn:
+                if seen[1] < last_document_id:
+                    urgent = _newest(conn, (
+                        "SELECT id, code, title, sender, priority, created_at FROM document "
+                        "WHERE id > :after AND id <= :last AND priority = 'Urgent' "
+                        "ORDER BY id DESC LIMIT :limit"
+                    ), seen[1], last_document_id)
+                    if urgent:
+                        events.append(('urgent', urgent))
+                if seen[2] < last_log_id:
+                    logs = _newest(conn, (
+                        'SELECT id, timestamp, log_type, user, action, details FROM system_log '
+                        'WHERE id > :after AND id <= :last ORDER BY id DESC LIMIT :limit'
+                    ), seen[2], last_log_id)
+                    if logs:
+                        events.append(('log', logs))
+        return events, (version, last_document_id, last_log_id)
+
+    def _read(self, conn, previous):
+        version = conn.execute(text(f'SELECT version FROM {VERSION_TABLE} WHERE id = 1')).scalar() or 0
+        if previous is not None and previous[0] == version:
+            cells = previous[1]
+        else:
+            cells = self._read_counters(conn)
+        last_document_id = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM document')).scalar()
+        last_log_id = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM system_log')).scalar()
+        return version, cells, last_document_id, last_log_id
+
+    def _read_counters(self, conn):
+        return {
+            (status, priority): count
+            for status, priority, count in conn.execute(
+                text(
+                    f'SELECT status, priority, SUM(count) FROM {COUNTERS_TABLE} '
+                    f'GROUP BY status, priority HAVING SUM(count) != 0'
+                )
+            )
+        }
+
+
+def snapshot(version, cells):
+    """Totals by status and priority, as sent to a client whose counts are out of date"""
+    return {
+        'version': version,
+        'total': sum(cells.values()),
+        'status': {status: sum(n for (s, p), n in cells.items() if s == status) for status in STATUSES},
+        'priority': {priority: sum(n for (s, p), n in cells.items() if p == priority) for priority in PRIORITIES},
+    }
+
+
+def _newest(conn, query, after, last):
+    """The newest MAX_BATCH rows between two ids, oldest first"""
+    rows = conn.execute(text(query), {'after': after, 'last': last, 'limit': MAX_BATCH}).mappings().all()
+    return [dict(row) for row in reversed(rows)]
@@ -0,0 +1,295 @@
+"""
+Monthly system log partitions for the KEMRI Document Management System.
+
+system_log only holds the current month. rotate_system_log() moves older
+entries into one table per month (system_log_2025_04, ...), so the
+dashboard, maintenance and database pages sort a month of entries rather
+than the whole history. The system_log_all view is the union of system_log
+and every partition, for the few queries that need to look further back.
+
+Partitions older than the retention period are compacted into gzipped JSON
+lines files, one per month (system_log_2025-04.jsonl.gz), and dropped from
+the database. Archived months can be read back a day range at a time and
+restored into their partition table; a restored partition is compacted
+again (merged into the same archive) by the next compaction.
+
+Rotation and compaction take the database write lock before looking at the
+partitions, so when several processes run them at once the first does the
+work and the others find nothing left to do.
+"""
+
+import gzip
+import json
+import os
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+LOG_TABLE = 'system_log'
+ALL_LOGS_VIEW = 'system_log_all'
+LOG_COLUMNS = ('id', 'timestamp', 'log_type', 'user', 'action', 'details')
+
+# Created on every partition; system_log declares the same ones on the SystemLog model
+LOG_INDEXES = (('timestamp',), ('action', 'timestamp'), ('log_type', 'timestamp'), ('user', 'timestamp'))
+
+_COLUMN_LIST = ', '.join(LOG_COLUMNS)
+_PARTITION_NAME = re.compile(r'^system_log_(\d{4})_(\d{2})$')
+_ARCHIVE_NAME = re.compile(r'^system_log_(\d{4})-(\d{2})\.jsonl\.gz$')
+
+
+def month_start(value):
+    """First day of the month containing a date or datetime"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_month(value):
+    """Parse 'YYYY-MM', raising ValueError for anything else"""
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def partition_table(month):
+    return f'{LOG_TABLE}_{month.year:04d}_{month.month:02d}'
+
+
+def archive_filename(month):
+    return f'{LOG_TABLE}_{month.year:04d}-{month.month:02d}.jsonl.gz'
+
+
+def log_timestamp(value):
+    """A date or datetime in the text format SQLAlchemy stores DateTime columns in on SQLite"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return value.strftime('%Y-%m-%d 00:00:00.000000')
+
+
+def _partition_tables(conn):
+    """[(month, table name)] for every partition, oldest first"""
+    names = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'system_log_%'"))
+    partitions = []
+    for (name,) in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def _create_partition(conn, table):
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, timestamp DATETIME, '
+        f'log_type VARCHAR(20), user VARCHAR(100), action VARCHAR(100), details TEXT)'
+    ))
+    for columns in LOG_INDEXES:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+        ))
+
+
+def _create_view(conn):
+    selects = [f'SELECT {_COLUMN_LIST} FROM {LOG_TABLE}'] + [
+        f'SELECT {_COLUMN_LIST} FROM {table}' for _, table in _partition_tables(conn)
+    ]
+    conn.execute(text(f'DROP VIEW IF EXISTS {ALL_LOGS_VIEW}'))
+    conn.execute(text(f"CREATE VIEW {ALL_LOGS_VIEW} AS {' UNION ALL '.join(selects)}"))
+
+
+def setup_log_partitions(engine):
+    """Index every partition and create (or refresh) the system_log_all view over them"""
+    with engine.begin() as conn:
+        for _, table in _partition_tables(conn):
+            _create_partition(conn, table)
+        _create_view(conn)
+
+
+def _lock_logs(conn):
+    """Start the write transaction now, so concurrent rotations and compactions run one at a time"""
+    conn.execute(text(f'UPDATE {LOG_TABLE} SET id = id WHERE 0'))
+
+
+def log_tables(conn, start=None, end=None):
+    """[(month, table name)] that can hold entries from start up to end, newest first.
+
+    system_log comes first with month None, since it always holds the
+    newest entries. start and end are datetimes; end is exclusive.
+    """
+    tables = [(None, LOG_TABLE)]
+    for month, table in reversed(_partition_tables(conn)):
+        if start and add_months(month, 1) <= start.date():
+            continue
+        if end and log_timestamp(month) >= log_timestamp(end):
+            continue
+        tables.append((month, table))
+    return tables
+
+
+def rotate_system_log(engine, now=None):
+    """Move entries from before the current month into their monthly partitions.
+
+    Returns {month: entries moved}. The move is one transaction, and it
+    records itself as a 'Logs Rotated' entry, which also keeps the newest
+    id in system_log so new entries never reuse the id of a moved one.
+    """
+    now = now or datetime.utcnow()
+    cutoff = log_timestamp(month_start(now))
+    moved = {}
+    with engine.begin() as conn:
+        _lock_logs(conn)
+        months = conn.execute(
+            text(f'SELECT DISTINCT substr(timestamp, 1, 7) FROM {LOG_TABLE} WHERE timestamp < :cutoff'),
+            {'cutoff': cutoff}
+        ).scalars().all()
+        if not months:
+            return moved
+        for label in sorted(months):
+            month = parse_month(label)
+            table = partition_table(month)
+            _create_partition(conn, table)
+            result = conn.execute(
+                text(
+                    f'INSERT OR IGNORE INTO {table} ({_COLUMN_LIST}) SELECT {_COLUMN_LIST} FROM {LOG_TABLE} '
+                    f'WHERE timestamp >= :start AND timestamp < :end'
+                ),
+                {'start': log_timestamp(month), 'end': log_timestamp(add_months(month, 1))}
+            )
+            moved[month] = result.rowcount
+        conn.execute(
+            text(
+                f'INSERT INTO {LOG_TABLE} (timestamp, log_type, user, action, details) '
+                f"VALUES (:timestamp, 'Info', 'System', 'Logs Rotated', :details)"
+            ),
+            {
+                'timestamp': log_timestamp(now),
+                'details': 'Moved log entries into monthly partitions: ' + ', '.join(
+                    f'{month:%Y-%m} ({count})' for month, count in moved.items()
+                ),
+            }
+        )
+        conn.execute(text(f'DELETE FROM {LOG_TABLE} WHERE timestamp < :cutoff'), {'cutoff': cutoff})
+        _create_view(conn)
+    return moved
+
+
+def compact_log_partitions(engine, archive_folder, retention_months=6, now=None):
+    """Archive partitions older than retention_months and drop them.
+
+    Each month is merged into its JSON lines archive (so a restored month
+    is not duplicated) and the file is synced to disk before its table is
+    dropped. Returns {month: entries in the archive}.
+    """
+    oldest_kept = add_months(month_start(now or datetime.utcnow()), -retention_months)
+    with engine.connect() as conn:
+        expired = [month for month, _ in _partition_tables(conn) if month < oldest_kept]
+    if not expired:
+        return {}
+
+    os.makedirs(archive_folder, exist_ok=True)
+    compacted = {}
+    for month in expired:
+        with engine.begin() as conn:
+            _lock_logs(conn)
+            table = partition_table(month)
+            # Another process may have compacted it while this one waited for the lock
+            if (month, table) not in _partition_tables(conn):
+                continue
+            rows = [dict(row) for row in conn.execute(text(f'SELECT {_COLUMN_LIST} FROM {table}')).mappings()]
+            compacted[month] = _write_archive(archive_folder, month, rows)
+            conn.execute(text(f'DROP TABLE {table}'))
+            _create_view(conn)
+    return compacted
+
+
+def _write_archive(archive_folder, month, rows):
+    path = os.path.join(archive_folder, archive_filename(month))
+    entries = {entry['id']: entry for entry in read_log_archive(archive_folder, month)}
+    for row in rows:
+        entries[row['id']] = {column: _json_value(row[column]) for column in LOG_COLUMNS}
+
+    fd, partial = tempfile.mkstemp(suffix='.partial', dir=archive_folder)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for entry_id in sorted(entries):
+                    archive.write((json.dumps(entries[entry_id]) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+    except BaseException:
+        os.unlink(partial)
+        raise
+    os.replace(partial, path)
+    return len(entries)
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return log_timestamp(value)
+    return value
+
+
+def list_log_partitions(engine):
+    """[{'month', 'table', 'entries'}] for the live partitions, newest first"""
+    with engine.connect() as conn:
+        return [
+            {
+                'month': month,
+                'table': table,
+                'entries': conn.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar(),
+            }
+            for month, table in reversed(_partition_tables(conn))
+        ]
+
+
+def list_log_archives(archive_folder):
+    """[{'month', 'filename', 'size'}] for the archived months, newest first"""
+    if not os.path.isdir(archive_folder):
+        return []
+    archives = []
+    for filename in os.listdir(archive_folder):
+        match = _ARCHIVE_NAME.match(filename)
+        if match:
+            archives.append({
+                'month': date(int(match.group(1)), int(match.group(2)), 1),
+                'filename': filename,
+                'size': os.path.getsize(os.path.join(archive_folder, filename)),
+            })
+    return sorted(archives, key=lambda archive: archive['month'], reverse=True)
+
+
+def read_log_archive(archive_folder, month, start=None, end=None):
+    """Yield the archived entries of a month, optionally only from day start to day end"""
+    path = os.path.join(archive_folder, archive_filename(month))
+    if not os.path.exists(path):
+        return
+    low = log_timestamp(start) if start else None
+    high = log_timestamp(end + timedelta(days=1)) if end else None
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            entry = json.loads(line)
+            timestamp = entry['timestamp'] or ''
+            if (low and timestamp < low) or (high and timestamp >= high):
+                continue
+            yield entry
+
+
+def restore_log_archive(engine, archive_folder, month, start=None, end=None):
+    """Copy archived entries back into their month's partition. Returns entries restored."""
+    entries = list(read_log_archive(archive_folder, month, start, end))
+    if not entries:
+        return 0
+    table = partition_table(month)
+    with engine.begin() as conn:
+        _create_partition(conn, table)
+        result = conn.execute(
+            text(
+                f'INSERT OR IGNORE INTO {table} ({_COLUMN_LIST}) '
+                f"VALUES ({', '.join(':' + column for column in LOG_COLUMNS)})"
+            ),
+            entries
+        )
+        _create_view(conn)
+    return result.rowcount
@@ -0,0 +1,129 @@
+"""
+Filtered, cursor-paginated reads of the KEMRI system log.
+
+The system log is split across system_log (the current month) and one
+partition table per earlier month, see log_partitions.py. LogQuery reads
+them newest first, filtered on log type, user, action and a time range.
+Every table is indexed on each of those columns followed by timestamp, so
+each filter is an index range scan.
+
+Pages are keyset paginated on (timestamp, id): a page seeks past the last
+entry of the previous one instead of using OFFSET, so the millionth page
+costs the same as the first. Each table is asked for at most one page of
+entries after the cursor and the results are merged. Partitions that only
+hold entries older than a full page are not queried at all.
+
+Months that have been compacted into archives are not searched; restore
+them on the Log Archives page first.
+"""
+
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from log_partitions import LOG_COLUMNS, add_months, log_tables, log_timestamp
+
+# Query string parameter -> system_log column for the exact-match filters
+LOG_FILTERS = {'type': 'log_type', 'user': 'user', 'action': 'action'}
+
+_COLUMN_LIST = ', '.join(LOG_COLUMNS)
+
+
+def parse_log_time(value, end=False):
+    """Parse an ISO date or date-time filter.
+
+    A bare date as the end of a range includes that whole day.
+    """
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def encode_cursor(entry):
+    raw = json.dumps([entry['timestamp'], entry['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from a cursor, raising ValueError for a malformed one"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(timestamp, str) or not isinstance(entry_id, int):
+        raise ValueError('Invalid cursor')
+    return timestamp, entry_id
+
+
+def _sort_key(entry):
+    return entry['timestamp'], entry['id']
+
+
+class LogQuery:
+    """System log entries matching a set of filters, newest first.
+
+    filters maps LOG_FILTERS columns to the value they must equal; start
+    and end are datetimes bounding the entry timestamps (end exclusive).
+    """
+
+    def __init__(self, engine, filters=None, start=None, end=None):
+        self.engine = engine
+        self.filters = {column: value for column, value in (filters or {}).items() if value}
+        self.start = start
+        self.end = end
+
+    def _select(self, table, cursor, limit):
+        conditions = ['timestamp IS NOT NULL']
+        params = {'limit': limit}
+        for column, value in self.filters.items():
+            conditions.append(f'{column} = :{column}')
+            params[column] = value
+        if self.start:
+            conditions.append('timestamp >= :start')
+            params['start'] = log_timestamp(self.start)
+        if self.end:
+            conditions.append('timestamp < :end')
+            params['end'] = log_timestamp(self.end)
+        if cursor:
+            conditions.append('(timestamp, id) < (:cursor_timestamp, :cursor_id)')
+            params['cursor_timestamp'], params['cursor_id'] = cursor
+        return text(
+            f"SELECT {_COLUMN_LIST} FROM {table} WHERE {' AND '.join(conditions)} "
+            f'ORDER BY timestamp DESC, id DESC LIMIT :limit'
+        ), params
+
+    def page(self, cursor=None, limit=100):
+        """(entries, next cursor) for the page after cursor; the cursor is None on the last page"""
+        position = decode_cursor(cursor) if cursor else None
+        found = []
+        with self.engine.connect() as conn:
+            for month, table in log_tables(conn, self.start, self.end):
+                if month is not None:
+                    month_end = log_timestamp(add_months(month, 1))
+                    # Everything in this partition (and the older ones) sorts after
+                    # a full page that has already been found
+                    if len(found) > limit and found[limit]['timestamp'] >= month_end:
+                        break
+                    if position and log_timestamp(month) > position[0]:
+                        continue
+                query, params = self._select(table, position, limit + 1)
+                rows = [dict(row) for row in conn.execute(query, params).mappings()]
+                found = list(heapq.merge(found, rows, key=_sort_key, reverse=True))[:limit + 1]
+
+        entries = found[:limit]
+        next_cursor = encode_cursor(entries[-1]) if len(found) > limit else None
+        return entries, next_cursor
+
+    def iter_entries(self, batch_size=1000):
+        """Yield every matching entry, a page at a time"""
+        cursor = None
+        while True:
+            entries, cursor = self.page(cursor, batch_size)
+            yield from entries
+            if cursor is None:
+                return
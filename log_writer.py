@@ -0,0 +1,139 @@
+"""
+Background system log writer for the KEMRI Document Management System.
+
+Most routes record what they did in system_log. Writing that row inside the
+request means another INSERT and, usually, another commit (an fsync on
+SQLite) before the response goes out. SystemLogWriter takes the entry off
+the request path instead: write() stamps it and puts it on an in-memory
+queue, and a background thread inserts whatever has queued up every
+flush_interval seconds as multi-row INSERTs, one transaction per batch.
+
+close() stops the thread and commits everything still queued, so a clean
+shutdown loses nothing. The app registers it with atexit, which runs however
+the app is served, including when a gunicorn worker stops. A batch that
+fails to insert is retried on the next flushes before it is given up on,
+and if the queue fills up (the database is down or far behind), write()
+falls back to inserting the entry itself.
+"""
+
+import queue
+import threading
+from datetime import datetime
+
+# Flushes a failing batch is retried on before it is dropped
+MAX_ATTEMPTS = 3
+
+
+class SystemLogWriter:
+    """Queues system log entries and inserts them in batches from a background thread"""
+
+    def __init__(self, engine, table, flush_interval=1.0, batch_size=100, max_pending=10000):
+        self.engine = engine
+        self.table = table
+        self.flush_interval = flush_interval
+        # Five columns per row; 100 rows stays under SQLite's oldest bound parameter limit
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._retry = None  # (batch, attempts) that failed on the last flush
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def write(self, log_type, user, action, details, timestamp=None):
+        """Queue one log entry; it is inserted by the next flush"""
+        entry = {
+            'timestamp': timestamp or datetime.utcnow(),
+            'log_type': log_type,
+            'user': user,
+            'action': action,
+            'details': details,
+        }
+        if self._closed:
+            self._write_now([entry])
+            return
+        self._start()
+        try:
+            self._queue.put(entry, timeout=self.flush_interval)
+        except queue.Full:
+            # The writer is far behind; insert this entry rather than lose it
+            self._write_now([entry])
+
+    @property
+    def pending(self):
+        """Entries queued but not inserted yet"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """Insert every queued entry now. Returns the number of rows written."""
+        written = 0
+        with self._write_lock:
+            if self._retry:
+                batch, attempts = self._retry
+                self._retry = None
+                written += self._insert(batch, attempts)
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                written += self._insert(batch, 0)
+                if self._retry:
+                    # The database is failing; try again on the next flush
+                    return written
+
+    def close(self):
+        """Stop the background thread and commit everything still queued"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self._retry:
+            # Last chance at shutdown
+            batch, attempts = self._retry
+            self._retry = None
+            self._write_now(batch)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='system-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing system log: {str(e)}")
+
+    def _insert(self, batch, attempts):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert().values(batch))
+            return len(batch)
+        except Exception as e:
+            attempts += 1
+            if attempts < MAX_ATTEMPTS:
+                print(f"Error writing {len(batch)} system log entries (attempt {attempts}): {str(e)}")
+                self._retry = (batch, attempts)
+            else:
+                print(f"Dropping {len(batch)} system log entries after {attempts} attempts: {str(e)}")
+            return 0
+
+    def _write_now(self, batch):
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert().values(batch))
+        except Exception as e:
+            print(f"Error writing system log: {str(e)}")
@@ -0,0 +1,136 @@
+"""
+Keyset (cursor) pagination for SQLAlchemy queries.
+
+Instead of OFFSET + COUNT, each page seeks past the sort key of the last row
+on the previous page: WHERE (sort_col, id) > (:last_sort, :last_id). With an
+index on the sort keys every page costs the same, however deep it is.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime, date
+from sqlalchemy import tuple_, literal
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if '$dt' in value:
+            return datetime.fromisoformat(value['$dt'])
+        if '$d' in value:
+            return date.fromisoformat(value['$d'])
+    return value
+
+
+class KeysetPagination:
+    """One page of a query, paginated by seeking on its sort keys.
+
+    `sort_keys` is a list of SQL expressions that uniquely orders the rows,
+    so the last key should be a unique column such as the primary key. Keys
+    must not be NULL. All keys are sorted in the same direction (`order`),
+    which lets SQLite compare them as a single row value against an index.
+
+    Cursors are opaque URL-safe strings. A cursor produced for a different
+    sort order is ignored and the first page is returned instead.
+    """
+
+    def __init__(self, query, sort_keys, per_page=10, cursor=None, order='desc'):
+        self.query = query
+        self.sort_keys = list(sort_keys)
+        self.per_page = per_page
+        self.order = 'asc' if order == 'asc' else 'desc'
+        self._total = None
+
+        values, direction = self._decode_cursor(cursor)
+        backwards = direction == 'prev'
+
+        # Walking backwards means seeking the other way with the order reversed
+        ascending = (self.order == 'asc') != backwards
+        page_query = query.add_columns(*self.sort_keys)
+
+        if values is not None:
+            keys = tuple_(*self.sort_keys)
+            bound = tuple_(*[literal(v, type_=k.type) for k, v in zip(self.sort_keys, values)])
+            page_query = page_query.filter(keys > bound if ascending else keys < bound)
+
+        page_query = page_query.order_by(
+            *[k.asc() if ascending else k.desc() for k in self.sort_keys]
+        )
+        rows = page_query.limit(per_page + 1).all()
+
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+
+        self.items = [row[0] for row in rows]
+        self._row_keys = [tuple(row[1:]) for row in rows]
+
+        if backwards:
+            self.has_prev = more
+            self.has_next = True
+        else:
+            self.has_prev = values is not None
+            self.has_next = more
+
+        self.is_first_page = not self.has_prev
+
+    @property
+    def signature(self):
+        """Short fingerprint of the sort keys, used to reject stale cursors"""
+        spec = '|'.join(str(k) for k in self.sort_keys) + '|' + self.order
+        return hashlib.sha1(spec.encode('utf-8')).hexdigest()[:8]
+
+    def _encode_cursor(self, key_values, direction):
+        payload = {
+            's': self.signature,
+            'd': direction,
+            'k': [_encode_value(v) for v in key_values]
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def _decode_cursor(self, cursor):
+        if not cursor:
+            return None, None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if payload.get('s') != self.signature or len(payload['k']) != len(self.sort_keys):
+                return None, None
+            return [_decode_value(v) for v in payload['k']], payload.get('d', 'next')
+        except (ValueError, KeyError, TypeError):
+            return None, None
+
+    @property
+    def next_cursor(self):
+        """Cursor for the page after this one, or None on the last page"""
+        if not self.has_next or not self._row_keys:
+            return None
+        return self._encode_cursor(self._row_keys[-1], 'next')
+
+    @property
+    def prev_cursor(self):
+        """Cursor for the page before this one, or None on the first page"""
+        if not self.has_prev or not self._row_keys:
+            return None
+        return self._encode_cursor(self._row_keys[0], 'prev')
+
+    @property
+    def total(self):
+        """Total number of matching rows.
+
+        Only computed (with a COUNT query) when something actually asks for
+        it, so listings that don't display a total never pay for the count.
+        """
+        if self._total is None:
+            self._total = self.query.order_by(None).count()
+        return self._total
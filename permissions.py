@@ -1,9 +1,10 @@
 from functools import wraps
 from flask import session, redirect, url_for, flash, request, abort
+import os
 import sqlite3
 import time
-from datetime import datetime
-import json
+
+from audit_log import AuditLogWriter
 
 # Role definitions
 ROLES = {
@@ -65,6 +66,20 @@ MENU_PERMISSIONS = {
     'file_manager': ['Administrator', 'Registry']
 }
 
+# Access audit settings. Successful route accesses are kept at
+# AUDIT_ACCESS_SAMPLE_RATE (1.0 keeps every one); denials are always kept.
+AUDIT_FLUSH_SIZE = int(os.environ.get('AUDIT_FLUSH_SIZE', 50))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 2.0))
+AUDIT_ACCESS_SAMPLE_RATE = float(os.environ.get('AUDIT_ACCESS_SAMPLE_RATE', 0.1))
+
+# Buffers activity_log rows and writes them in batches, see audit_log.py
+audit_log = AuditLogWriter(
+    'app.db',
+    flush_size=AUDIT_FLUSH_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL,
+    sample_rate=AUDIT_ACCESS_SAMPLE_RATE
+)
+
 def get_db_connection():
     """Get a database connection with row factory"""
     conn = sqlite3.connect('app.db')
@@ -72,17 +87,8 @@ def get_db_connection():
     return conn
 
 def log_activity(user_id, action, details, status="success"):
-    """Log user activity to the database"""
-    try:
-        conn = get_db_connection()
-        conn.execute(
-            'INSERT INTO activity_log (user_id, action, details, status, timestamp) VALUES (?, ?, ?, ?, ?)',
-            (user_id, action, json.dumps(details), status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        )
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error logging activity: {e}")
+    """Log user activity to the database (buffered; routine accesses are sampled)"""
+    audit_log.log(user_id, action, details, status)
 
 def check_session_valid():
     """Check if the current session is valid and not expired"""
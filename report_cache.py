@@ -0,0 +1,50 @@
+"""
+Report cache for the KEMRI Document Management System.
+
+Report data is cached per process, keyed by the report's filters and the
+document data version. Because the version is part of the key, a cached
+entry is never served after the documents change; the short TTL only
+bounds how long unused entries are kept.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReportCache:
+    """Thread-safe cache of report data with a time-to-live and a size cap"""
+
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, computing and storing it on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+def report_etag(*parts):
+    """Build an ETag value from the parts that determine a report response"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
@@ -0,0 +1,340 @@
+"""
+Background report jobs for the KEMRI Document Management System.
+
+Large reports are too slow to build inside a request, so they run as jobs:
+a request enqueues a job and gets its id back, a small thread pool builds
+the report into a CSV or PDF file in the results folder, and the client
+polls the job until it can download the file. Job state lives in the
+report_job table, so any worker process can answer polls and downloads.
+Finished results are deleted once they expire.
+
+While a process has jobs queued or running, a heartbeat thread stamps
+their heartbeat_at every few minutes. A job whose heartbeat goes quiet
+belonged to a worker process that was restarted, and is marked failed.
+"""
+
+import csv
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from document_counts import STATUSES
+
+JOBS_TABLE = 'report_job'
+FORMATS = ('csv', 'pdf')
+
+# Rows written between progress updates
+PROGRESS_INTERVAL = 500
+
+
+# Report definitions ---------------------------------------------------------
+
+def _window(params):
+    start = datetime.strptime(params['start'], '%Y-%m-%d').date()
+    end = datetime.strptime(params['end'], '%Y-%m-%d').date()
+    return start, end
+
+
+def _department_throughput(engine, params):
+    """Documents created per sender department and month, from the daily rollup"""
+    start, end = _window(params)
+    bounds = {'start': start.isoformat(), 'end': end.isoformat()}
+    status_columns = ', '.join(
+        f"SUM(CASE WHEN status = '{status}' THEN count ELSE 0 END)" for status in STATUSES
+    )
+    # At most one row per department and month, so read it in one go
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                f"SELECT sender_department, substr(day, 1, 7) AS month, SUM(count), {status_columns} "
+                f"FROM document_daily_stats WHERE day >= :start AND day <= :end "
+                f"GROUP BY sender_department, month ORDER BY sender_department, month"
+            ),
+            bounds
+        ).fetchall()
+    return len(rows), (tuple(row) for row in rows)
+
+
+def _document_register(engine, params, batch_size=1000):
+    """Every document created in the window, oldest first.
+
+    Rows are read in keyset batches, each in its own short read, so a long
+    export never holds a lock that would block document writes.
+    """
+    start, end = _window(params)
+    bounds = {
+        'start': _now(datetime.combine(start, datetime.min.time())),
+        'end': _now(datetime.combine(end + timedelta(days=1), datetime.min.time())),
+    }
+    with engine.connect() as conn:
+        total = conn.execute(
+            text('SELECT COUNT(*) FROM document WHERE created_at >= :start AND created_at < :end'), bounds
+        ).scalar()
+
+    def rows():
+        after = (bounds['start'], 0)
+        while True:
+            with engine.connect() as conn:
+                batch = conn.execute(
+                    text(
+                        "SELECT code, title, sender, recipient, status, priority, "
+                        "date(date_received), date(created_at), created_at, id FROM document "
+                        "WHERE (created_at, id) > (:after_created, :after_id) AND created_at < :end "
+                        "ORDER BY created_at, id LIMIT :limit"
+                    ),
+                    {'after_created': after[0], 'after_id': after[1], 'end': bounds['end'], 'limit': batch_size}
+                ).fetchall()
+            for row in batch:
+                yield tuple(row[:8])
+            if len(batch) < batch_size:
+                return
+            after = (batch[-1][8], batch[-1][9])
+
+    return total, rows()
+
+
+# report type -> (title, column headings, row source)
+REPORTS = {
+    'department-throughput': (
+        'Department Throughput',
+        ['Sender Department', 'Month', 'Total'] + STATUSES,
+        _department_throughput,
+    ),
+    'document-register': (
+        'Document Register',
+        ['Code', 'Title', 'Sender', 'Recipient', 'Status', 'Priority', 'Date Received', 'Created'],
+        _document_register,
+    ),
+}
+
+
+# Writers --------------------------------------------------------------------
+
+def _write_csv(path, title, columns, rows, progress):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for n, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if n % PROGRESS_INTERVAL == 0:
+                progress(n)
+
+
+def _write_pdf(path, title, columns, rows, progress):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    data = [columns]
+    for n, row in enumerate(rows, 1):
+        data.append(['' if value is None else str(value) for value in row])
+        if n % PROGRESS_INTERVAL == 0:
+            progress(n)
+
+    styles = getSampleStyleSheet()
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F5F5')]),
+    ]))
+    doc = SimpleDocTemplate(path, pagesize=landscape(A4), title=title)
+    doc.build([
+        Paragraph(f'KEMRI {title}', styles['Title']),
+        Paragraph(f'Generated {datetime.utcnow().strftime("%d %b %Y, %H:%M")} UTC', styles['Normal']),
+        Spacer(1, 12),
+        table,
+    ])
+
+
+WRITERS = {'csv': _write_csv, 'pdf': _write_pdf}
+
+
+# Queue ----------------------------------------------------------------------
+
+class ReportJobQueue:
+    """Runs report jobs on a thread pool and tracks them in the report_job table"""
+
+    def __init__(self, engine, results_dir, max_workers=2, result_ttl=timedelta(hours=24),
+                 stale_after=timedelta(hours=1)):
+        self.engine = engine
+        self.results_dir = results_dir
+        self.result_ttl = result_ttl
+        self.stale_after = stale_after
+        self.heartbeat_interval = stale_after.total_seconds() / 4
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-job')
+        self._active = set()  # Ids of the jobs this process has queued or is running
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._closed = threading.Event()
+        os.makedirs(results_dir, exist_ok=True)
+
+        # Job tables created before heartbeats gain the column here
+        try:
+            with engine.begin() as conn:
+                if 'heartbeat_at' not in _job_columns(conn):
+                    conn.execute(text(f'ALTER TABLE {JOBS_TABLE} ADD COLUMN heartbeat_at DATETIME'))
+        except OperationalError:
+            # Another process starting at the same time may have added it first
+            with engine.connect() as conn:
+                if 'heartbeat_at' not in _job_columns(conn):
+                    raise
+
+    def enqueue(self, report_type, params, fmt='csv', user=None):
+        """Queue a report and return its job id.
+
+        Raises ValueError for an unknown report type or format.
+        """
+        if report_type not in REPORTS:
+            raise ValueError(f'Unknown report type: {report_type}')
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown format: {fmt}')
+        try:
+            _window(params)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('start and end dates (YYYY-MM-DD) are required')
+
+        self.purge_expired()
+
+        job_id = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f'INSERT INTO {JOBS_TABLE} (id, report_type, format, params, status, progress, '
+                    f'total, created_by, created_at, heartbeat_at) VALUES (:id, :report_type, :format, '
+                    f":params, 'queued', 0, NULL, :user, :now, :now)"
+                ),
+                {
+                    'id': job_id, 'report_type': report_type, 'format': fmt,
+                    'params': json.dumps(params), 'user': user, 'now': _now(),
+                }
+            )
+        with self._lock:
+            self._active.add(job_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name='report-job-heartbeat', daemon=True)
+                self._heartbeat.start()
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def close(self):
+        """Stop the heartbeat and wait for the running jobs to finish"""
+        self._closed.set()
+        self._executor.shutdown(wait=True)
+
+    def _beat(self):
+        while not self._closed.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._active)
+            if not job_ids:
+                continue
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        text(f'UPDATE {JOBS_TABLE} SET heartbeat_at = :now WHERE id = :id'),
+                        [{'now': _now(), 'id': job_id} for job_id in job_ids]
+                    )
+            except Exception as e:
+                print(f"Error recording report job heartbeat: {str(e)}")
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if there is no such job"""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text(f'SELECT * FROM {JOBS_TABLE} WHERE id = :id'), {'id': job_id}
+            ).mappings().first()
+        return dict(row) if row else None
+
+    def result_path(self, job):
+        """Absolute path of a finished job's result file"""
+        return os.path.join(self.results_dir, job['result_file'])
+
+    def purge_expired(self):
+        """Delete expired result files and their jobs.
+
+        Unfinished jobs without a heartbeat for stale_after (their worker
+        process was restarted) are marked as failed so clients stop
+        waiting for them.
+        """
+        now = datetime.utcnow()
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"UPDATE {JOBS_TABLE} SET status = 'failed', error = 'Interrupted', "
+                    f"finished_at = :now, expires_at = :expires "
+                    f"WHERE status IN ('queued', 'running') AND COALESCE(heartbeat_at, created_at) < :stale"
+                ),
+                {'now': _now(now), 'expires': _now(now + self.result_ttl), 'stale': _now(now - self.stale_after)}
+            )
+            expired = conn.execute(
+                text(f'DELETE FROM {JOBS_TABLE} WHERE expires_at < :now RETURNING result_file'),
+                {'now': _now(now)}
+            ).fetchall()
+        for (result_file,) in expired:
+            if result_file:
+                try:
+                    os.remove(os.path.join(self.results_dir, result_file))
+                except OSError:
+                    pass
+        return len(expired)
+
+    def _update(self, job_id, **values):
+        assignments = ', '.join(f'{column} = :{column}' for column in values)
+        with self.engine.begin() as conn:
+            conn.execute(text(f'UPDATE {JOBS_TABLE} SET {assignments} WHERE id = :id'), dict(values, id=job_id))
+
+    def _run(self, job_id):
+        try:
+            self._build(job_id)
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _build(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return
+        title, columns, source = REPORTS[job['report_type']]
+        result_file = f"{job['report_type']}-{job_id}.{job['format']}"
+        path = os.path.join(self.results_dir, result_file)
+
+        started = _now()
+        self._update(job_id, status='running', started_at=started, heartbeat_at=started)
+        try:
+            total, rows = source(self.engine, json.loads(job['params']))
+            self._update(job_id, total=total)
+            WRITERS[job['format']](
+                path, title, columns, rows, lambda n: self._update(job_id, progress=n)
+            )
+            finished = datetime.utcnow()
+            self._update(
+                job_id, status='done', progress=total, result_file=result_file,
+                finished_at=_now(finished), expires_at=_now(finished + self.result_ttl)
+            )
+        except Exception as e:
+            print(f"Report job {job_id} failed: {str(e)}")
+            if os.path.exists(path):
+                os.remove(path)
+            finished = datetime.utcnow()
+            self._update(
+                job_id, status='failed', error=str(e),
+                finished_at=_now(finished), expires_at=_now(finished + self.result_ttl)
+            )
+
+
+def _now(value=None):
+    # Same text format SQLAlchemy uses for DateTime columns on SQLite
+    return (value or datetime.utcnow()).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _job_columns(conn):
+    return [row[1] for row in conn.execute(text(f'PRAGMA table_info({JOBS_TABLE})'))]
@@ -0,0 +1,271 @@
+"""
+In-memory report snapshot for the KEMRI Document Management System.
+
+Slicing documents on the reports page (status x priority x department x
+week) would otherwise cost a grouped query per click. ReportSnapshot keeps
+a columnar copy of the document_daily_stats rollup in memory instead: one
+compact array per column, with statuses, priorities and departments stored
+as small integer codes and days as days since 1970-01-01. Filters and
+groupings walk those arrays without touching the database.
+
+The snapshot refreshes at most every refresh_interval seconds, reading only
+the rollup rows whose updated_at is past its watermark, and reloads in full
+every full_refresh_interval seconds.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import compress, repeat
+
+from sqlalchemy import text
+
+from daily_stats import DAILY_STATS_TABLE
+
+EPOCH = date(1970, 1, 1)
+TIME_DIMENSIONS = ('day', 'week', 'month')
+DIMENSIONS = ('status', 'priority', 'department') + TIME_DIMENSIONS
+
+# Rows stamped by the triggers this long before their transaction committed
+# are still picked up by the next incremental refresh
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+
+def epoch_day(value):
+    """Days since 1970-01-01"""
+    return (value - EPOCH).days
+
+
+def _selector(column, mask, first, last):
+    """One byte per row from first to last: 1 where the row's code is selected"""
+    if column.itemsize == 1:
+        table = bytes(mask) + bytes(256 - len(mask))
+        return column[first:last].tobytes().translate(table)
+    return bytes(map(mask.__getitem__, column[first:last]))
+
+
+def _both(left, right):
+    # Row-wise AND of two selectors, done as one big integer operation
+    return (int.from_bytes(left, 'little') & int.from_bytes(right, 'little')).to_bytes(len(left), 'little')
+
+
+def _group_value(dimension, code):
+    if dimension == 'month':
+        return date(1970 + code // 12, code % 12 + 1, 1)
+    return EPOCH + timedelta(days=code)
+
+
+class _Codes:
+    """Interns category labels as small integer codes"""
+
+    def __init__(self):
+        self.labels = []
+        self._codes = {}
+
+    def code(self, label):
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def mask(self, labels):
+        """Which codes are selected, indexed by code (None selects every code)"""
+        if labels is None:
+            return None
+        wanted = set(labels)
+        return [label in wanted for label in self.labels]
+
+
+class _Columns:
+    """One array per column, plus where each rollup row is stored.
+
+    Rows from a full load are sorted by day, so a date window is a slice
+    found by bisection; rows first seen by incremental refreshes are
+    appended after sorted_length until the next full load.
+    """
+
+    def __init__(self):
+        self.day = array('i')
+        self.week = array('i')  # Epoch day of the Monday starting the week
+        self.month = array('i')  # Months since January 1970
+        # Codes are stored one byte each until a column has more than 256 labels
+        self.status = array('B')
+        self.priority = array('B')
+        self.department = array('B')
+        self.count = array('q')
+        self.codes = {'status': _Codes(), 'priority': _Codes(), 'department': _Codes()}
+        self.positions = {}
+        self.sorted_length = 0
+        self._days = {}
+
+    def set(self, day, status, priority, department, count):
+        parsed = self._days.get(day)
+        if parsed is None:
+            value = date.fromisoformat(day)
+            parsed = self._days[day] = (
+                epoch_day(value),
+                epoch_day(value - timedelta(days=value.weekday())),
+                (value.year - 1970) * 12 + value.month - 1,
+            )
+        key = (
+            parsed[0],
+            self.codes['status'].code(status),
+            self.codes['priority'].code(priority),
+            self.codes['department'].code(department),
+        )
+        position = self.positions.get(key)
+        if position is not None:
+            self.count[position] = count
+            return
+        self.positions[key] = len(self.count)
+        self.day.append(parsed[0])
+        self.week.append(parsed[1])
+        self.month.append(parsed[2])
+        for name, code in zip(('status', 'priority', 'department'), key[1:]):
+            column = getattr(self, name)
+            if code > 255 and column.typecode == 'B':
+                column = array('I', column)
+                setattr(self, name, column)
+            column.append(code)
+        self.count.append(count)
+
+
+class ReportSnapshot:
+    """Columnar in-memory copy of the daily rollup for interactive slicing"""
+
+    def __init__(self, refresh_interval=15, full_refresh_interval=600):
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._columns = _Columns()
+        self._watermark = None
+        self._next_refresh = 0
+        self._next_full_refresh = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def current(self, engine):
+        """Return the snapshot, refreshing it first if a refresh is due.
+
+        Only the first load makes callers wait; while one thread refreshes a
+        loaded snapshot, the others keep reading the previous data.
+        """
+        if time.monotonic() < self._next_refresh:
+            return self
+        if self._refresh_lock.acquire(blocking=self._watermark is None):
+            try:
+                now = time.monotonic()
+                if now >= self._next_refresh:
+                    self.refresh(engine, full=now >= self._next_full_refresh)
+            finally:
+                self._refresh_lock.release()
+        return self
+
+    def refresh(self, engine, full=False):
+        """Load rollup rows changed since the last refresh, or every row.
+
+        Returns the number of rows read.
+        """
+        full = full or self._watermark is None
+        started = datetime.utcnow()
+        query = (
+            f"SELECT day, status, priority, sender_department, count FROM {DAILY_STATS_TABLE} "
+            f"WHERE day != ''"
+        )
+        params = {}
+        if not full:
+            query += ' AND updated_at >= :since'
+            params['since'] = (self._watermark - WATERMARK_OVERLAP).strftime('%Y-%m-%d %H:%M:%S.%f')[:23]
+        with engine.connect() as conn:
+            rows = conn.execute(text(query + ' ORDER BY day'), params).fetchall()
+
+        if full:
+            columns = _Columns()
+            for row in rows:
+                columns.set(*row)
+            columns.sorted_length = len(columns.count)
+            with self._lock:
+                self._columns = columns
+            self._next_full_refresh = time.monotonic() + self.full_refresh_interval
+        else:
+            with self._lock:
+                for row in rows:
+                    self._columns.set(*row)
+
+        self._watermark = started
+        self._next_refresh = time.monotonic() + self.refresh_interval
+        return len(rows)
+
+    def labels(self, dimension):
+        """Every status, priority or department label seen so far"""
+        with self._lock:
+            return sorted(self._columns.codes[dimension].labels)
+
+    def count(self, start=None, end=None, statuses=None, priorities=None, departments=None,
+              group_by=('week',)):
+        """Count documents created from start to end, grouped by the given dimensions.
+
+        Filters are lists of labels (None matches everything). Returns a dict
+        of {tuple of group values: count}; days, weeks and months are dates.
+        """
+        unknown = [dimension for dimension in group_by if dimension not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension: {unknown[0]}")
+
+        low = epoch_day(start) if start else -2 ** 31
+        high = epoch_day(end) if end else 2 ** 31 - 1
+
+        totals = defaultdict(int)
+        with self._lock:
+            columns = self._columns
+            masks = [
+                (getattr(columns, dimension), columns.codes[dimension].mask(labels))
+                for dimension, labels in (('status', statuses), ('priority', priorities), ('department', departments))
+                if labels is not None
+            ]
+            group_columns = [getattr(columns, dimension) for dimension in group_by]
+            sorted_length = columns.sorted_length
+            spans = [
+                (bisect_left(columns.day, low, 0, sorted_length), bisect_right(columns.day, high, 0, sorted_length), None),
+                (sorted_length, len(columns.count), (low, high)),
+            ]
+            for first, last, window in spans:
+                if first >= last:
+                    continue
+                # Build a selector from the filter masks and apply it to the
+                # group keys and counts, without a Python-level loop
+                selector = None
+                if window:
+                    selector = bytes(window[0] <= day <= window[1] for day in columns.day[first:last])
+                for column, mask in masks:
+                    picked = _selector(column, mask, first, last)
+                    selector = picked if selector is None else _both(selector, picked)
+                if not group_columns:
+                    keys = repeat((), last - first)
+                elif len(group_columns) == 1:
+                    keys = group_columns[0][first:last]
+                else:
+                    keys = zip(*[column[first:last] for column in group_columns])
+                counts = columns.count[first:last]
+                if selector is not None:
+                    keys, counts = compress(keys, selector), compress(counts, selector)
+                for key, count in zip(keys, counts):
+                    totals[key] += count
+            labels = {dimension: columns.codes[dimension].labels for dimension in columns.codes}
+
+        # Translate codes back to labels and dates
+        result = {}
+        for codes, count in totals.items():
+            if not count:
+                continue
+            if len(group_by) == 1:
+                codes = (codes,)
+            group = tuple(
+                _group_value(dimension, code) if dimension in TIME_DIMENSIONS else labels[dimension][code]
+                for dimension, code in zip(group_by, codes)
+            )
+            result[group] = count
+        return result
@@ -0,0 +1,57 @@
+"""
+Maintain the document_daily_stats report rollup from the command line.
+
+    python rollup_daily_stats.py backfill [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+        Recompute the rollup for a range of days (all days by default).
+
+    python rollup_daily_stats.py close [--day YYYY-MM-DD]
+        Close out a finished day (yesterday by default) by reconciling its
+        rollup rows with the documents. Run nightly from cron.
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+from app import app, db
+from daily_stats import rebuild_daily_stats, close_out_day
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def print_drift(drift):
+    if not drift:
+        print("No drift found.")
+        return
+    print(f"Corrected {len(drift)} rollup row(s):")
+    for day, status, priority, sender_department, stored, actual in drift:
+        print(f"  {day or '(undated)'} {status}/{priority}/{sender_department}: {stored} -> {actual}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the document_daily_stats rollup')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill', help='recompute the rollup for a range of days')
+    backfill.add_argument('--start', type=parse_day, help='first day to rebuild (default: earliest)')
+    backfill.add_argument('--end', type=parse_day, help='last day to rebuild (default: latest)')
+
+    close = commands.add_parser('close', help='reconcile a finished day')
+    close.add_argument('--day', type=parse_day, help='day to close out (default: yesterday)')
+
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'backfill':
+            print(f"Rebuilding daily stats from {args.start or 'the beginning'} to {args.end or 'today'}...")
+            drift = rebuild_daily_stats(db.engine, args.start, args.end)
+        else:
+            day = args.day or (datetime.utcnow().date() - timedelta(days=1))
+            print(f"Closing out daily stats for {day}...")
+            drift = close_out_day(db.engine, day)
+        print_drift(drift)
+
+
+if __name__ == "__main__":
+    main()
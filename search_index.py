@@ -0,0 +1,126 @@
+"""
+Full-text search index for the KEMRI Document Management System.
+
+Maintains an SQLite FTS5 shadow table over the searchable Document columns.
+The table uses the document table as external content, so only the index is
+stored, and triggers keep it in sync on insert, update and delete.
+"""
+
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+FTS_TABLE = 'document_fts'
+
+# Columns indexed by FTS5, in index order (used by snippet() column numbers)
+FTS_COLUMNS = ['code', 'title', 'sender', 'recipient', 'details', 'required_action']
+
+# Control characters used as highlight markers so that snippets can be
+# HTML-escaped before the <mark> tags are put back in
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_fts_ai AFTER INSERT ON document BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_fts_ad AFTER DELETE ON document BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS document_fts_au AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON document BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(FTS_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in FTS_COLUMNS)});
+        INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in FTS_COLUMNS)});
+    END
+    """,
+]
+
+
+def setup_document_fts(engine):
+    """Create the FTS5 index and sync triggers if needed.
+
+    Returns True when the index is usable, False when this SQLite build has
+    no FTS5 support (callers should then fall back to LIKE searches).
+    """
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first() is not None
+
+            if not exists:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"{', '.join(FTS_COLUMNS)}, "
+                    f"content='document', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2')"
+                ))
+
+            for trigger in _TRIGGERS:
+                conn.execute(text(trigger))
+
+            if not exists:
+                # Index any documents that existed before the FTS table
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        return True
+    except Exception as e:
+        print(f"Full-text search unavailable, falling back to LIKE: {str(e)}")
+        return False
+
+
+def rebuild_document_fts(engine):
+    """Rebuild the FTS index from the document table and optimize it"""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+
+def build_match_query(search_query):
+    """Turn free-text user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS5 operators in user input are treated as
+    plain text) and prefix-matched, so partially typed words still match.
+    Returns None if the input contains no searchable terms.
+    """
+    terms = re.findall(r'\w+', search_query or '', flags=re.UNICODE)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def get_snippets(session, match_query, doc_ids, tokens=12):
+    """Return {document_id: Markup snippet} with matches wrapped in <mark>"""
+    if not match_query or not doc_ids:
+        return {}
+
+    id_params = {f'id_{i}': doc_id for i, doc_id in enumerate(doc_ids)}
+    rows = session.execute(
+        text(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, :mark_start, :mark_end, '…', :tokens) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+            f"AND rowid IN ({', '.join(':' + key for key in id_params)})"
+        ),
+        {
+            'mark_start': _MARK_START,
+            'mark_end': _MARK_END,
+            'tokens': tokens,
+            'match': match_query,
+            **id_params
+        }
+    ).fetchall()
+
+    snippets = {}
+    for rowid, snippet in rows:
+        if snippet:
+            html = str(escape(snippet)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+            snippets[rowid] = Markup(html)
+    return snippets
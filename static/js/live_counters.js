@@ -0,0 +1,100 @@
+/**
+ * Live document counters over Server-Sent Events (/events/counters).
+ *
+ * Elements marked with data-live-count="status:Pending priority:Urgent"
+ * show the sum of the listed counts ("total" is every document). Each
+ * response is one short poll: a snapshot event sets the counts when they
+ * changed, urgent arrivals are announced in #live-notices, and new log
+ * entries are added to any [data-live-log] list. EventSource polls again
+ * on its own after the server's retry interval, sending back the cursor
+ * it was given.
+ */
+(function () {
+    if (!window.EventSource || !document.querySelector('[data-live-count], [data-live-log]')) {
+        return;
+    }
+
+    const counts = { total: 0, status: {}, priority: {} };
+
+    function value(key) {
+        if (key === 'total') {
+            return counts.total;
+        }
+        const parts = key.split(':');
+        return (counts[parts[0]] || {})[parts[1]] || 0;
+    }
+
+    function render() {
+        document.querySelectorAll('[data-live-count]').forEach(function (element) {
+            const keys = element.getAttribute('data-live-count').split(/\s+/);
+            element.textContent = keys.reduce(function (sum, key) { return sum + value(key); }, 0);
+        });
+    }
+
+    function notice(message) {
+        let container = document.getElementById('live-notices');
+        if (!container) {
+            container = document.createElement('div');
+            container.id = 'live-notices';
+            container.style.cssText = 'position: fixed; top: 1rem; right: 1rem; z-index: 1080; max-width: 22rem;';
+            document.body.appendChild(container);
+        }
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-danger alert-dismissible shadow-sm';
+        alert.setAttribute('role', 'alert');
+        alert.textContent = message;
+        const close = document.createElement('button');
+        close.type = 'button';
+        close.className = 'close';
+        close.innerHTML = '&times;';
+        close.addEventListener('click', function () { alert.remove(); });
+        alert.appendChild(close);
+        container.prepend(alert);
+        setTimeout(function () { alert.remove(); }, 15000);
+    }
+
+    function connect() {
+        const source = new EventSource('/events/counters');
+        listen(source);
+        source.addEventListener('error', function () {
+            // A refused poll (503) closes the source; try again later
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, 60000);
+            }
+        });
+    }
+
+    function listen(source) {
+        source.addEventListener('snapshot', function (event) {
+            const data = JSON.parse(event.data);
+            counts.total = data.total;
+            counts.status = data.status;
+            counts.priority = data.priority;
+            render();
+        });
+
+        source.addEventListener('urgent', function (event) {
+            JSON.parse(event.data).forEach(function (doc) {
+                notice('New urgent document ' + doc.code + ': ' + doc.title + ' (from ' + doc.sender + ')');
+            });
+        });
+
+        source.addEventListener('log', function (event) {
+            const entries = JSON.parse(event.data);
+            document.querySelectorAll('[data-live-log]').forEach(function (list) {
+                const limit = parseInt(list.getAttribute('data-live-log'), 10) || 10;
+                entries.forEach(function (entry) {
+                    const item = document.createElement('li');
+                    item.className = 'list-group-item small';
+                    item.textContent = entry.timestamp.slice(0, 16) + ' ' + entry.user + ': ' + entry.action;
+                    list.prepend(item);
+                });
+                while (list.children.length > limit) {
+                    list.lastElementChild.remove();
+                }
+            });
+        });
+    }
+
+    connect();
+})();
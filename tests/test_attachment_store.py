@@ -0,0 +1,155 @@
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+from datetime import timedelta
+
+from sqlalchemy import create_engine, event, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attachment_store import AttachmentStore, setup_attachment_blobs, rebuild_attachment_blobs
+
+MEMO = b'Circular: staff meeting on Friday\n' * 1000
+
+SCHEMA = [
+    # Attachment table as it was before the store, without sha256
+    'CREATE TABLE document_attachment (id INTEGER PRIMARY KEY, document_id INTEGER NOT NULL, '
+    'filename VARCHAR(255) NOT NULL, original_filename VARCHAR(255) NOT NULL, '
+    'file_type VARCHAR(50) NOT NULL, file_size INTEGER NOT NULL, uploaded_at DATETIME)',
+    'CREATE TABLE attachment_blob (digest VARCHAR(64) PRIMARY KEY, size INTEGER NOT NULL, '
+    'ref_count INTEGER NOT NULL DEFAULT 0, released_at VARCHAR(23))',
+]
+
+class AttachmentStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = AttachmentStore(os.path.join(self.tmp.name, 'blobs'), chunk_size=4096)
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+        setup_attachment_blobs(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def attach(self, document_id, content):
+        digest, size, _ = self.store.put(io.BytesIO(content))
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    'INSERT INTO document_attachment (document_id, filename, original_filename, file_type, file_size, sha256) '
+                    "VALUES (:document_id, 'memo.pdf', 'memo.pdf', 'pdf', :size, :digest)"
+                ),
+                {'document_id': document_id, 'size': size, 'digest': digest}
+            )
+        return digest
+
+    def ref_count(self, digest):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text('SELECT ref_count FROM attachment_blob WHERE digest = :digest'), {'digest': digest}
+            ).scalar()
+
+    def blob_files(self):
+        return sorted(
+            name for folder in os.listdir(self.store.root) if folder != 'tmp'
+            for name in os.listdir(os.path.join(self.store.root, folder))
+        )
+
+    def age(self, path, seconds=7200):
+        past = time.time() - seconds
+        os.utime(path, (past, past))
+
+    def test_put_hashes_and_deduplicates(self):
+        """Identical content is stored once under its SHA-256 digest"""
+        digest, size, stored = self.store.put(io.BytesIO(MEMO))
+        self.assertEqual(digest, hashlib.sha256(MEMO).hexdigest())
+        self.assertEqual(size, len(MEMO))
+        self.assertTrue(stored)
+
+        self.assertEqual(self.store.put(io.BytesIO(MEMO)), (digest, size, False))
+        self.assertEqual(self.blob_files(), [digest])
+        self.assertEqual(os.listdir(self.store.temp_folder), [])
+        with open(self.store.path(digest), 'rb') as blob:
+            self.assertEqual(blob.read(), MEMO)
+
+    def test_triggers_count_references(self):
+        """Inserting, deleting and repointing attachments keeps the reference counts exact"""
+        digest = self.attach(1, MEMO)
+        self.attach(2, MEMO)
+        other = self.attach(3, b'Another letter')
+        self.assertEqual(self.ref_count(digest), 2)
+
+        with self.engine.begin() as conn:
+            conn.execute(text('DELETE FROM document_attachment WHERE document_id = 1'))
+            conn.execute(text('UPDATE document_attachment SET sha256 = :digest WHERE document_id = 3'), {'digest': digest})
+        self.assertEqual(self.ref_count(digest), 2)
+        self.assertEqual(self.ref_count(other), 0)
+        self.assertEqual(rebuild_attachment_blobs(self.engine), [])
+
+    def test_rebuild_reports_drift(self):
+        """rebuild_attachment_blobs corrects counts that disagree with the attachments"""
+        digest = self.attach(1, MEMO)
+        with self.engine.begin() as conn:
+            conn.execute(text('UPDATE attachment_blob SET ref_count = 5'))
+        self.assertEqual(rebuild_attachment_blobs(self.engine), [(digest, 5, 1)])
+        self.assertEqual(self.ref_count(digest), 1)
+
+    def test_collect_garbage_after_grace(self):
+        """Unreferenced blobs are deleted only once the grace period has passed"""
+        kept = self.attach(1, MEMO)
+        released = self.attach(2, b'Withdrawn memo')
+        orphan, _, _ = self.store.put(io.BytesIO(b'Upload that was rolled back'))
+        with self.engine.begin() as conn:
+            conn.execute(text('DELETE FROM document_attachment WHERE document_id = 2'))
+
+        self.assertEqual(self.store.collect_garbage(self.engine, timedelta(hours=1)), (0, 0))
+
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE attachment_blob SET released_at = '2000-01-01 00:00:00.000'"))
+        for digest in (kept, released, orphan):
+            self.age(self.store.path(digest))
+        stale = os.path.join(self.store.temp_folder, 'crashed.part')
+        open(stale, 'wb').close()
+        self.age(stale)
+
+        removed, freed = self.store.collect_garbage(self.engine, timedelta(hours=1))
+        self.assertEqual(removed, 2)
+        self.assertEqual(freed, len(b'Withdrawn memo') + len(b'Upload that was rolled back'))
+        self.assertEqual(self.blob_files(), [kept])
+        self.assertFalse(os.path.exists(stale))
+        self.assertIsNone(self.ref_count(released))
+
+    def test_concurrent_setup_adds_sha256_once(self):
+        """A process that loses the race to add sha256 sets up normally"""
+        path = os.path.join(self.tmp.name, 'old.db')
+        engine = create_engine(f'sqlite:///{path}')
+        with engine.begin() as conn:
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+
+        def other_process_first(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('ALTER TABLE document_attachment'):
+                other = sqlite3.connect(path)
+                other.execute('ALTER TABLE document_attachment ADD COLUMN sha256 VARCHAR(64)')
+                other.commit()
+                other.close()
+        event.listen(engine, 'before_cursor_execute', other_process_first)
+
+        setup_attachment_blobs(engine)
+        with engine.connect() as conn:
+            columns = [row[1] for row in conn.execute(text('PRAGMA table_info(document_attachment)'))]
+        engine.dispose()
+        self.assertEqual(columns.count('sha256'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
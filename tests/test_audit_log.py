@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit_log import AuditLogWriter
+
+class AuditLogWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp.name, 'app.db')
+        conn = sqlite3.connect(self.database)
+        conn.execute('''
+            CREATE TABLE activity_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                details TEXT,
+                status TEXT DEFAULT 'success',
+                timestamp TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def writer(self, **options):
+        # A long flush interval keeps timed flushes out of the way unless a test wants them
+        options.setdefault('flush_interval', 3600)
+        writer = AuditLogWriter(self.database, **options)
+        self.addCleanup(writer.close)
+        return writer
+
+    def logged(self):
+        conn = sqlite3.connect(self.database)
+        rows = conn.execute('SELECT user_id, action, details, status FROM activity_log ORDER BY id').fetchall()
+        conn.close()
+        return rows
+
+    def test_rows_are_buffered(self):
+        """Rows wait in memory until a flush writes them together"""
+        writer = self.writer()
+        writer.log(1, 'login', {'ip': '127.0.0.1'})
+        writer.log(1, 'add_user', {'username': 'jdoe'})
+        self.assertEqual(self.logged(), [])
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual([row[1] for row in self.logged()], ['login', 'add_user'])
+
+    def test_routine_access_is_sampled(self):
+        """Sampled-out accesses are dropped, but denials and other actions are kept"""
+        writer = self.writer(sample_rate=0)
+        writer.log(1, 'access_route', {'route': '/reports'})
+        writer.log(2, 'unauthorized_access_attempt', {'route': '/maintenance'}, 'error')
+        writer.log(1, 'add_user', {'username': 'jdoe'})
+        writer.flush()
+        self.assertEqual([row[1] for row in self.logged()], ['unauthorized_access_attempt', 'add_user'])
+        self.assertEqual(writer.sampled_out, 1)
+
+    def test_kept_samples_record_rate(self):
+        """Sampled rows carry the rate they were kept at"""
+        writer = self.writer(sample_rate=0.999999)
+        writer.log(1, 'access_route', {'route': '/reports'})
+        writer.flush()
+        details = json.loads(self.logged()[0][2])
+        self.assertEqual(details, {'route': '/reports', 'sample_rate': 0.999999})
+
+    def test_flush_by_size(self):
+        """Reaching flush_size wakes the writer thread without waiting for the interval"""
+        writer = self.writer(flush_size=2)
+        writer.log(1, 'login', {})
+        writer.log(1, 'logout', {})
+        for _ in range(50):
+            if len(self.logged()) == 2:
+                break
+            time.sleep(0.02)
+        self.assertEqual(len(self.logged()), 2)
+        self.assertEqual(writer.pending, 0)
+
+    def test_bad_row_does_not_lose_batch(self):
+        """A row the table rejects is skipped and the rest of the batch is written"""
+        writer = self.writer()
+        writer.log(None, 'unauthorized_access_attempt', {'route': '/maintenance'}, 'error')
+        writer.log(1, 'login', {})
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual([row[1] for row in self.logged()], ['login'])
+
+    def test_close_writes_buffer(self):
+        """Closing writes what is buffered, and later rows are written straight away"""
+        writer = self.writer()
+        writer.log(1, 'login', {})
+        writer.close()
+        self.assertEqual(len(self.logged()), 1)
+        writer.log(1, 'logout', {})
+        self.assertEqual(len(self.logged()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
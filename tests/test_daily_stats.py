@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_stats import setup_daily_stats, rebuild_daily_stats, load_daily_counts, load_daily_activity
+
+# The rollup as it was before rows were timestamped, without updated_at
+SCHEMA = [
+    'CREATE TABLE document (id INTEGER PRIMARY KEY, status TEXT, priority TEXT, sender TEXT, created_at DATETIME)',
+    'CREATE TABLE document_daily_stats (day TEXT, status TEXT, priority TEXT, sender_department TEXT, '
+    'count INTEGER NOT NULL, PRIMARY KEY (day, status, priority, sender_department)) WITHOUT ROWID',
+]
+
+class DailyStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+            conn.execute(text(
+                "INSERT INTO document (status, priority, sender, created_at) VALUES "
+                "('Incoming', 'Urgent', 'HR', '2025-03-01 08:00:00.000000'), "
+                "('Incoming', 'Normal', 'HR', '2025-03-01 17:30:00.000000'), "
+                "('Outgoing', 'Urgent', 'Finance', '2025-03-10 09:00:00.000000')"
+            ))
+        setup_daily_stats(self.engine)
+
+    def rollup(self):
+        with self.engine.connect() as conn:
+            return conn.execute(text(
+                'SELECT day, status, priority, sender_department, count FROM document_daily_stats '
+                'WHERE count != 0 ORDER BY 1, 2, 3, 4'
+            )).fetchall()
+
+    def test_initial_backfill(self):
+        """Existing documents are rolled up per day when the rollup is set up"""
+        self.assertEqual(self.rollup(), [
+            ('2025-03-01', 'Incoming', 'Normal', 'HR', 1),
+            ('2025-03-01', 'Incoming', 'Urgent', 'HR', 1),
+            ('2025-03-10', 'Outgoing', 'Urgent', 'Finance', 1),
+        ])
+
+    def test_triggers_track_writes(self):
+        """Inserts, updates and deletes keep the rollup exact"""
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO document (status, priority, sender, created_at) "
+                "VALUES ('Pending', 'Priority', 'HR', '2025-03-10 12:00:00.000000')"
+            ))
+            conn.execute(text("UPDATE document SET status = 'Received' WHERE id = 1"))
+            conn.execute(text("UPDATE document SET sender = 'Research' WHERE id = 2"))
+            conn.execute(text('DELETE FROM document WHERE id = 3'))
+        expected = self.rollup()
+        self.assertEqual(rebuild_daily_stats(self.engine), [])
+        self.assertEqual(self.rollup(), expected)
+
+    def test_close_out_repairs_one_day(self):
+        """Rebuilding a day range only touches those days and reports drift"""
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE document_daily_stats SET count = 4 WHERE day = '2025-03-01' AND priority = 'Urgent'"))
+            conn.execute(text("UPDATE document_daily_stats SET count = 9 WHERE day = '2025-03-10'"))
+        drift = rebuild_daily_stats(self.engine, date(2025, 3, 1), date(2025, 3, 1))
+        self.assertEqual(drift, [('2025-03-01', 'Incoming', 'Urgent', 'HR', 4, 1)])
+        self.assertIn(('2025-03-10', 'Outgoing', 'Urgent', 'Finance', 9), self.rollup())
+
+    def test_reads(self):
+        """Counts and activity come from the rollup for the requested days"""
+        with Session(self.engine) as session:
+            counts = load_daily_counts(session, date(2025, 3, 1), date(2025, 3, 9))
+            activity = load_daily_activity(session, date(2025, 2, 20), date(2025, 3, 12), 'week')
+        self.assertEqual(counts.by_status(['Incoming', 'Outgoing']), {'Incoming': 2, 'Outgoing': 0})
+        self.assertEqual(activity, [
+            (date(2025, 2, 17), 0), (date(2025, 2, 24), 2), (date(2025, 3, 3), 0), (date(2025, 3, 10), 1)
+        ])
+
+    def test_concurrent_setup_adds_updated_at_once(self):
+        """A process that loses the race to add updated_at sets up normally"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'old.db')
+            engine = create_engine(f'sqlite:///{path}')
+            with engine.begin() as conn:
+                for statement in SCHEMA:
+                    conn.execute(text(statement))
+
+            def other_process_first(conn, cursor, statement, parameters, context, executemany):
+                if statement.startswith('ALTER TABLE document_daily_stats'):
+                    other = sqlite3.connect(path)
+                    other.execute('ALTER TABLE document_daily_stats ADD COLUMN updated_at TEXT')
+                    other.commit()
+                    other.close()
+            event.listen(engine, 'before_cursor_execute', other_process_first)
+
+            setup_daily_stats(engine)
+            with engine.connect() as conn:
+                columns = [row[1] for row in conn.execute(text('PRAGMA table_info(document_daily_stats)'))]
+            engine.dispose()
+        self.assertEqual(columns.count('updated_at'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
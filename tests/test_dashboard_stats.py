@@ -0,0 +1,142 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard_stats import StatsCache, PENDING_STATUS
+from user_names import user_names
+
+class StatsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'app.db')
+        now = datetime.now()
+        old = (now - timedelta(days=5)).strftime('%Y-%m-%d %H:%M:%S')
+        conn = self.connect()
+        conn.executescript('''
+            CREATE TABLE user (id INTEGER PRIMARY KEY, username TEXT, is_active BOOLEAN DEFAULT 1);
+            CREATE TABLE document (id INTEGER PRIMARY KEY, tracking_code TEXT, title TEXT, sender TEXT,
+                status TEXT, priority TEXT, created_at TIMESTAMP, created_by INTEGER);
+            CREATE TABLE document_history (id INTEGER PRIMARY KEY, document_id INTEGER, action TEXT,
+                details TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, user_id INTEGER);
+            INSERT INTO user (id, username, is_active) VALUES (1, 'registrar', 1), (2, 'alice', 1), (3, 'bob', 0);
+        ''')
+        conn.executemany(
+            'INSERT INTO document (tracking_code, title, sender, status, priority, created_at, created_by) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                ('KEMRI-1', 'Budget', 'Finance', PENDING_STATUS, 'Urgent', now.strftime('%Y-%m-%d %H:%M:%S'), 2),
+                ('KEMRI-2', 'Audit', 'Finance', PENDING_STATUS, 'Normal', old, 2),
+                ('KEMRI-3', 'Leave', 'HR', 'Approved - Forwarded to HR', 'Normal', old, 3),
+            ]
+        )
+        conn.execute(
+            "INSERT INTO document_history (document_id, action, details, user_id) "
+            "VALUES (3, 'Registry Approve', 'Comments: ok', 1)"
+        )
+        conn.commit()
+        conn.close()
+        user_names.invalidate()
+        self.cache = StatsCache(self.connect)
+
+    def tearDown(self):
+        self.cache.stop()
+        shutil.rmtree(self.tmp)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def test_role_stats(self):
+        """Each role gets its own view of the documents"""
+        self.assertEqual(self.cache.for_role('Administrator'), {
+            'total_documents': 3, 'pending_approval': 2, 'documents_today': 1, 'active_users': 2,
+        })
+        self.assertEqual(self.cache.for_role('Registry'), {
+            'total_documents': 3, 'pending_approval': 2, 'to_be_processed': 1, 'processed_today': 1,
+        })
+        self.assertEqual(self.cache.for_role('User', 2), {
+            'my_documents': 2, 'pending_approval': 2, 'completed': 0, 'drafts': 0,
+        })
+        self.assertEqual(self.cache.for_role('User', 99)['my_documents'], 0)
+
+    def test_registry_metrics(self):
+        """Registry metrics come from the documents and registry decisions"""
+        metrics = self.cache.get('registry', 'last-7-days')
+        self.assertEqual(metrics['overall_metrics']['pending_documents'], 2)
+        self.assertEqual(metrics['overall_metrics']['processed_documents'], 1)
+        self.assertEqual(metrics['overall_metrics']['sla_compliance'], 0)
+        self.assertEqual([d['name'] for d in metrics['department_metrics']], ['Finance', 'HR'])
+        self.assertEqual(
+            [(d['tracking_code'], d['is_overdue']) for d in metrics['urgent_documents']],
+            [('KEMRI-2', True), ('KEMRI-1', False)]
+        )
+        self.assertEqual(metrics['recent_activity'][0]['user'], 'registrar')
+        self.assertEqual(len(metrics['trends']['document_volume']), 7)
+
+    def test_refresh_updates_and_evicts(self):
+        """Cached entries are served until a refresh, and idle ones are dropped"""
+        self.cache.stop()
+        self.assertEqual(self.cache.for_role('Administrator')['total_documents'], 3)
+        conn = self.connect()
+        conn.execute("INSERT INTO document (title, status, created_at) VALUES ('New', 'Pending', '2025-01-01 00:00:00')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.cache.for_role('Administrator')['total_documents'], 3)
+
+        self.cache.refresh()
+        self.assertEqual(self.cache.for_role('Administrator')['total_documents'], 4)
+
+        self.cache.idle_after = -1
+        self.cache.refresh()
+        self.assertEqual(self.cache._entries, {})
+
+class ComposeOwnerTestCase(unittest.TestCase):
+    def setUp(self):
+        import debug_app
+        self.debug_app = debug_app
+        self.tmp = tempfile.mkdtemp()
+        self.original_path = debug_app.DB_PATH
+        debug_app.DB_PATH = os.path.join(self.tmp, 'app.db')
+        conn = debug_app.get_db_connection()
+        conn.executescript('''
+            CREATE TABLE user (id INTEGER PRIMARY KEY, username TEXT, department TEXT, role TEXT, is_active BOOLEAN DEFAULT 1);
+            CREATE TABLE document (id INTEGER PRIMARY KEY, tracking_code TEXT, title TEXT, description TEXT, sender TEXT,
+                recipient TEXT, status TEXT, priority TEXT, created_at TIMESTAMP, created_by INTEGER);
+            CREATE TABLE document_history (id INTEGER PRIMARY KEY, document_id INTEGER, action TEXT,
+                details TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, user_id INTEGER);
+            CREATE TABLE tracking_sequence (day TEXT PRIMARY KEY, last_value INTEGER NOT NULL);
+            INSERT INTO user (id, username, role, is_active) VALUES (2, 'alice', 'User', 1);
+        ''')
+        conn.commit()
+        conn.close()
+        user_names.invalidate()
+        self.cache = StatsCache(debug_app.get_db_connection)
+
+    def tearDown(self):
+        self.cache.stop()
+        self.debug_app.DB_PATH = self.original_path
+        shutil.rmtree(self.tmp)
+
+    def test_composed_document_is_owned(self):
+        """Documents composed in debug_app count towards their author's dashboard"""
+        client = self.debug_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 2
+            sess['role'] = 'User'
+        response = client.post('/compose', data={
+            'doc_type': 'Outgoing', 'title': 'Leave request', 'sender': 'alice', 'recipient': 'HR'
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.cache.for_role('User', 2)['my_documents'], 1)
+        self.assertEqual(self.cache.for_role('User', 2)['pending_approval'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
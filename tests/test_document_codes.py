@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_codes import DocumentCodeAllocator, reserve_sequence_block, format_document_code
+
+class DocumentCodesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE document (id INTEGER PRIMARY KEY, code TEXT UNIQUE)'))
+            conn.execute(text('CREATE TABLE document_sequence (year INTEGER PRIMARY KEY, last_value INTEGER NOT NULL)'))
+            # String order would put 999 after 1000
+            conn.execute(text(
+                "INSERT INTO document (code) VALUES ('DOC-2025-999'), ('DOC-2025-1000'), ('DOC-2024-007')"
+            ))
+
+    def test_format(self):
+        """Codes are zero-padded to three digits and grow past 999"""
+        self.assertEqual(format_document_code(2025, 7), 'DOC-2025-007')
+        self.assertEqual(format_document_code(2025, 1234), 'DOC-2025-1234')
+
+    def test_sequence_starts_after_existing_codes(self):
+        """A new year's sequence continues from the highest numeric code"""
+        self.assertEqual(list(reserve_sequence_block(self.engine, 2025)), [1001])
+        self.assertEqual(list(reserve_sequence_block(self.engine, 2024)), [8])
+        self.assertEqual(list(reserve_sequence_block(self.engine, 2026)), [1])
+
+    def test_blocks_do_not_overlap(self):
+        """Consecutive reservations hand out disjoint ranges"""
+        first = reserve_sequence_block(self.engine, 2026, 5)
+        second = reserve_sequence_block(self.engine, 2026, 3)
+        self.assertEqual(list(first), [1, 2, 3, 4, 5])
+        self.assertEqual(list(second), [6, 7, 8])
+        with self.assertRaises(ValueError):
+            reserve_sequence_block(self.engine, 2026, 0)
+
+    def test_allocator_reserves_in_blocks(self):
+        """Allocators only touch the sequence once per block"""
+        worker_a = DocumentCodeAllocator(self.engine, block_size=3)
+        worker_b = DocumentCodeAllocator(self.engine, block_size=3)
+        self.assertEqual(worker_a.next_code(2026), 'DOC-2026-001')
+        self.assertEqual(worker_b.next_code(2026), 'DOC-2026-004')
+        self.assertEqual(worker_a.next_code(2026), 'DOC-2026-002')
+        self.assertEqual(worker_a.next_code(2026), 'DOC-2026-003')
+        self.assertEqual(worker_a.next_code(2026), 'DOC-2026-007')
+        self.assertEqual(worker_b.reserve_codes(2026, 2), ['DOC-2026-010', 'DOC-2026-011'])
+
+if __name__ == '__main__':
+    unittest.main()
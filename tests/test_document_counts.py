@@ -0,0 +1,125 @@
+import os
+import sys
+import unittest
+
+from datetime import date
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_counts import (
+    DocumentCounts, read_document_counters, setup_document_counters, rebuild_document_counters,
+    activity_buckets, setup_document_version, read_document_version
+)
+
+class DocumentCountsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE document (id INTEGER PRIMARY KEY, status TEXT, priority TEXT, created_at DATETIME)'
+            ))
+            conn.execute(text(
+                'CREATE TABLE document_counters (status TEXT, priority TEXT, direction TEXT, '
+                'count INTEGER NOT NULL, PRIMARY KEY (status, priority, direction))'
+            ))
+            conn.execute(text(
+                "INSERT INTO document (status, priority) VALUES "
+                "('Incoming', 'Urgent'), ('Incoming', 'Normal'), ('Outgoing', 'Urgent')"
+            ))
+        setup_document_counters(self.engine)
+
+    def counters(self):
+        with Session(self.engine) as session:
+            return read_document_counters(session)
+
+    def assertCountersMatch(self):
+        with self.engine.connect() as conn:
+            actual = DocumentCounts.from_rows(conn.execute(text(
+                'SELECT status, priority, COUNT(*) FROM document GROUP BY status, priority'
+            )).fetchall())
+        self.assertEqual(self.counters().as_dict(), actual.as_dict())
+
+    def test_matrix_slicing(self):
+        """The matrix answers status and priority slices"""
+        counts = DocumentCounts.from_rows([
+            ('Incoming', 'Urgent', 2), ('Pending', 'Normal', 3), ('Outgoing', 'Urgent', 1)
+        ])
+        self.assertEqual(counts.total, 6)
+        self.assertEqual(counts.by_status(['Incoming', 'Pending', 'Ended']), {'Incoming': 2, 'Pending': 3, 'Ended': 0})
+        self.assertEqual(counts.by_priority(['Urgent'], statuses=['Incoming', 'Pending']), {'Urgent': 2})
+        self.assertEqual(counts.count(['Pending'], ['Urgent']), 0)
+
+    def test_activity_buckets(self):
+        """Buckets start on the day, the Monday or the first of the month"""
+        self.assertEqual(len(activity_buckets(date(2025, 1, 30), date(2025, 2, 3))), 5)
+        self.assertEqual(activity_buckets(date(2025, 1, 30), date(2025, 2, 3), 'week'), [date(2025, 1, 27), date(2025, 2, 3)])
+        self.assertEqual(
+            activity_buckets(date(2024, 12, 15), date(2025, 1, 1), 'month'), [date(2024, 12, 1), date(2025, 1, 1)]
+        )
+        with self.assertRaises(ValueError):
+            activity_buckets(date(2025, 1, 1), date(2025, 1, 2), 'hour')
+        with self.assertRaises(ValueError):
+            activity_buckets(date(2025, 1, 2), date(2025, 1, 1))
+
+    def test_initial_fill(self):
+        """Existing documents are counted when the counters are set up"""
+        self.assertEqual(self.counters().total, 3)
+        self.assertCountersMatch()
+
+    def test_triggers_track_writes(self):
+        """Inserts, status and priority changes and deletes update the counters"""
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO document (status, priority) VALUES ('Pending', 'Priority')"))
+            conn.execute(text("UPDATE document SET status = 'Received' WHERE id = 1"))
+            conn.execute(text("UPDATE document SET priority = 'Urgent' WHERE id = 2"))
+            conn.execute(text('DELETE FROM document WHERE id = 3'))
+        self.assertCountersMatch()
+        self.assertEqual(self.counters().by_status(['Received', 'Outgoing']), {'Received': 1, 'Outgoing': 0})
+
+    def test_rolled_back_write_leaves_counters_alone(self):
+        """Counters change in the same transaction as the document"""
+        conn = self.engine.connect()
+        trans = conn.begin()
+        conn.execute(text("INSERT INTO document (status, priority) VALUES ('Incoming', 'Normal')"))
+        trans.rollback()
+        conn.close()
+        self.assertEqual(self.counters().total, 3)
+
+    def test_version_changes_on_counted_writes(self):
+        """The data version moves on writes that can change counts, and only then"""
+        with self.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE document_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)'))
+            conn.execute(text('ALTER TABLE document ADD COLUMN sender TEXT'))
+            conn.execute(text('ALTER TABLE document ADD COLUMN title TEXT'))
+        setup_document_version(self.engine)
+
+        def version():
+            with Session(self.engine) as session:
+                return read_document_version(session)
+
+        start = version()
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE document SET title = 'Renamed' WHERE id = 1"))
+        self.assertEqual(version(), start)
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE document SET status = 'Pending' WHERE id = 1"))
+            conn.execute(text('DELETE FROM document WHERE id = 2'))
+        self.assertEqual(version(), start + 2)
+
+    def test_rebuild_reports_drift(self):
+        """Rebuilding fixes drifted counters and reports them"""
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE document_counters SET count = 7 WHERE status = 'Incoming' AND priority = 'Urgent'"
+            ))
+        drift = rebuild_document_counters(self.engine)
+        self.assertEqual(drift, [('Incoming', 'Urgent', 'Incoming', 7, 1)])
+        self.assertCountersMatch()
+        self.assertEqual(rebuild_document_counters(self.engine), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import unittest
+
+from flask import Flask, session
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (
+    db, Document, DocumentHistory, record_document_event, set_documents_status,
+    load_document_history, backfill_document_history
+)
+
+class DocumentHistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        # The models bound to a separate app on an in-memory database, so the
+        # tests never touch the application database
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.secret_key = 'test'
+        db.init_app(self.app)
+        self.context = self.app.test_request_context()
+        self.context.push()
+        session['username'] = 'registry'
+        db.create_all()
+        for n in range(1, 4):
+            db.session.add(Document(
+                code=f'DOC-2025-00{n}', title=f'Letter {n}', sender='Finance', recipient='Registry',
+                status='Pending' if n == 3 else 'Incoming'
+            ))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def document(self, code):
+        return Document.query.filter_by(code=code).one()
+
+    def actions(self, code):
+        return [event.action for event in load_document_history(self.document(code).id)]
+
+    def test_events_commit_with_their_change(self):
+        """Creation and status events are recorded against the user, newest first, and roll back with the change"""
+        document = self.document('DOC-2025-001')
+        record_document_event(document, 'Document Created', 'Document DOC-2025-001 was created')
+        db.session.commit()
+        document.status = 'Received'
+        record_document_event(document, 'Status Changed to Received', 'Status changed from Incoming to Received')
+        db.session.commit()
+
+        history = load_document_history(document.id)
+        self.assertEqual([event.action for event in history], ['Status Changed to Received', 'Document Created'])
+        self.assertEqual({event.user for event in history}, {'registry'})
+
+        document.status = 'Ended'
+        record_document_event(document, 'Status Changed to Ended')
+        db.session.rollback()
+        self.assertEqual(self.document('DOC-2025-001').status, 'Received')
+        self.assertEqual(len(self.actions('DOC-2025-001')), 2)
+
+    def test_bulk_status_change(self):
+        """set_documents_status records one event for each document whose status changed"""
+        codes = ['DOC-2025-001', 'DOC-2025-002', 'DOC-2025-003']
+        self.assertEqual(set_documents_status(codes, 'Pending'), 3)
+        db.session.commit()
+
+        self.assertEqual({self.document(code).status for code in codes}, {'Pending'})
+        self.assertEqual(self.actions('DOC-2025-001'), ['Status Changed to Pending'])
+        self.assertEqual(self.actions('DOC-2025-002'), ['Status Changed to Pending'])
+        self.assertEqual(self.actions('DOC-2025-003'), [])
+        event = load_document_history(self.document('DOC-2025-002').id)[0]
+        self.assertEqual((event.details, event.user), ('Status changed from Incoming to Pending', 'registry'))
+
+    def test_backfill_is_idempotent(self):
+        """Only documents without history get a 'Document Created' event, once"""
+        record_document_event(self.document('DOC-2025-003'), 'Comment Added', 'Filed')
+        db.session.commit()
+
+        backfill_document_history()
+        backfill_document_history()
+
+        self.assertEqual(self.actions('DOC-2025-001'), ['Document Created'])
+        self.assertEqual(self.actions('DOC-2025-002'), ['Document Created'])
+        self.assertEqual(self.actions('DOC-2025-003'), ['Comment Added'])
+        self.assertEqual(DocumentHistory.query.filter_by(action='Document Created', user='System').count(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
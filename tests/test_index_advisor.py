@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_advisor import analyze_queries
+
+class IndexAdvisorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE document (id INTEGER PRIMARY KEY, code TEXT, title TEXT)'))
+            conn.execute(text('CREATE INDEX ix_document_code ON document (code)'))
+        self.session = Session(self.engine)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def analyze(self, statement):
+        [result] = analyze_queries(self.session, [('Query', statement)])
+        return result
+
+    def test_indexed_query_is_ok(self):
+        """A lookup that uses an index is OK and reports its plan"""
+        result = self.analyze(text("SELECT id FROM document WHERE code = 'DOC-2025-001'"))
+        self.assertEqual(result['status'], 'OK')
+        self.assertIsNone(result['error'])
+        self.assertIn('ix_document_code', result['plan'][0])
+        self.assertEqual(result['sql'], "SELECT id FROM document WHERE code = 'DOC-2025-001'")
+
+    def test_full_scan_and_temp_sort(self):
+        """Unindexed filters are flagged as full scans, unindexed orderings as temp sorts"""
+        result = self.analyze(text("SELECT id FROM document WHERE title = 'Memo'"))
+        self.assertEqual(result['status'], 'Full scan')
+        self.assertEqual(result['full_scans'], ['SCAN document'])
+
+        result = self.analyze(text("SELECT id FROM document WHERE code > 'A' ORDER BY title"))
+        self.assertEqual(result['status'], 'Temp sort')
+        self.assertEqual(result['full_scans'], [])
+        self.assertEqual(result['temp_sorts'], ['USE TEMP B-TREE FOR ORDER BY'])
+
+    def test_errors_are_reported(self):
+        """Statements that fail to explain or to compile are reported instead of raising"""
+        result = self.analyze(text('SELECT id FROM missing_table'))
+        self.assertEqual(result['status'], 'Error')
+        self.assertIn('missing_table', result['error'])
+        self.assertEqual(result['sql'], 'SELECT id FROM missing_table')
+
+        # A value with no literal rendering cannot be compiled inline
+        result = self.analyze(text('SELECT id FROM document WHERE code = :code').bindparams(code=object()))
+        self.assertEqual(result['status'], 'Error')
+        self.assertEqual(result['sql'], '')
+        self.assertIn('No literal value renderer', result['error'])
+
+if __name__ == '__main__':
+    unittest.main()
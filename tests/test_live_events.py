@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_counts import setup_document_counters, setup_document_version
+from live_events import EventBroker, format_cursor, format_event, parse_cursor
+
+class LiveEventsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE document (id INTEGER PRIMARY KEY, code TEXT, title TEXT, sender TEXT, '
+                'status TEXT, priority TEXT, created_at DATETIME)'
+            ))
+            conn.execute(text(
+                'CREATE TABLE document_counters (status TEXT, priority TEXT, direction TEXT, '
+                'count INTEGER NOT NULL, PRIMARY KEY (status, priority, direction))'
+            ))
+            conn.execute(text('CREATE TABLE document_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL)'))
+            conn.execute(text(
+                'CREATE TABLE system_log (id INTEGER PRIMARY KEY, timestamp DATETIME, log_type TEXT, '
+                'user TEXT, action TEXT, details TEXT)'
+            ))
+            conn.execute(text("INSERT INTO document (status, priority) VALUES ('Incoming', 'Normal')"))
+        setup_document_counters(self.engine)
+        setup_document_version(self.engine)
+        # poll_interval=0 rereads the database on every poll
+        self.broker = EventBroker(self.engine, poll_interval=0, max_concurrent=2)
+
+    def execute(self, statement):
+        with self.engine.begin() as conn:
+            conn.execute(text(statement))
+
+    def poll(self, cursor=None):
+        events, cursor = self.broker.events(cursor)
+        return dict(events), format_cursor(cursor)[len('id: '):-2]
+
+    def test_first_poll_sends_snapshot(self):
+        """A client without a cursor gets a snapshot of the totals by status and priority"""
+        events, _ = self.poll()
+        self.assertEqual(list(events), ['snapshot'])
+        self.assertEqual(events['snapshot']['total'], 1)
+        self.assertEqual(events['snapshot']['status']['Incoming'], 1)
+        self.assertEqual(events['snapshot']['status']['Pending'], 0)
+        self.assertEqual(events['snapshot']['priority']['Normal'], 1)
+
+    def test_up_to_date_client_gets_nothing(self):
+        """Polling again with the cursor just given sends no events"""
+        _, cursor = self.poll()
+        self.assertEqual(self.poll(cursor), ({}, cursor))
+
+    def test_counter_changes_send_snapshot(self):
+        """Status changes send the client its new counts"""
+        _, cursor = self.poll()
+        self.execute("UPDATE document SET status = 'Pending' WHERE id = 1")
+        events, next_cursor = self.poll(cursor)
+        self.assertEqual(list(events), ['snapshot'])
+        self.assertEqual(events['snapshot']['status']['Pending'], 1)
+        self.assertNotEqual(next_cursor, cursor)
+
+    def test_urgent_arrivals_and_logs(self):
+        """New urgent documents and new log entries are sent once, oldest first"""
+        _, cursor = self.poll()
+        self.execute(
+            "INSERT INTO document (code, title, sender, status, priority) VALUES "
+            "('KEMRI-1', 'Budget', 'Finance', 'Incoming', 'Urgent'), "
+            "('KEMRI-2', 'Memo', 'HR', 'Incoming', 'Normal'), "
+            "('KEMRI-3', 'Audit', 'Finance', 'Incoming', 'Urgent')"
+        )
+        self.execute("INSERT INTO system_log (user, action) VALUES ('admin', 'Document Created')")
+
+        events, cursor = self.poll(cursor)
+        self.assertEqual(list(events), ['snapshot', 'urgent', 'log'])
+        self.assertEqual([doc['code'] for doc in events['urgent']], ['KEMRI-1', 'KEMRI-3'])
+        self.assertEqual([entry['action'] for entry in events['log']], ['Document Created'])
+        self.assertEqual(self.poll(cursor)[0], {})
+
+    def test_reading_is_shared_between_polls(self):
+        """Within poll_interval, polls reuse the worker's last reading of the database"""
+        broker = EventBroker(self.engine, poll_interval=3600)
+        _, cursor = broker.events()
+        self.execute("UPDATE document SET status = 'Pending' WHERE id = 1")
+        self.assertEqual(broker.events(format_cursor(cursor)[len('id: '):-2]), ([], cursor))
+
+    def test_concurrency_limit(self):
+        """The broker refuses polls past its limit until one finishes"""
+        self.assertTrue(self.broker.acquire())
+        self.assertTrue(self.broker.acquire())
+        self.assertFalse(self.broker.acquire())
+        self.broker.release()
+        self.assertTrue(self.broker.acquire())
+
+    def test_cursor_format(self):
+        """Cursors round-trip through Last-Event-ID and malformed ones are ignored"""
+        self.assertEqual(format_cursor((3, 10, 42)), 'id: 3-10-42\n\n')
+        self.assertEqual(parse_cursor('3-10-42'), (3, 10, 42))
+        for value in (None, '', 'abc', '1-2', '1-2-x'):
+            self.assertIsNone(parse_cursor(value))
+
+    def test_format_event(self):
+        """Events are encoded as Server-Sent Event frames"""
+        self.assertEqual(format_event('snapshot', {'total': 1}), 'event: snapshot\ndata: {"total": 1}\n\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_partitions import (
+    setup_log_partitions, rotate_system_log, compact_log_partitions, list_log_partitions,
+    list_log_archives, read_log_archive, restore_log_archive
+)
+
+NOW = datetime(2025, 6, 15, 9, 0)
+
+class LogPartitionsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archives = os.path.join(self.tmp.name, 'log_archives')
+        # A file database, so concurrent connections see one another's locks
+        self.engine = create_engine('sqlite:///' + os.path.join(self.tmp.name, 'logs.db'))
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE system_log (id INTEGER PRIMARY KEY, timestamp DATETIME, log_type VARCHAR(20), '
+                'user VARCHAR(100), action VARCHAR(100), details TEXT)'
+            ))
+            for day in ('2025-01-10', '2025-01-20', '2025-03-05', '2025-05-31', '2025-06-01', '2025-06-14'):
+                conn.execute(
+                    text("INSERT INTO system_log (timestamp, log_type, user, action) VALUES (:timestamp, 'Info', 'admin', :action)"),
+                    {'timestamp': f'{day} 08:00:00.000000', 'action': f'Action on {day}'}
+                )
+        setup_log_partitions(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def scalar(self, query):
+        with self.engine.connect() as conn:
+            return conn.execute(text(query)).scalar()
+
+    def rotate_and_compact(self):
+        rotate_system_log(self.engine, now=NOW)
+        return compact_log_partitions(self.engine, self.archives, retention_months=2, now=NOW)
+
+    def test_rotation_moves_earlier_months(self):
+        """Only this month's entries stay in system_log; the rest move to monthly partitions"""
+        moved = rotate_system_log(self.engine, now=NOW)
+        self.assertEqual(moved, {date(2025, 1, 1): 2, date(2025, 3, 1): 1, date(2025, 5, 1): 1})
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM system_log WHERE timestamp < '2025-06-01'"), 0)
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM system_log WHERE action = 'Logs Rotated'"), 1)
+        self.assertEqual(self.scalar('SELECT COUNT(*) FROM system_log_all'), 7)
+        self.assertEqual(
+            [(p['table'], p['entries']) for p in list_log_partitions(self.engine)],
+            [('system_log_2025_05', 1), ('system_log_2025_03', 1), ('system_log_2025_01', 2)]
+        )
+        self.assertEqual(rotate_system_log(self.engine, now=NOW), {})
+
+    def test_ids_are_not_reused(self):
+        """New entries get ids above every moved entry, even when system_log was emptied"""
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM system_log WHERE timestamp >= '2025-06-01'"))
+        rotate_system_log(self.engine, now=NOW)
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO system_log (action) VALUES ('New')"))
+        self.assertEqual(self.scalar("SELECT id FROM system_log WHERE action = 'New'"), 6)
+
+    def test_compaction_archives_expired_partitions(self):
+        """Partitions past retention become gzipped JSON lines and leave the database"""
+        compacted = self.rotate_and_compact()
+        self.assertEqual(compacted, {date(2025, 1, 1): 2, date(2025, 3, 1): 1})
+        self.assertEqual([p['table'] for p in list_log_partitions(self.engine)], ['system_log_2025_05'])
+        self.assertEqual([a['month'] for a in list_log_archives(self.archives)], [date(2025, 3, 1), date(2025, 1, 1)])
+        self.assertEqual(self.scalar('SELECT COUNT(*) FROM system_log_all'), 4)
+
+        entries = list(read_log_archive(self.archives, date(2025, 1, 1), start=date(2025, 1, 15)))
+        self.assertEqual([entry['action'] for entry in entries], ['Action on 2025-01-20'])
+
+    def test_restore_and_recompact(self):
+        """Restored entries return to their partition and are archived again without duplicates"""
+        self.rotate_and_compact()
+        restored = restore_log_archive(
+            self.engine, self.archives, date(2025, 1, 1), start=date(2025, 1, 1), end=date(2025, 1, 10)
+        )
+        self.assertEqual(restored, 1)
+        self.assertEqual(
+            self.scalar("SELECT action FROM system_log_all WHERE timestamp < '2025-02-01'"), 'Action on 2025-01-10'
+        )
+
+        compact_log_partitions(self.engine, self.archives, retention_months=2, now=NOW)
+        self.assertEqual(len(list(read_log_archive(self.archives, date(2025, 1, 1)))), 2)
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM system_log_all WHERE timestamp < '2025-02-01'"), 0)
+
+    def test_concurrent_compactions(self):
+        """Processes compacting at the same time archive each month once and leave no partial files"""
+        rotate_system_log(self.engine, now=NOW)
+        rotate_system_log(self.engine, now=NOW)
+        self.assertEqual(self.scalar("SELECT COUNT(*) FROM system_log WHERE action = 'Logs Rotated'"), 1)
+
+        results, errors = [], []
+        start = threading.Barrier(4)
+        def compact():
+            start.wait()
+            try:
+                results.append(compact_log_partitions(self.engine, self.archives, retention_months=2, now=NOW))
+            except Exception as e:
+                errors.append(e)
+        workers = [threading.Thread(target=compact) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        archived = [month for result in results for month in result]
+        self.assertEqual(sorted(archived), [date(2025, 1, 1), date(2025, 3, 1)])
+        self.assertEqual(sorted(os.listdir(self.archives)), ['system_log_2025-01.jsonl.gz', 'system_log_2025-03.jsonl.gz'])
+        self.assertEqual(len(list(read_log_archive(self.archives, date(2025, 1, 1)))), 2)
+
+if __name__ == '__main__':
+    unittest.main()
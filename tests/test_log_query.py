@@ -0,0 +1,90 @@
+import os
+import sys
+import unittest
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_partitions import setup_log_partitions, rotate_system_log
+from log_query import LogQuery, parse_log_time
+
+class LogQueryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE system_log (id INTEGER PRIMARY KEY, timestamp DATETIME, log_type VARCHAR(20), '
+                'user VARCHAR(100), action VARCHAR(100), details TEXT)'
+            ))
+            # 90 entries a day apart from mid January to mid April; pairs share a timestamp
+            start = datetime(2025, 1, 15)
+            for n in range(90):
+                conn.execute(
+                    text('INSERT INTO system_log (timestamp, log_type, user, action) VALUES (:timestamp, :log_type, :user, :action)'),
+                    {
+                        'timestamp': (start + timedelta(days=n // 2)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+                        'log_type': 'Error' if n % 3 == 0 else 'Info',
+                        'user': f'user{n % 4}',
+                        'action': 'Login' if n % 2 else 'Document Created',
+                    }
+                )
+        setup_log_partitions(self.engine)
+        rotate_system_log(self.engine, now=datetime(2025, 3, 1))
+        setup_log_partitions(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def expected(self, where='1'):
+        with self.engine.connect() as conn:
+            return conn.execute(text(
+                f'SELECT id FROM system_log_all WHERE {where} ORDER BY timestamp DESC, id DESC'
+            )).scalars().all()
+
+    def walk(self, query, limit):
+        seen = []
+        cursor = None
+        while True:
+            entries, cursor = query.page(cursor, limit)
+            self.assertLessEqual(len(entries), limit)
+            seen.extend(entry['id'] for entry in entries)
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_every_partition_in_order(self):
+        """Following cursors visits every entry across system_log and its partitions exactly once"""
+        for limit in (1, 7, 100):
+            self.assertEqual(self.walk(LogQuery(self.engine), limit), self.expected())
+
+    def test_filters(self):
+        """Type, user and action filters match exactly and combine"""
+        query = LogQuery(self.engine, {'log_type': 'Error', 'user': 'user2', 'action': None})
+        self.assertEqual(self.walk(query, 5), self.expected("log_type = 'Error' AND user = 'user2'"))
+
+    def test_time_range(self):
+        """start is inclusive, end exclusive, and a bare end date includes that day"""
+        query = LogQuery(
+            self.engine, {'action': 'Login'}, parse_log_time('2025-02-20'), parse_log_time('2025-03-02', end=True)
+        )
+        self.assertEqual(
+            self.walk(query, 4),
+            self.expected("action = 'Login' AND timestamp >= '2025-02-20' AND timestamp < '2025-03-03'")
+        )
+
+    def test_iter_entries(self):
+        """iter_entries yields the same entries as walking the pages"""
+        entries = list(LogQuery(self.engine, {'user': 'user1'}).iter_entries(batch_size=6))
+        self.assertEqual([entry['id'] for entry in entries], self.expected("user = 'user1'"))
+
+    def test_invalid_cursor(self):
+        """A cursor that was not produced by a page is rejected"""
+        for cursor in ('not-a-cursor', 'WzEsMl0'):
+            with self.assertRaises(ValueError):
+                LogQuery(self.engine).page(cursor)
+
+if __name__ == '__main__':
+    unittest.main()
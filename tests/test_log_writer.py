@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine, event, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_writer import SystemLogWriter
+
+metadata = MetaData()
+system_log = Table(
+    'system_log', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('timestamp', DateTime),
+    Column('log_type', String(20)),
+    Column('user', String(100)),
+    Column('action', String(100)),
+    Column('details', Text),
+)
+
+class SystemLogWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        # A file database, so the writer thread sees the same tables
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp.name, 'logs.db')}")
+        metadata.create_all(self.engine)
+        self.inserts = 0
+        event.listen(self.engine, 'before_cursor_execute', self.count_inserts)
+        # A long flush interval keeps the background thread idle; the tests flush by hand
+        self.writer = SystemLogWriter(self.engine, system_log, flush_interval=3600, batch_size=3)
+
+    def tearDown(self):
+        self.writer.close()
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def count_inserts(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT'):
+            self.inserts += 1
+
+    def logged(self):
+        with self.engine.connect() as conn:
+            return conn.execute(text('SELECT user, action FROM system_log ORDER BY id')).fetchall()
+
+    def test_entries_wait_for_flush(self):
+        """Entries are queued by write() and only inserted by a flush"""
+        self.writer.write('Info', 'admin', 'Document Created', 'DOC-2025-001')
+        self.assertEqual(self.logged(), [])
+        self.assertEqual(self.writer.pending, 1)
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(self.logged(), [('admin', 'Document Created')])
+        self.assertEqual(self.writer.pending, 0)
+
+    def test_batched_inserts(self):
+        """A flush writes the queue in multi-row inserts of batch_size rows"""
+        for n in range(7):
+            self.writer.write('Info', 'admin', f'Action {n}', '')
+        self.assertEqual(self.writer.flush(), 7)
+        self.assertEqual(self.inserts, 3)
+        self.assertEqual([action for _, action in self.logged()], [f'Action {n}' for n in range(7)])
+
+    def test_close_commits_pending_entries(self):
+        """Closing writes what is still queued, and later writes go straight to the database"""
+        self.writer.write('Info', 'admin', 'Before Close', '')
+        self.writer.close()
+        self.assertEqual(self.logged(), [('admin', 'Before Close')])
+        self.writer.write('Info', 'admin', 'After Close', '')
+        self.assertEqual(len(self.logged()), 2)
+
+    def test_exit_commits_pending_entries(self):
+        """A process that exits with entries still queued commits them, as the app registers close with atexit"""
+        script = textwrap.dedent('''
+            import atexit, sys
+            from sqlalchemy import create_engine
+            from tests.test_log_writer import system_log
+            from log_writer import SystemLogWriter
+
+            writer = SystemLogWriter(create_engine(sys.argv[1]), system_log, flush_interval=3600)
+            atexit.register(writer.close)
+            writer.write('Info', 'admin', 'Queued At Exit', '')
+            sys.exit(0)
+        ''')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, '-c', script, str(self.engine.url)], cwd=root, check=True)
+        self.assertEqual(self.logged(), [('admin', 'Queued At Exit')])
+
+    def test_failed_batch_is_retried(self):
+        """A batch that fails to insert is kept for the next flush"""
+        self.writer.write('Info', 'admin', 'Retried', '')
+        with self.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE system_log RENAME TO system_log_moved'))
+        self.assertEqual(self.writer.flush(), 0)
+        with self.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE system_log_moved RENAME TO system_log'))
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(self.logged(), [('admin', 'Retried')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy.orm import declarative_base, Session
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagination import KeysetPagination
+
+Base = declarative_base()
+
+class Item(Base):
+    __tablename__ = 'item'
+    id = Column(Integer, primary_key=True)
+    code = Column(String(20), unique=True)
+    created = Column(DateTime)
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = Session(engine)
+        start = datetime(2025, 1, 1)
+        # Pairs of rows share a timestamp so the id tie-breaker matters
+        self.session.add_all([
+            Item(id=i, code=f'C-{i:03d}', created=start + timedelta(hours=i // 2))
+            for i in range(1, 24)
+        ])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def paginate(self, cursor=None, order='desc'):
+        return KeysetPagination(
+            self.session.query(Item), [Item.created, Item.id],
+            per_page=5, cursor=cursor, order=order
+        )
+
+    def test_walks_every_row_once_in_order(self):
+        """Following next cursors visits all rows in sort order"""
+        for order in ['asc', 'desc']:
+            seen = []
+            page = self.paginate(order=order)
+            self.assertFalse(page.has_prev)
+            while True:
+                seen.extend(item.id for item in page.items)
+                if not page.next_cursor:
+                    break
+                page = self.paginate(page.next_cursor, order=order)
+            expected = sorted(range(1, 24), key=lambda i: (i // 2, i), reverse=(order == 'desc'))
+            self.assertEqual(seen, expected)
+
+    def test_prev_cursor_returns_previous_page(self):
+        """Going back from a page returns exactly the page before it"""
+        first = self.paginate()
+        second = self.paginate(first.next_cursor)
+        third = self.paginate(second.next_cursor)
+        back = self.paginate(third.prev_cursor)
+        self.assertEqual([i.id for i in back.items], [i.id for i in second.items])
+        self.assertTrue(back.has_next)
+
+        back_to_first = self.paginate(back.prev_cursor)
+        self.assertEqual([i.id for i in back_to_first.items], [i.id for i in first.items])
+        self.assertFalse(back_to_first.has_prev)
+
+    def test_last_page(self):
+        """The final page has no next cursor"""
+        page = self.paginate()
+        pages = 1
+        while page.next_cursor:
+            page = self.paginate(page.next_cursor)
+            pages += 1
+        self.assertEqual(pages, 5)
+        self.assertEqual(len(page.items), 3)
+        self.assertIsNone(page.next_cursor)
+
+    def test_invalid_or_foreign_cursor_starts_over(self):
+        """Garbage cursors and cursors for another sort order are ignored"""
+        first = self.paginate()
+        self.assertEqual([i.id for i in self.paginate('not-a-cursor').items], [i.id for i in first.items])
+
+        by_code = KeysetPagination(self.session.query(Item), [Item.code], per_page=5)
+        foreign = self.paginate(by_code.next_cursor)
+        self.assertEqual([i.id for i in foreign.items], [i.id for i in first.items])
+
+    def test_total_is_lazy(self):
+        """The total is counted on demand"""
+        page = self.paginate()
+        self.assertIsNone(page._total)
+        self.assertEqual(page.total, 23)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import unittest
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_cache import ReportCache, report_etag
+
+class ReportCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {'total': self.calls}
+
+    def test_hits_reuse_value(self):
+        """A key is computed once while its entry is fresh"""
+        cache = ReportCache(ttl=60)
+        self.assertEqual(cache.get_or_compute(('reports', 1), self.compute), {'total': 1})
+        self.assertEqual(cache.get_or_compute(('reports', 1), self.compute), {'total': 1})
+        self.assertEqual(cache.get_or_compute(('reports', 2), self.compute), {'total': 2})
+
+    def test_entries_expire(self):
+        """Entries older than the TTL are recomputed"""
+        cache = ReportCache(ttl=0.01)
+        cache.get_or_compute('key', self.compute)
+        time.sleep(0.02)
+        self.assertEqual(cache.get_or_compute('key', self.compute), {'total': 2})
+
+    def test_size_is_capped(self):
+        """The least recently used entry is dropped when the cache is full"""
+        cache = ReportCache(ttl=60, max_entries=2)
+        for key in ('a', 'b', 'a', 'c'):
+            cache.get_or_compute(key, self.compute)
+        self.assertEqual(self.calls, 3)
+        cache.get_or_compute('b', self.compute)
+        self.assertEqual(self.calls, 4)
+
+    def test_etag_depends_on_every_part(self):
+        """Changing the data version or any filter changes the ETag"""
+        self.assertEqual(report_etag('reports', 7, 'last-7-days'), report_etag('reports', 7, 'last-7-days'))
+        self.assertNotEqual(report_etag('reports', 7, 'last-7-days'), report_etag('reports', 8, 'last-7-days'))
+        self.assertNotEqual(report_etag('reports', 7, 'last-7-days'), report_etag('reports', 7, 'last-30-days'))
+
+if __name__ == '__main__':
+    unittest.main()
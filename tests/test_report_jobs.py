@@ -0,0 +1,164 @@
+import csv
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_jobs import ReportJobQueue
+
+SCHEMA = [
+    """CREATE TABLE document (
+        id INTEGER PRIMARY KEY, code TEXT, title TEXT, sender TEXT, recipient TEXT,
+        status TEXT, priority TEXT, date_received DATETIME, created_at DATETIME)""",
+    """CREATE TABLE document_daily_stats (
+        day TEXT, status TEXT, priority TEXT, sender_department TEXT, count INTEGER,
+        PRIMARY KEY (day, status, priority, sender_department))""",
+    """CREATE TABLE report_job (
+        id TEXT PRIMARY KEY, report_type TEXT, format TEXT, params TEXT, status TEXT,
+        progress INTEGER, total INTEGER, result_file TEXT, error TEXT, created_by TEXT,
+        created_at DATETIME, started_at DATETIME, finished_at DATETIME, expires_at DATETIME)""",
+]
+
+class ReportJobQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp, 'app.db')}")
+        with self.engine.begin() as conn:
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+            conn.execute(
+                text(
+                    "INSERT INTO document (code, title, sender, recipient, status, priority, created_at) "
+                    "VALUES (:code, 'Memo', 'Finance', 'HR', 'Pending', 'Normal', :created_at)"
+                ),
+                [
+                    {'code': f'DOC-2025-{n:03d}', 'created_at': f'2025-03-{1 + n % 28:02d} 09:00:00.000000'}
+                    for n in range(2500)
+                ]
+            )
+            conn.execute(text(
+                "INSERT INTO document_daily_stats VALUES "
+                "('2025-03-01', 'Pending', 'Normal', 'Finance', 4), "
+                "('2025-03-02', 'Ended', 'High', 'Finance', 1), "
+                "('2025-04-01', 'Pending', 'Normal', 'HR', 2)"
+            ))
+        self.queue = ReportJobQueue(self.engine, os.path.join(self.tmp, 'results'))
+        self.params = {'start': '2025-03-01', 'end': '2025-04-30'}
+
+    def tearDown(self):
+        self.queue.close()
+        self.engine.dispose()
+        shutil.rmtree(self.tmp)
+
+    def run_job(self, report_type, fmt='csv'):
+        job_id = self.queue.enqueue(report_type, self.params, fmt)
+        self.queue._executor.shutdown(wait=True)
+        return self.queue.get(job_id)
+
+    def read_csv(self, job):
+        with open(self.queue.result_path(job), newline='') as f:
+            return list(csv.reader(f))
+
+    def test_document_register_reads_every_batch(self):
+        """The register export covers every document across keyset batches"""
+        job = self.run_job('document-register')
+        self.assertEqual((job['status'], job['progress'], job['total']), ('done', 2500, 2500))
+        rows = self.read_csv(job)
+        self.assertEqual(rows[0][0], 'Code')
+        self.assertEqual(len({row[0] for row in rows[1:]}), 2500)
+
+    def test_department_throughput_groups_by_month(self):
+        """Throughput sums the rollup per department and month"""
+        rows = self.read_csv(self.run_job('department-throughput'))
+        by_month = {(row[0], row[1]): row for row in rows[1:]}
+        self.assertEqual(by_month[('Finance', '2025-03')][2], '5')
+        self.assertEqual(by_month[('HR', '2025-04')][2], '2')
+
+    def test_pdf_export(self):
+        """PDF exports produce a PDF file"""
+        job = self.run_job('department-throughput', 'pdf')
+        self.assertEqual(job['status'], 'done')
+        with open(self.queue.result_path(job), 'rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+
+    def test_invalid_requests_are_rejected(self):
+        """Unknown report types, formats and windows raise ValueError"""
+        with self.assertRaises(ValueError):
+            self.queue.enqueue('missing', self.params)
+        with self.assertRaises(ValueError):
+            self.queue.enqueue('document-register', self.params, 'xlsx')
+        with self.assertRaises(ValueError):
+            self.queue.enqueue('document-register', {'start': '2025-03-01'})
+
+    def test_expired_results_are_purged(self):
+        """Expired jobs lose their row and file; stale unfinished jobs fail"""
+        job = self.run_job('department-throughput')
+        path = self.queue.result_path(job)
+        past = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S.%f')
+        with self.engine.begin() as conn:
+            conn.execute(text('UPDATE report_job SET expires_at = :past'), {'past': past})
+            conn.execute(
+                text("INSERT INTO report_job (id, status, progress, created_at) VALUES ('stale', 'running', 0, :past)"),
+                {'past': past}
+            )
+
+        self.assertEqual(self.queue.purge_expired(), 1)
+        self.assertIsNone(self.queue.get(job['id']))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.queue.get('stale')['status'], 'failed')
+
+    def test_live_jobs_are_not_stale(self):
+        """Old jobs with a recent heartbeat keep running; quiet ones are failed"""
+        self.queue.heartbeat_interval = 0.01
+        self.run_job('department-throughput')
+
+        past = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S.%f')
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO report_job (id, status, progress, created_at, heartbeat_at) "
+                    "VALUES ('live', 'running', 0, :past, :past), ('quiet', 'queued', 0, :past, :past)"
+                ),
+                {'past': past}
+            )
+        # 'live' belongs to this process, so the heartbeat thread keeps it fresh
+        self.queue._active.add('live')
+        time.sleep(0.1)
+
+        self.queue.purge_expired()
+        self.assertEqual(self.queue.get('live')['status'], 'running')
+        self.assertEqual(self.queue.get('quiet')['status'], 'failed')
+
+    def test_concurrent_startup_adds_heartbeat_once(self):
+        """A process that loses the race to add heartbeat_at starts normally"""
+        path = os.path.join(self.tmp, 'old.db')
+        engine = create_engine(f'sqlite:///{path}')
+        with engine.begin() as conn:
+            conn.execute(text(SCHEMA[2]))
+
+        def other_process_first(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('ALTER TABLE report_job'):
+                other = sqlite3.connect(path)
+                other.execute('ALTER TABLE report_job ADD COLUMN heartbeat_at DATETIME')
+                other.commit()
+                other.close()
+        event.listen(engine, 'before_cursor_execute', other_process_first)
+
+        queue = ReportJobQueue(engine, os.path.join(self.tmp, 'old_results'))
+        queue.close()
+        with engine.connect() as conn:
+            columns = [row[1] for row in conn.execute(text('PRAGMA table_info(report_job)'))]
+        engine.dispose()
+        self.assertEqual(columns.count('heartbeat_at'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine, text
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from daily_stats import setup_daily_stats
+from report_snapshot import ReportSnapshot
+
+class ReportSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE document (id INTEGER PRIMARY KEY, status TEXT, priority TEXT, '
+                'sender TEXT, created_at DATETIME)'
+            ))
+            conn.execute(text(
+                'CREATE TABLE document_daily_stats (day TEXT, status TEXT, priority TEXT, '
+                'sender_department TEXT, count INTEGER NOT NULL, updated_at TEXT, '
+                'PRIMARY KEY (day, status, priority, sender_department)) WITHOUT ROWID'
+            ))
+            conn.execute(text(
+                "INSERT INTO document (status, priority, sender, created_at) VALUES "
+                "('Incoming', 'Urgent', 'HR', '2025-03-03 08:00:00.000000'), "
+                "('Incoming', 'Normal', 'HR', '2025-03-05 17:30:00.000000'), "
+                "('Pending', 'Urgent', 'Finance', '2025-03-10 09:00:00.000000'), "
+                "('Ended', 'Normal', 'Finance', '2025-04-01 09:00:00.000000'), "
+                "('Incoming', 'Normal', 'HR', NULL)"
+            ))
+        setup_daily_stats(self.engine)
+        self.snapshot = ReportSnapshot()
+        self.snapshot.refresh(self.engine, full=True)
+
+    def test_group_by_week_and_status(self):
+        """Counts are grouped by Monday-based weeks and labels; undated documents are left out"""
+        self.assertEqual(self.snapshot.count(group_by=('week', 'status')), {
+            (date(2025, 3, 3), 'Incoming'): 2,
+            (date(2025, 3, 10), 'Pending'): 1,
+            (date(2025, 3, 31), 'Ended'): 1,
+        })
+        self.assertEqual(self.snapshot.count(group_by=('month',)), {
+            (date(2025, 3, 1),): 3, (date(2025, 4, 1),): 1,
+        })
+
+    def test_filters_and_window(self):
+        """Label filters and the date window combine"""
+        counts = self.snapshot.count(
+            date(2025, 3, 4), date(2025, 3, 31), priorities=['Urgent', 'Normal'],
+            departments=['HR', 'Finance'], group_by=('department',)
+        )
+        self.assertEqual(counts, {('HR',): 1, ('Finance',): 1})
+        self.assertEqual(self.snapshot.count(statuses=['Ended'], departments=['HR'], group_by=()), {})
+        self.assertEqual(self.snapshot.count(group_by=()), {(): 4})
+        with self.assertRaises(ValueError):
+            self.snapshot.count(group_by=('sender',))
+
+    def test_incremental_refresh(self):
+        """A refresh only reads rollup rows changed since the watermark"""
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE document_daily_stats SET updated_at = '2000-01-01 00:00:00.000'"))
+            conn.execute(text(
+                "INSERT INTO document (status, priority, sender, created_at) "
+                "VALUES ('Pending', 'Urgent', 'Research', '2025-03-11 10:00:00.000000')"
+            ))
+            conn.execute(text("UPDATE document SET status = 'Received' WHERE id = 1"))
+            conn.execute(text('DELETE FROM document WHERE id = 4'))
+
+        self.assertEqual(self.snapshot.refresh(self.engine), 4)
+        self.assertEqual(self.snapshot.count(group_by=('status',)), {
+            ('Incoming',): 1, ('Received',): 1, ('Pending',): 2,
+        })
+
+    def test_many_departments(self):
+        """Code columns widen once a dimension has more than 256 labels"""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO document (status, priority, sender, created_at) "
+                    "VALUES ('Incoming', 'Normal', :sender, '2025-05-01 09:00:00.000000')"
+                ),
+                [{'sender': f'Department {n}'} for n in range(300)]
+            )
+        self.snapshot.refresh(self.engine, full=True)
+        counts = self.snapshot.count(departments=['Department 299', 'HR'], group_by=('department',))
+        self.assertEqual(counts, {('Department 299',): 1, ('HR',): 2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import setup_document_fts, build_match_query, get_snippets
+
+class SearchIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE document (id INTEGER PRIMARY KEY, code TEXT, title TEXT, sender TEXT, '
+                'recipient TEXT, details TEXT, required_action TEXT, status TEXT)'
+            ))
+            conn.execute(text(
+                "INSERT INTO document VALUES (1, 'DOC-2025-001', 'Budget memo', 'Finance', "
+                "'KEMRI HR', 'Quarterly budget review', 'Review', 'Incoming')"
+            ))
+        self.assertTrue(setup_document_fts(self.engine))
+
+    def search(self, query):
+        with self.engine.connect() as conn:
+            return [row[0] for row in conn.execute(
+                text('SELECT rowid FROM document_fts WHERE document_fts MATCH :q'),
+                {'q': build_match_query(query)}
+            )]
+
+    def test_build_match_query(self):
+        """User input is quoted and prefix-matched"""
+        self.assertEqual(build_match_query('budget rev'), '"budget"* "rev"*')
+        self.assertEqual(build_match_query('NOT "x" OR'), '"NOT"* "x"* "OR"*')
+        self.assertIsNone(build_match_query('  -- '))
+        self.assertIsNone(build_match_query(None))
+
+    def test_existing_rows_are_indexed(self):
+        """Rows present before the index was created are searchable"""
+        self.assertEqual(self.search('budg'), [1])
+        self.assertEqual(self.search('DOC-2025'), [1])
+
+    def test_triggers_keep_index_in_sync(self):
+        """Inserts, updates and deletes are reflected in the index"""
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO document VALUES (2, 'DOC-2025-002', 'Travel request', 'Research', "
+                "'KEMRI Finance', NULL, NULL, 'Outgoing')"
+            ))
+            conn.execute(text("UPDATE document SET title = 'Audit letter' WHERE id = 1"))
+        self.assertEqual(self.search('travel'), [2])
+        self.assertEqual(self.search('audit'), [1])
+        self.assertEqual(self.search('memo'), [])
+
+        with self.engine.begin() as conn:
+            conn.execute(text('DELETE FROM document WHERE id = 2'))
+        self.assertEqual(self.search('travel'), [])
+
+    def test_status_update_does_not_touch_index(self):
+        """Updating unindexed columns leaves the index unchanged"""
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE document SET status = 'Pending' WHERE id = 1"))
+        self.assertEqual(self.search('budget'), [1])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        """Snippets escape document text and mark the matched terms"""
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO document VALUES (3, 'DOC-2025-003', '<b>Grant</b> letter', 'Research', "
+                "'KEMRI', NULL, NULL, 'Incoming')"
+            ))
+        with Session(self.engine) as session:
+            snippets = get_snippets(session, build_match_query('grant'), [1, 3])
+        self.assertEqual(list(snippets), [3])
+        self.assertIn('<mark>Grant</mark>', str(snippets[3]))
+        self.assertIn('&lt;b&gt;', str(snippets[3]))
+
+if __name__ == '__main__':
+    unittest.main()
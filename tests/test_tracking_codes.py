@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import sys
+import unittest
+from datetime import datetime
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracking_codes import (
+    CODES_PER_DAY, TrackingCodesExhausted, allocate_tracking_codes, permute_sequence_number
+)
+
+class TrackingCodesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.day = datetime(2025, 4, 30)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_permutation_is_a_bijection(self):
+        """Every sequence number maps to a different suffix"""
+        suffixes = {permute_sequence_number(n, '20250430') for n in range(CODES_PER_DAY)}
+        self.assertEqual(suffixes, set(range(CODES_PER_DAY)))
+
+    def test_codes_keep_format_and_never_repeat(self):
+        """Single and batch allocations give distinct KEMRI-YYYYMMDD-XXXX codes"""
+        codes = allocate_tracking_codes(self.conn, when=self.day)
+        codes += allocate_tracking_codes(self.conn, 500, when=self.day)
+        self.assertEqual(len(set(codes)), 501)
+        for code in codes:
+            prefix, day, suffix = code.split('-')
+            self.assertEqual((prefix, day, len(suffix)), ('KEMRI', '20250430', 4))
+            self.assertTrue(1000 <= int(suffix) <= 9999)
+
+    def test_days_have_separate_sequences(self):
+        """Each day starts its own sequence"""
+        allocate_tracking_codes(self.conn, 3, when=self.day)
+        allocate_tracking_codes(self.conn, when=datetime(2025, 5, 1))
+        rows = self.conn.execute('SELECT day, last_value FROM tracking_sequence ORDER BY day').fetchall()
+        self.assertEqual(rows, [('20250430', 3), ('20250501', 1)])
+
+    def test_exhausted_day_raises(self):
+        """A day never hands out more codes than the suffix can hold"""
+        allocate_tracking_codes(self.conn, CODES_PER_DAY, when=self.day)
+        with self.assertRaises(TrackingCodesExhausted):
+            allocate_tracking_codes(self.conn, when=self.day)
+
+if __name__ == '__main__':
+    unittest.main()
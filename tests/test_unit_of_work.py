@@ -0,0 +1,128 @@
+import os
+import sys
+import unittest
+
+from flask import Flask, flash, jsonify
+from sqlalchemy import Column, Integer, String, create_engine, event
+from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unit_of_work import RequestUnitOfWork
+
+Base = declarative_base()
+
+class Note(Base):
+    __tablename__ = 'note'
+    id = Column(Integer, primary_key=True)
+    text = Column(String(50), unique=True)
+
+class UnitOfWorkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(self.engine)
+        self.session = scoped_session(sessionmaker(self.engine))
+        self.commits = 0
+        self.logged = []
+        event.listen(self.session, 'after_commit', self.count_commit)
+
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        uow = RequestUnitOfWork(app, self.session, lambda error: (jsonify({'error': 'not saved'}), 500))
+        self.uow = uow
+
+        @app.route('/notes/<int:count>')
+        def add_notes(count):
+            for n in range(count):
+                uow.register(Note(text=f'note {n}'))
+                uow.after_commit(lambda n=n: self.logged.append(n))
+            return 'ok'
+
+        @app.route('/invalid')
+        def invalid():
+            uow.register(Note(text='invalid'))
+            return 'bad request', 400
+
+        @app.route('/crash')
+        def crash():
+            uow.register(Note(text='crash'))
+            uow.after_commit(lambda: self.logged.append('crash'))
+            raise RuntimeError('view failed')
+
+        @app.route('/duplicate')
+        def duplicate():
+            uow.register(Note(text='same'), Note(text='same'))
+            return 'ok'
+
+        @app.route('/duplicate-flash')
+        def duplicate_flash():
+            uow.register(Note(text='same'), Note(text='same'))
+            flash('Notes saved', 'success')
+            return 'ok'
+
+        @app.route('/log-only')
+        def log_only():
+            uow.after_commit(lambda: self.logged.append('log only'))
+            return 'ok'
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.session.remove()
+        self.engine.dispose()
+
+    def count_commit(self, session):
+        self.commits += 1
+
+    def notes(self):
+        return [note.text for note in self.session.query(Note).order_by(Note.id)]
+
+    def test_one_commit_per_request(self):
+        """Writes registered across a request are committed together, once"""
+        self.assertEqual(self.client.get('/notes/3').status_code, 200)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.notes(), ['note 0', 'note 1', 'note 2'])
+        self.assertEqual(self.logged, [0, 1, 2])
+
+    def test_error_response_rolls_back(self):
+        """Nothing registered by a request that answers with an error is kept"""
+        self.assertEqual(self.client.get('/invalid').status_code, 400)
+        self.assertEqual(self.commits, 0)
+        self.assertEqual(self.notes(), [])
+
+    def test_exception_rolls_back(self):
+        """An exception in the view discards its writes and after-commit callbacks"""
+        self.assertEqual(self.client.get('/crash').status_code, 500)
+        self.assertEqual(self.notes(), [])
+        self.assertEqual(self.logged, [])
+
+    def test_failed_commit(self):
+        """A commit that fails is rolled back and answered with the failure response"""
+        response = self.client.get('/duplicate')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {'error': 'not saved'})
+        self.assertEqual(self.notes(), [])
+
+    def test_failed_commit_drops_flashes(self):
+        """Success messages flashed by the view are not shown when its commit fails"""
+        self.assertEqual(self.client.get('/duplicate-flash').status_code, 500)
+        with self.client.session_transaction() as session:
+            self.assertNotIn('_flashes', session)
+
+    def test_callbacks_without_writes(self):
+        """After-commit callbacks run for requests that registered no writes"""
+        self.client.get('/log-only')
+        self.assertEqual(self.logged, ['log only'])
+        self.assertEqual(self.commits, 0)
+
+    def test_outside_request(self):
+        """Outside a request, register commits immediately and callbacks run at once"""
+        self.uow.register(Note(text='startup'))
+        self.uow.after_commit(lambda: self.logged.append('startup'))
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.logged, ['startup'])
+
+if __name__ == '__main__':
+    unittest.main()
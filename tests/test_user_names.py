@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+# Import from parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_names import UserNameCache
+
+class UserNameCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE user (id INTEGER PRIMARY KEY, username TEXT)')
+        self.conn.execute("INSERT INTO user (id, username) VALUES (1, 'alice'), (2, 'bob'), (3, 'carol')")
+        self.queries = []
+        self.conn.set_trace_callback(self.queries.append)
+        self.cache = UserNameCache()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_misses_load_in_one_query(self):
+        """Names for many events cost one query, and none once cached"""
+        self.assertEqual(self.cache.get_many(self.conn, [1, 2, 1, None, 42]), {1: 'alice', 2: 'bob'})
+        self.assertEqual(len(self.queries), 1)
+        self.cache.get_many(self.conn, [1, 2])
+        self.assertEqual(len(self.queries), 1)
+
+    def test_invalidate_reloads_edited_user(self):
+        """An invalidated user's name is read again"""
+        self.assertEqual(self.cache.get(self.conn, 1), 'alice')
+        self.conn.execute("UPDATE user SET username = 'alicia' WHERE id = 1")
+        self.assertEqual(self.cache.get(self.conn, 1), 'alice')
+        self.cache.invalidate(1)
+        self.assertEqual(self.cache.get(self.conn, 1), 'alicia')
+
+    def test_least_recently_used_name_is_evicted(self):
+        """The cache never holds more than max_size names"""
+        self.cache = UserNameCache(max_size=2)
+        self.cache.get(self.conn, 1)
+        self.cache.get(self.conn, 2)
+        self.cache.get(self.conn, 1)
+        self.cache.get(self.conn, 3)
+        self.queries.clear()
+        self.cache.get_many(self.conn, [1, 3])
+        self.assertEqual(self.queries, [])
+        self.assertEqual(self.cache.get(self.conn, 2), 'bob')
+        self.assertEqual(len(self.queries), 1)
+
+if __name__ == '__main__':
+    unittest.main()
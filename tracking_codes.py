@@ -0,0 +1,110 @@
+"""
+Tracking code allocation for the KEMRI Document Management System.
+
+Tracking codes have the form KEMRI-YYYYMMDD-XXXX. Each day has a counter in
+the tracking_sequence table, advanced with a single atomic upsert, so two
+requests can never draw the same number. The counter is passed through a
+keyed Feistel permutation of 0..8999 before it becomes the 4-digit suffix:
+codes stay unique without checking the document table, but consecutive
+documents do not get guessable consecutive codes.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+
+SEQUENCE_TABLE = 'tracking_sequence'
+
+# Suffixes run from 1000 to 9999, so a day holds at most 9000 codes
+SUFFIX_BASE = 1000
+CODES_PER_DAY = 9000
+
+# Feistel network over 14 bits (two 7-bit halves); values >= CODES_PER_DAY
+# are walked through the permutation again until they land in range
+_HALF_BITS = 7
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+DEFAULT_KEY = os.environ.get('TRACKING_CODE_KEY', 'kemri-tracking')
+
+
+class TrackingCodesExhausted(Exception):
+    """Raised when a day's 9000 tracking codes have all been handed out"""
+
+
+def _round(key, day, round_number, half):
+    digest = hashlib.blake2b(
+        f'{day}:{round_number}:{half}'.encode(),
+        key=key.encode()[:64],
+        digest_size=2
+    ).digest()
+    return int.from_bytes(digest, 'big') & _HALF_MASK
+
+
+def _feistel(value, day, key):
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_number in range(_ROUNDS):
+        left, right = right, left ^ _round(key, day, round_number, right)
+    return (left << _HALF_BITS) | right
+
+
+def permute_sequence_number(number, day, key=DEFAULT_KEY):
+    """Map a day's sequence number (0..8999) to a distinct number in 0..8999.
+
+    The mapping is a bijection for a given day and key, so distinct sequence
+    numbers always give distinct suffixes.
+    """
+    if not 0 <= number < CODES_PER_DAY:
+        raise ValueError(f'sequence number must be between 0 and {CODES_PER_DAY - 1}')
+
+    value = _feistel(number, day, key)
+    while value >= CODES_PER_DAY:
+        value = _feistel(value, day, key)
+    return value
+
+
+def format_tracking_code(day, suffix):
+    """Format a day (YYYYMMDD) and suffix as a tracking code"""
+    return f'KEMRI-{day}-{suffix:04d}'
+
+
+def reserve_sequence_numbers(conn, day, count=1):
+    """Atomically reserve `count` consecutive sequence numbers for a day.
+
+    Commits on `conn` straight away, so the numbers stay reserved even if the
+    caller's insert later fails. Returns a range of 0-based sequence numbers.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS {SEQUENCE_TABLE} '
+        f'(day TEXT PRIMARY KEY, last_value INTEGER NOT NULL)'
+    )
+    try:
+        last_value = conn.execute(
+            f'INSERT INTO {SEQUENCE_TABLE} (day, last_value) VALUES (?, ?) '
+            f'ON CONFLICT (day) DO UPDATE SET last_value = last_value + excluded.last_value '
+            f'RETURNING last_value',
+            (day, count)
+        ).fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if last_value > CODES_PER_DAY:
+        raise TrackingCodesExhausted(f'All {CODES_PER_DAY} tracking codes for {day} are in use')
+    return range(last_value - count, last_value)
+
+
+def allocate_tracking_codes(conn, count=1, when=None, key=DEFAULT_KEY):
+    """Allocate `count` unique tracking codes for the day of `when` (default: today).
+
+    Batches take one round trip however large they are, e.g. for imports.
+    """
+    day = (when or datetime.now()).strftime('%Y%m%d')
+    return [
+        format_tracking_code(day, SUFFIX_BASE + permute_sequence_number(number, day, key))
+        for number in reserve_sequence_numbers(conn, day, count)
+    ]
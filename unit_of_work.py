@@ -0,0 +1,86 @@
+"""
+Request-scoped unit of work for the KEMRI Document Management System.
+
+Routes used to commit as they went: the document, then its attachment,
+then the log entry, sometimes once per user in a loop. Each commit is an
+fsync, and a failure halfway left the earlier writes committed.
+
+With RequestUnitOfWork, routes and helpers call register() instead of
+committing. The session is committed once, after the view returns,
+provided the response is not an error (status below 400). Error
+responses and exceptions roll back everything the request registered. A
+commit that fails is rolled back and replaced by the on_failure response,
+and the messages the view flashed are dropped.
+
+Side effects that must only happen once the writes are durable, such as
+queueing system log entries, are registered with after_commit(); they are
+dropped with a rollback. Outside a request (startup code, scripts,
+background threads) register() commits straight away and after_commit()
+runs its callback immediately.
+
+Two kinds of write deliberately happen before the request's commit and
+are not undone by a rollback:
+
+- Document codes are reserved by DocumentCodeAllocator in a transaction
+  of their own, so two requests never get the same code. A request that
+  rolls back leaves a gap in the code sequence.
+- Uploaded attachments are written to the attachment store while the
+  view runs, since the attachment row needs the content's digest. A blob
+  whose attachment is rolled back is left unreferenced and is removed by
+  AttachmentStore.collect_garbage() after its grace period.
+"""
+
+from flask import g, has_request_context, make_response, session
+
+
+class RequestUnitOfWork:
+    """Commits a request's registered writes once, when the view has returned"""
+
+    def __init__(self, app, session, on_failure):
+        self.session = session
+        self.on_failure = on_failure
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+
+    def register(self, *objects):
+        """Add objects to the session and commit the request's changes when it finishes"""
+        for obj in objects:
+            self.session.add(obj)
+        if has_request_context():
+            g.unit_of_work_pending = True
+        else:
+            self.session.commit()
+
+    def after_commit(self, callback):
+        """Run callback once the request's writes are committed; it is dropped on rollback"""
+        if has_request_context():
+            g.setdefault('unit_of_work_callbacks', []).append(callback)
+        else:
+            callback()
+
+    def _finish(self, response):
+        callbacks = g.pop('unit_of_work_callbacks', [])
+        if g.pop('unit_of_work_pending', False):
+            if response.status_code >= 400:
+                self.session.rollback()
+                return response
+            try:
+                self.session.commit()
+            except Exception as e:
+                self.session.rollback()
+                # Anything the view flashed announced changes that were not saved
+                session.pop('_flashes', None)
+                return make_response(self.on_failure(e))
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error running after-commit callback: {str(e)}")
+        return response
+
+    def _discard(self, exc):
+        # The request ended without _finish committing (an exception escaped
+        # the error handlers), so nothing it registered may be kept
+        g.pop('unit_of_work_callbacks', None)
+        if g.pop('unit_of_work_pending', False) or exc is not None:
+            self.session.rollback()
@@ -0,0 +1,71 @@
+"""
+User display name cache for the KEMRI Document Management System.
+
+Timelines and logs show the name of the user behind each event. Names
+rarely change, so they are kept in a process-wide LRU cache keyed by user
+id. Lookups for a whole page of events cost at most one query for the ids
+that are not cached yet. Call invalidate() whenever a user is edited or
+deleted.
+"""
+
+import threading
+from collections import OrderedDict
+
+SYSTEM_USER_NAME = 'System'
+
+
+class UserNameCache:
+    """Thread-safe LRU cache of user id -> display name"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._names = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, conn, user_ids):
+        """Return {user_id: name} for the given ids, loading misses in one query.
+
+        Ids with no matching user are left out of the result.
+        """
+        wanted = {user_id for user_id in user_ids if user_id}
+        cached = {}
+        with self._lock:
+            for user_id in wanted:
+                if user_id in self._names:
+                    self._names.move_to_end(user_id)
+                    cached[user_id] = self._names[user_id]
+
+        missing = sorted(wanted - set(cached))
+        if missing:
+            placeholders = ', '.join('?' for _ in missing)
+            rows = conn.execute(
+                f'SELECT id, username FROM user WHERE id IN ({placeholders})', missing
+            ).fetchall()
+            # Unknown ids are cached as None so they are not looked up again
+            loaded = dict.fromkeys(missing)
+            loaded.update((row[0], row[1]) for row in rows)
+            cached.update(loaded)
+            with self._lock:
+                for user_id, name in loaded.items():
+                    self._names[user_id] = name
+                    self._names.move_to_end(user_id)
+                while len(self._names) > self.max_size:
+                    self._names.popitem(last=False)
+
+        return {user_id: name for user_id, name in cached.items() if name is not None}
+
+    def get(self, conn, user_id, default=SYSTEM_USER_NAME):
+        """Return the display name for one user id"""
+        return self.get_many(conn, [user_id]).get(user_id, default)
+
+    def invalidate(self, user_id=None):
+        """Forget one user's cached name, or every name if user_id is None"""
+        with self._lock:
+            if user_id is None:
+                self._names.clear()
+            else:
+                self._names.pop(user_id, None)
+
+
+# Shared by every request in this process
+user_names = UserNameCache()